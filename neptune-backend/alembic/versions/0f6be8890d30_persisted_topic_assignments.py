@@ -0,0 +1,70 @@
+"""Persisted topic assignments
+
+Revision ID: 0f6be8890d30
+Revises: f33d94eea0c9
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0f6be8890d30'
+down_revision: Union[str, Sequence[str], None] = 'f33d94eea0c9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _columns(table: str) -> set:
+    return {column['name'] for column in sa.inspect(op.get_bind()).get_columns(table)}
+
+
+def upgrade() -> None:
+    """Upgrade schema.
+
+    ``note_topics`` pointed at ``notes.id`` and was never written; it is
+    replaced by assignments keyed on ``filesystem.id`` and prompt version.
+    A ``note_topics`` that ``init_db`` already created in the new layout
+    is kept.
+    """
+    if {'file_id', 'prompt_version'} <= _columns('note_topics'):
+        return
+    op.drop_index(op.f('ix_note_topics_id'), table_name='note_topics')
+    op.drop_table('note_topics')
+    op.create_table('note_topics',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('file_id', sa.Integer(), nullable=False),
+    sa.Column('topic_id', sa.Integer(), nullable=False),
+    sa.Column('content_checksum', sa.String(length=128), nullable=True),
+    sa.Column('prompt_version', sa.String(length=64), nullable=False),
+    sa.Column('confidence', sa.String(length=50), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.ForeignKeyConstraint(['file_id'], ['filesystem.id'], ),
+    sa.ForeignKeyConstraint(['topic_id'], ['topics.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('file_id', 'prompt_version', name='uq_note_topics_file_prompt')
+    )
+    op.create_index(op.f('ix_note_topics_id'), 'note_topics', ['id'], unique=False)
+    op.create_index('ix_note_topics_topic_prompt', 'note_topics', ['topic_id', 'prompt_version'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_note_topics_topic_prompt', table_name='note_topics')
+    op.drop_index(op.f('ix_note_topics_id'), table_name='note_topics')
+    op.drop_table('note_topics')
+    op.create_table('note_topics',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('note_id', sa.Integer(), nullable=False),
+    sa.Column('topic_id', sa.Integer(), nullable=False),
+    sa.Column('confidence', sa.String(length=50), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.ForeignKeyConstraint(['note_id'], ['notes.id'], ),
+    sa.ForeignKeyConstraint(['topic_id'], ['topics.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_note_topics_id'), 'note_topics', ['id'], unique=False)
@@ -0,0 +1,41 @@
+"""Shared graph cache
+
+Revision ID: 7e0c9231dd5f
+Revises: fe39d987cef1
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7e0c9231dd5f'
+down_revision: Union[str, Sequence[str], None] = 'fe39d987cef1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema.
+
+    ``graph_cache`` may already exist where ``init_db`` created it.
+    """
+    if 'graph_cache' in sa.inspect(op.get_bind()).get_table_names():
+        return
+    op.create_table('graph_cache',
+    sa.Column('key', sa.String(length=255), nullable=False),
+    sa.Column('generation', sa.Integer(), nullable=False),
+    sa.Column('fingerprint', sa.String(length=128), nullable=True),
+    sa.Column('etag', sa.String(length=64), nullable=True),
+    sa.Column('payload', sa.Text(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.PrimaryKeyConstraint('key')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('graph_cache')
@@ -0,0 +1,41 @@
+"""Generation leases
+
+Revision ID: f33d94eea0c9
+Revises: 7e0c9231dd5f
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f33d94eea0c9'
+down_revision: Union[str, Sequence[str], None] = '7e0c9231dd5f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema.
+
+    ``generation_leases`` may already exist where ``init_db`` created it.
+    """
+    if 'generation_leases' in sa.inspect(op.get_bind()).get_table_names():
+        return
+    op.create_table('generation_leases',
+    sa.Column('name', sa.String(length=255), nullable=False),
+    sa.Column('holder', sa.String(length=255), nullable=True),
+    sa.Column('expires_at', sa.Float(), nullable=False),
+    sa.Column('heartbeat_at', sa.Float(), nullable=True),
+    sa.Column('status', sa.Text(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.PrimaryKeyConstraint('name')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('generation_leases')
@@ -4,7 +4,11 @@ from pydantic import BaseModel
 from app.db.database import SessionLocal
 from app.db.models import FileSystem
 from app.services.embeddings import upsert_embedding, delete_embedding, backfill_embeddings
-from app.services.knowledge_graph import start_background_generation, invalidate_cache
+from app.services.llm_scheduler import Priority, llm_priority
+from app.services.knowledge_graph import (
+    start_background_generation,
+    start_incremental_update,
+)
 from app.services.note_content import load_note_content
 
 router = APIRouter()
@@ -28,10 +32,10 @@ async def note_upsert(payload: NotePayload):
             loaded = load_note_content(note)
             content = loaded.content or ""
             if content.strip():
-                upsert_embedding(db, note, content)
+                with llm_priority(Priority.INCREMENTAL, note.owner_id):
+                    upsert_embedding(db, note, content)
                 db.commit()
-        invalidate_cache()
-        start_background_generation()
+        start_incremental_update(payload.note_id)
         return {"ok": True}
     finally:
         db.close()
@@ -43,17 +47,15 @@ async def note_delete(payload: NotePayload):
     try:
         delete_embedding(db, payload.note_id)
         db.commit()
-        invalidate_cache()
-        start_background_generation()
+        start_incremental_update(payload.note_id, deleted=True)
         return {"ok": True}
     finally:
         db.close()
 
 
 @router.post("/graph-refresh")
-async def graph_refresh():
-    invalidate_cache()
-    started = start_background_generation()
+async def graph_refresh(owner_id: str | None = None):
+    started = start_background_generation(owner_id=owner_id)
     return {"started": started}
 
 
@@ -1,37 +1,77 @@
-from fastapi import APIRouter, HTTPException
-from typing import Dict
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+from typing import Dict, List
 import logging
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = {value.strip().removeprefix("W/") for value in header.split(",")}
+    return f'"{etag}"' in candidates or "*" in candidates
+
 @router.get("/")
-async def get_knowledge_graph():
-    """Get cached knowledge graph data."""
+async def get_knowledge_graph(
+    request: Request,
+    min_strength: float | None = None,
+    max_edges: int | None = None,
+    max_degree: int | None = None,
+    owner_id: str | None = None,
+):
+    """Get an owner's cached knowledge graph data.
+
+    Responses carry an ``ETag`` derived from the cached graph so polling
+    clients can revalidate with ``If-None-Match`` and receive ``304``.
+    ``min_strength``, ``max_edges`` and ``max_degree`` re-select links from
+    the cached, strength-sorted edge list without regenerating the graph.
+    """
     try:
-        from app.services.knowledge_graph import get_latest_graph_data, get_generation_status
+        from app.services.knowledge_graph import (
+            get_filtered_graph_data,
+            get_latest_graph_data,
+            get_latest_graph_etag,
+            get_generation_status,
+        )
         
         # Return cached data immediately without blocking.
-        graph_data = get_latest_graph_data()
-        status = get_generation_status()
+        filtered = min_strength is not None or max_edges is not None or max_degree is not None
+        etag = get_latest_graph_etag(owner_id)
+        if etag and filtered:
+            etag = f"{etag}-{min_strength}-{max_edges}-{max_degree}"
+        headers = {"Cache-Control": "no-cache"}
+        if etag:
+            headers["ETag"] = f'"{etag}"'
+            if _etag_matches(request, etag):
+                return Response(status_code=304, headers=headers)
+        if filtered:
+            graph_data = get_filtered_graph_data(
+                min_strength, max_edges, max(0, max_degree or 0), owner_id=owner_id
+            )
+        else:
+            graph_data = get_latest_graph_data(owner_id)
+        status = get_generation_status(owner_id)
         
         # Return whatever we have (cached or empty)
         if graph_data.get("nodes"):
-            return {
+            return JSONResponse({
                 **graph_data,
                 "status": status,
                 "cached": True
-            }
+            }, headers=headers)
         else:
             # Return empty with status
-            return {
+            return JSONResponse({
                 "nodes": [], 
                 "links": [], 
                 "message": "No cached knowledge graph. Click 'Generate' to create one.",
                 "status": status,
                 "cached": False
-            }
+            }, headers=headers)
         
     except Exception as e:
         logger.error("Error getting knowledge graph: %s", e)
@@ -42,37 +82,154 @@ async def get_knowledge_graph():
             "cached": False
         }
 
+@router.get("/level")
+async def get_graph_level(level: int = 0, limit: int = 500, owner_id: str | None = None):
+    """Get one level of the topic hierarchy (0 = coarsest groups).
+
+    Nodes carry counts but no note lists, so the payload is bounded by
+    ``limit`` regardless of corpus size.
+    """
+    try:
+        from app.services.knowledge_graph import get_graph_hierarchy
+
+        limit = max(1, min(limit, 2000))
+        return get_graph_hierarchy(owner_id).level(level, limit)
+
+    except Exception as e:
+        logger.error("Error getting graph level: %s", e)
+        return {"nodes": [], "links": [], "error": str(e)}
+
+@router.get("/children")
+async def get_graph_children(node: str, limit: int = 200, offset: int = 0, owner_id: str | None = None):
+    """Expand one hierarchy node into its children (groups, topics or notes)."""
+    from app.services.knowledge_graph import get_graph_hierarchy
+
+    limit = max(1, min(limit, 2000))
+    expanded = get_graph_hierarchy(owner_id).expand(node, limit, max(0, offset))
+    if expanded is None:
+        raise HTTPException(status_code=404, detail="Node not found")
+    return expanded
+
+@router.get("/neighbors")
+async def get_topic_neighbors(topic: str, depth: int = 1, limit: int = 50, owner_id: str | None = None):
+    """Get a topic's neighbourhood up to ``depth`` hops, strongest links first."""
+    from app.services.knowledge_graph import get_graph_index
+
+    result = get_graph_index(owner_id).neighbors(topic, depth=max(0, min(depth, 5)), limit=max(1, min(limit, 2000)))
+    if result is None:
+        raise HTTPException(status_code=404, detail="Topic not found")
+    return result
+
+@router.get("/subgraph")
+async def get_note_subgraph(note_ids: List[str] = Query(...), limit: int = 500, owner_id: str | None = None):
+    """Get the topics containing the given notes and the links among them.
+
+    ``note_ids`` may be repeated or comma-separated.
+    """
+    from app.services.knowledge_graph import get_graph_index
+
+    ids = [value.strip() for raw in note_ids for value in raw.split(",") if value.strip()]
+    return get_graph_index(owner_id).subgraph(ids, limit=max(1, min(limit, 2000)))
+
+@router.get("/notes")
+async def get_note_graph(request: Request, owner_id: str | None = None):
+    """Get the note-level similarity graph (top-k semantic neighbours per note).
+
+    Built from the vector index without LLM calls; served with the same
+    ``ETag``/``304`` handling as the topic graph.
+    """
+    try:
+        from app.services.graph_store import graph_store
+        from app.services.graph_tenants import scoped_key
+        from app.services.note_graph import NOTE_GRAPH_KEY, start_note_graph_build
+
+        entry = graph_store.get(scoped_key(NOTE_GRAPH_KEY, owner_id))
+        if entry is None:
+            building = start_note_graph_build(owner_id)
+            return {
+                "nodes": [],
+                "links": [],
+                "message": "Note graph is being built",
+                "building": building,
+                "cached": False,
+            }
+        headers = {"Cache-Control": "no-cache"}
+        if entry.etag:
+            headers["ETag"] = f'"{entry.etag}"'
+            if _etag_matches(request, entry.etag):
+                return Response(status_code=304, headers=headers)
+        return JSONResponse({**entry.graph, "generation": entry.generation, "cached": True}, headers=headers)
+
+    except Exception as e:
+        logger.error("Error getting note graph: %s", e)
+        return {"nodes": [], "links": [], "error": str(e), "cached": False}
+
+@router.get("/events")
+async def stream_knowledge_graph_events(request: Request, since: int | None = None, owner_id: str | None = None):
+    """Stream graph changes and generation progress as server-sent events.
+
+    Clients receive a ``graph`` snapshot (skipped when ``since`` or
+    ``Last-Event-ID`` already names the current generation), then ``diff``
+    events with added/removed/changed nodes and links, ``status`` events
+    and idle ``heartbeat`` events.
+    """
+    from app.services.graph_events import stream_graph_events
+    from app.services.knowledge_graph import get_generation_status, get_graph_entry
+
+    last_event_id = request.headers.get("last-event-id")
+    if since is None and last_event_id and last_event_id.isdigit():
+        since = int(last_event_id)
+    events = stream_graph_events(
+        load_entry=lambda: get_graph_entry(owner_id),
+        load_status=lambda: get_generation_status(owner_id),
+        is_disconnected=request.is_disconnected,
+        last_generation=since,
+        owner_id=owner_id,
+    )
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 @router.post("/refresh")
-async def refresh_knowledge_graph():
-    """Start knowledge graph generation in the background."""
+async def refresh_knowledge_graph(force: bool = False, owner_id: str | None = None):
+    """Schedule generation of an owner's knowledge graph in the background.
+
+    Without ``force`` the run is a no-op when the note fingerprint matches
+    the cached graph; ``force`` drops the cache first.
+    """
     try:
-        from app.services.knowledge_graph import start_background_generation, invalidate_cache, get_generation_status
+        from app.services.knowledge_graph import (
+            start_background_generation,
+            invalidate_cache,
+            get_generation_status,
+            get_scheduler_status,
+        )
         
-        status = get_generation_status()
+        status = get_generation_status(owner_id)
         
-        # Check if already generating
+        # A run in progress gets a trailing run instead of dropping the request.
         if status["is_generating"]:
+            start_background_generation(immediate=True, owner_id=owner_id)
             return {
-                "message": "Knowledge graph generation already in progress",
+                "message": "Knowledge graph generation in progress; a follow-up run is queued",
                 "status": status,
+                "scheduler": get_scheduler_status(owner_id),
                 "generating": True
             }
         
         logger.info("Starting background knowledge graph generation")
-        invalidate_cache()
+        if force:
+            invalidate_cache(owner_id)
         
         # Start background generation without blocking.
-        started = start_background_generation()
-        if not started:
-            return {
-                "message": "Knowledge graph generation already in progress",
-                "status": get_generation_status(),
-                "generating": True
-            }
+        start_background_generation(immediate=True, owner_id=owner_id)
         
         return {
             "message": "Knowledge graph generation started in background",
             "status": {"is_generating": True, "progress": "starting"},
+            "scheduler": get_scheduler_status(owner_id),
             "generating": True,
             "note": "Check /api/knowledge-graph/status for progress"
         }
@@ -85,16 +242,27 @@ async def refresh_knowledge_graph():
         }
 
 @router.get("/status")
-async def get_generation_status():
-    """Get knowledge graph generation status."""
+async def get_generation_status(owner_id: str | None = None):
+    """Get generation status of an owner's knowledge graph."""
     try:
-        from app.services.knowledge_graph import get_generation_status, get_latest_graph_data
+        from app.services.knowledge_graph import (
+            get_generation_status,
+            get_latest_graph_data,
+            get_latest_graph_meta,
+            get_scheduler_status,
+        )
         
-        status = get_generation_status()
-        graph_data = get_latest_graph_data()
+        status = get_generation_status(owner_id)
+        graph_data = get_latest_graph_data(owner_id)
+        graph_meta = get_latest_graph_meta(owner_id)
+        scheduler = get_scheduler_status(owner_id)
         
         return {
             "generation_status": status,
+            "graph_generation": graph_meta["generation"],
+            "scheduler": scheduler,
+            "queue_depth": scheduler["queue_depth"],
+            "last_dirty_at": scheduler["last_dirty_at"],
             "has_cached_graph": bool(graph_data.get("nodes")),
             "node_count": len(graph_data.get("nodes", [])),
             "link_count": len(graph_data.get("links", [])),
@@ -104,12 +272,12 @@ async def get_generation_status():
         return {"error": str(e)}
 
 @router.post("/invalidate")
-async def invalidate_knowledge_graph_cache():
-    """Clear all knowledge graph caches."""
+async def invalidate_knowledge_graph_cache(owner_id: str | None = None):
+    """Clear all knowledge graph caches of an owner."""
     try:
         from app.services.knowledge_graph import invalidate_cache
         
-        invalidate_cache()
+        invalidate_cache(owner_id)
         return {"message": "All caches invalidated"}
         
     except Exception as e:
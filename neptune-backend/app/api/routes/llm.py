@@ -8,7 +8,8 @@ router = APIRouter()
 
 
 class LlmEndpointUpdate(BaseModel):
-    endpoint: str
+    endpoint: str | None = None
+    endpoints: list[str] | None = None
 
 
 @router.get("/endpoint")
@@ -16,14 +17,18 @@ async def get_endpoint():
     return {
         "endpoint": llm_service.get_endpoint(),
         "embedding_endpoint": embedding_service.get_endpoint(),
+        "endpoints": llm_service.pool.status(),
     }
 
 
 @router.post("/endpoint")
 async def set_endpoint(payload: LlmEndpointUpdate):
-    endpoint = payload.endpoint.strip()
-    if not endpoint.startswith("http://") and not endpoint.startswith("https://"):
-        raise HTTPException(status_code=400, detail="Endpoint must start with http:// or https://")
-    llm_service.set_endpoint(endpoint)
-    embedding_service.set_endpoint(endpoint)
-    return {"endpoint": endpoint}
+    endpoints = [item.strip() for item in (payload.endpoints or [payload.endpoint or ""]) if item.strip()]
+    if not endpoints:
+        raise HTTPException(status_code=400, detail="At least one endpoint is required")
+    for endpoint in endpoints:
+        if not endpoint.startswith("http://") and not endpoint.startswith("https://"):
+            raise HTTPException(status_code=400, detail="Endpoint must start with http:// or https://")
+    # The LLM and embedding services share one endpoint pool.
+    llm_service.set_endpoints(endpoints)
+    return {"endpoint": endpoints[0], "endpoints": llm_service.get_endpoints()}
@@ -12,9 +12,10 @@ async def search(
     q: str = Query(..., min_length=1),
     owner_id: str | None = None,
     limit: int | None = None,
+    topic: str | None = None,
     db: Session = Depends(get_db),
 ):
-    results = search_notes(db=db, query=q, owner_id=owner_id, limit=limit)
+    results = search_notes(db=db, query=q, owner_id=owner_id, limit=limit, topic=topic)
     return {
         "query": q,
         "count": len(results),
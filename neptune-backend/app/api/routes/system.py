@@ -2,7 +2,11 @@ from fastapi import APIRouter
 from sqlalchemy import text
 from app.db.database import engine, SessionLocal
 from app.db.models import FileSystem
-from app.services.knowledge_graph import get_generation_status, get_latest_graph_data
+from app.services.knowledge_graph import (
+    get_generation_status,
+    get_latest_graph_data,
+    get_latest_graph_meta,
+)
 from app.core.settings import settings
 import os
 from app.services.llm_service import llm_service
@@ -55,11 +59,13 @@ async def system_status():
         },
         "llm": {
             "endpoint": llm_service.get_endpoint(),
+            "endpoints": llm_service.get_endpoints(),
             "model": settings.ollama_model,
             "embed_model": settings.embedding_model,
             "temperature": settings.ollama_temperature,
             "top_p": settings.ollama_top_p,
             "batch_topics": settings.llm_topic_batch_size,
+            "num_ctx": settings.ollama_num_ctx,
             "batch_relationships": settings.llm_relationship_batch_size,
             "prompt_version": settings.llm_prompt_version,
         },
@@ -72,6 +78,7 @@ async def system_status():
             "error": storage_status.error,
         },
         "cache": {
+            "backend": settings.kg_cache_backend,
             "topics_path": settings.kg_cache_path,
             "prompt_version": settings.llm_prompt_version,
         },
@@ -98,6 +105,7 @@ async def metrics():
         db.close()
 
     graph_data = get_latest_graph_data()
+    graph_meta = get_latest_graph_meta()
     status = get_generation_status()
     cache_path = settings.kg_cache_path
     cache_size = os.path.getsize(cache_path) if os.path.exists(cache_path) else 0
@@ -108,7 +116,12 @@ async def metrics():
             "tracked_objects": stored_count,
             "tracked_bytes": total_storage_bytes,
         },
-        "cache": {"path": cache_path, "bytes": cache_size},
+        "cache": {
+            "path": cache_path,
+            "bytes": cache_size,
+            "backend": settings.kg_cache_backend,
+            "graph_generation": graph_meta["generation"],
+        },
         "llm": llm_service.metrics(),
         "knowledge_graph": {
             "cached": bool(graph_data.get("nodes")),
@@ -34,6 +34,8 @@ class Settings:
     db_connect_timeout_seconds: int = int(os.getenv("DB_CONNECT_TIMEOUT_SECONDS", "5"))
 
     ollama_url: str = os.getenv("OLLAMA_URL", "http://100.122.73.92:11434")
+    ollama_urls: str = os.getenv("OLLAMA_URLS", "")
+    ollama_models_ttl_seconds: float = float(os.getenv("OLLAMA_MODELS_TTL_SECONDS", "300"))
     ollama_shared: bool = os.getenv("OLLAMA_SHARED", "true").lower() == "true"
     ollama_model: str = os.getenv("OLLAMA_MODEL", "llama3.1:8b")
     ollama_timeout_seconds: float = float(os.getenv("OLLAMA_TIMEOUT_SECONDS", "120"))
@@ -45,19 +47,68 @@ class Settings:
     ollama_temperature: float = float(os.getenv("OLLAMA_TEMPERATURE", "0.7"))
     ollama_top_p: float = float(os.getenv("OLLAMA_TOP_P", "0.9"))
     ollama_max_tokens: int = int(os.getenv("OLLAMA_MAX_TOKENS", "128"))
+    http_max_connections: int = int(os.getenv("HTTP_MAX_CONNECTIONS", "64"))
+    http_max_connections_per_host: int = int(os.getenv("HTTP_MAX_CONNECTIONS_PER_HOST", "16"))
+    http_keepalive_seconds: float = float(os.getenv("HTTP_KEEPALIVE_SECONDS", "30"))
+    http2: bool = os.getenv("HTTP2", "false").lower() == "true"
+    ollama_json_format: bool = os.getenv("OLLAMA_JSON_FORMAT", "true").lower() == "true"
+    ollama_num_ctx: int = int(os.getenv("OLLAMA_NUM_CTX", "2048"))
     llm_prompt_version: str = os.getenv("LLM_PROMPT_VERSION", "v1")
     llm_topic_batch_size: int = int(os.getenv("LLM_TOPIC_BATCH_SIZE", "8"))
+    llm_topic_note_chars: int = int(os.getenv("LLM_TOPIC_NOTE_CHARS", "2000"))
+    llm_topic_token_budget: int = int(os.getenv("LLM_TOPIC_TOKEN_BUDGET", "0"))
+    llm_topic_retries: int = int(os.getenv("LLM_TOPIC_RETRIES", "1"))
+    llm_response_cache: str = os.getenv("LLM_RESPONSE_CACHE", "all").lower()
+    llm_response_cache_max_entries: int = int(os.getenv("LLM_RESPONSE_CACHE_MAX_ENTRIES", "50000"))
+    llm_stream: bool = os.getenv("LLM_STREAM", "true").lower() == "true"
+    llm_chars_per_token: float = float(os.getenv("LLM_CHARS_PER_TOKEN", "4"))
     llm_relationship_batch_size: int = int(os.getenv("LLM_REL_BATCH_SIZE", "20"))
     llm_max_concurrency: int = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
     llm_max_queue: int = int(os.getenv("LLM_MAX_QUEUE", "16"))
+    llm_interactive_reserved: int = int(os.getenv("LLM_INTERACTIVE_RESERVED", "1"))
+    llm_deadline_interactive_seconds: float = float(os.getenv("LLM_DEADLINE_INTERACTIVE_SECONDS", "10"))
+    llm_deadline_incremental_seconds: float = float(os.getenv("LLM_DEADLINE_INCREMENTAL_SECONDS", "60"))
+    llm_deadline_backfill_seconds: float = float(os.getenv("LLM_DEADLINE_BACKFILL_SECONDS", "600"))
 
     kg_cache_path: str = os.getenv("KG_CACHE_PATH", "outputs/kg_cache.json")
-    kg_cache_ttl_minutes: int = int(os.getenv("KG_CACHE_TTL_MINUTES", "10"))
+    kg_topic_cache_batch: int = int(os.getenv("KG_TOPIC_CACHE_BATCH", "256"))
+    kg_topic_cache_max_entries: int = int(os.getenv("KG_TOPIC_CACHE_MAX_ENTRIES", "200000"))
+    kg_topic_cache_memory_entries: int = int(os.getenv("KG_TOPIC_CACHE_MEMORY_ENTRIES", "10000"))
     kg_cache_version: str = os.getenv("KG_CACHE_VERSION", "v1")
+    kg_cache_backend: str = os.getenv("KG_CACHE_BACKEND", "file").lower()
+    kg_cache_poll_seconds: float = float(os.getenv("KG_CACHE_POLL_SECONDS", "2"))
+    kg_lease_ttl_seconds: float = float(os.getenv("KG_LEASE_TTL_SECONDS", "60"))
+    kg_tenant_workers: int = int(os.getenv("KG_TENANT_WORKERS", os.getenv("LLM_MAX_CONCURRENCY", "4")))
+    kg_events_poll_seconds: float = float(os.getenv("KG_EVENTS_POLL_SECONDS", "1"))
+    kg_events_heartbeat_seconds: float = float(os.getenv("KG_EVENTS_HEARTBEAT_SECONDS", "15"))
+    kg_debounce_seconds: float = float(os.getenv("KG_DEBOUNCE_SECONDS", "5"))
+    kg_debounce_max_seconds: float = float(os.getenv("KG_DEBOUNCE_MAX_SECONDS", "60"))
+    kg_min_interval_seconds: float = float(os.getenv("KG_MIN_INTERVAL_SECONDS", "30"))
+    kg_pipeline_page_size: int = int(os.getenv("KG_PIPELINE_PAGE_SIZE", "200"))
+    kg_pipeline_content_workers: int = int(os.getenv("KG_PIPELINE_CONTENT_WORKERS", "8"))
+    kg_pipeline_embed_batch_size: int = int(os.getenv("KG_PIPELINE_EMBED_BATCH_SIZE", "16"))
+    kg_pipeline_queue_size: int = int(os.getenv("KG_PIPELINE_QUEUE_SIZE", "4"))
     max_note_bytes: int = int(os.getenv("MAX_NOTE_BYTES", "1048576"))
     min_note_chars: int = int(os.getenv("MIN_NOTE_CHARS", "1"))
     kg_min_strength: float = float(os.getenv("KG_MIN_STRENGTH", "0.2"))
     kg_max_edges: int = int(os.getenv("KG_MAX_EDGES", "500"))
+    kg_edge_floor: float = float(os.getenv("KG_EDGE_FLOOR", "0.1"))
+    kg_edge_store_max: int = int(os.getenv("KG_EDGE_STORE_MAX", "20000"))
+    kg_knn_threshold: int = int(os.getenv("KG_KNN_THRESHOLD", "500"))
+    kg_knn_neighbors: int = int(os.getenv("KG_KNN_NEIGHBORS", "10"))
+    kg_graph_mode: str = os.getenv("KG_GRAPH_MODE", "topics").lower()
+    kg_cluster_count: int = int(os.getenv("KG_CLUSTER_COUNT", "0"))
+    kg_cluster_naming: str = os.getenv("KG_CLUSTER_NAMING", "llm").lower()
+    kg_note_neighbors: int = int(os.getenv("KG_NOTE_NEIGHBORS", "8"))
+    kg_note_min_score: float = float(os.getenv("KG_NOTE_MIN_SCORE", "0.5"))
+    kg_note_ivf_threshold: int = int(os.getenv("KG_NOTE_IVF_THRESHOLD", "20000"))
+    kg_hierarchy_max_nodes: int = int(os.getenv("KG_HIERARCHY_MAX_NODES", "150"))
+    kg_layout_iterations: int = int(os.getenv("KG_LAYOUT_ITERATIONS", "60"))
+    kg_layout_warm_iterations: int = int(os.getenv("KG_LAYOUT_WARM_ITERATIONS", "15"))
+    kg_layout_sample: int = int(os.getenv("KG_LAYOUT_SAMPLE", "1000"))
+    kg_relationship_mode: str = os.getenv("KG_RELATIONSHIP_MODE", "embedding").lower()
+    kg_llm_exhaustive_max_topics: int = int(os.getenv("KG_LLM_EXHAUSTIVE_MAX_TOPICS", "20"))
+    kg_llm_candidate_neighbors: int = int(os.getenv("KG_LLM_CANDIDATE_NEIGHBORS", "5"))
     max_note_revisions: int = int(os.getenv("MAX_NOTE_REVISIONS", "20"))
 
     s3_endpoint: str | None = os.getenv("S3_ENDPOINT")
@@ -126,6 +126,11 @@ def init_db():
     """
     logger.info("Creating database tables...")
     Base.metadata.create_all(bind=engine)
+    try:
+        from app.services.topic_assignments import ensure_topic_schema
+        ensure_topic_schema(engine)
+    except Exception as e:
+        logger.warning("Topic assignment schema check failed: %s", e)
     try:
         from app.services.search import ensure_fts
         from app.services.vector_index_faiss import rebuild_index
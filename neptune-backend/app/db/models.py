@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey, Float, Index, UniqueConstraint
 from sqlalchemy.sql import func
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
@@ -70,6 +70,29 @@ class NoteEmbedding(Base):
 
     file = relationship("FileSystem", backref="embedding")
 
+class GraphCacheEntry(Base):
+    __tablename__ = "graph_cache"
+    __table_args__ = {"extend_existing": True}
+
+    key = Column(String(255), primary_key=True)
+    generation = Column(Integer, nullable=False, default=0)
+    fingerprint = Column(String(128), nullable=True)
+    etag = Column(String(64), nullable=True)
+    payload = Column(Text, nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class GenerationLease(Base):
+    __tablename__ = "generation_leases"
+    __table_args__ = {"extend_existing": True}
+
+    name = Column(String(255), primary_key=True)
+    holder = Column(String(255), nullable=True)
+    # Epoch seconds; compared against each replica's clock
+    expires_at = Column(Float, nullable=False, default=0.0)
+    heartbeat_at = Column(Float, nullable=True)
+    status = Column(Text, nullable=True)  # JSON generation status shared by replicas
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
 class Topic(Base):
     __tablename__ = "topics"
     __table_args__ = {'extend_existing': True}
@@ -82,15 +105,24 @@ class Topic(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
 class NoteTopic(Base):
+    """Topic assigned to a note for one prompt version, valid while the checksum matches."""
+
     __tablename__ = "note_topics"
-    __table_args__ = {'extend_existing': True}
+    __table_args__ = (
+        UniqueConstraint("file_id", "prompt_version", name="uq_note_topics_file_prompt"),
+        Index("ix_note_topics_topic_prompt", "topic_id", "prompt_version"),
+        {"extend_existing": True},
+    )
     
     id = Column(Integer, primary_key=True, index=True)
-    note_id = Column(Integer, ForeignKey('notes.id'), nullable=False)
+    file_id = Column(Integer, ForeignKey("filesystem.id"), nullable=False)
     topic_id = Column(Integer, ForeignKey('topics.id'), nullable=False)
+    content_checksum = Column(String(128), nullable=True)
+    prompt_version = Column(String(64), nullable=False)
     confidence = Column(String(50), default="medium")  # low, medium, high
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
     
     # Relationships
-    note = relationship("Note", backref="note_topics")
+    file = relationship("FileSystem", backref="note_topics")
     topic = relationship("Topic", backref="note_topics")
@@ -5,6 +5,7 @@ from app.core.logging import configure_logging, request_id_ctx
 from app.core.settings import settings
 from app.db.database import init_db
 from app.services.embeddings import start_background_backfill
+from app.services.http_client import http_pool
 import logging
 import socket
 import sys
@@ -29,6 +30,7 @@ async def lifespan(app: FastAPI):
     
     # Shutdown (if needed)
     logger.info("Neptune Backend shutting down...")
+    http_pool.close()
 
 # Create FastAPI app with lifespan handler
 app = FastAPI(
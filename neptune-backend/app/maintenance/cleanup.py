@@ -1,7 +1,6 @@
 import argparse
 import logging
-import os
-from typing import Set
+from typing import List, Set
 
 from app.core.settings import settings
 from app.db.database import SessionLocal
@@ -11,16 +10,39 @@ from app.services.storage import storage_client
 logger = logging.getLogger(__name__)
 
 
+def _cache_keys() -> List[str]:
+    """Store keys of every owner's graph caches (owners are read from notes)."""
+    from app.services.graph_tenants import scoped_key
+    from app.services.knowledge_graph import CLUSTER_MODEL_KEY, EDGE_LIST_KEY, GRAPH_CACHE_KEY
+    from app.services.note_graph import NOTE_GRAPH_KEY
+
+    db = SessionLocal()
+    try:
+        owners = {row[0] for row in db.query(FileSystem.owner_id).distinct()}
+    finally:
+        db.close()
+    owners.add(None)
+    return [
+        scoped_key(key, owner_id)
+        for owner_id in sorted(owners, key=lambda owner: owner or "")
+        for key in (GRAPH_CACHE_KEY, EDGE_LIST_KEY, CLUSTER_MODEL_KEY, NOTE_GRAPH_KEY)
+    ]
+
+
 def cleanup_cache(dry_run: bool) -> bool:
-    cache_path = settings.kg_cache_path
-    if not os.path.exists(cache_path):
-        logger.info("Cache file not found: %s", cache_path)
+    from app.services.graph_store import graph_store
+
+    backend = graph_store.backend
+    keys = [key for key in _cache_keys() if backend.version(key) is not None]
+    if not keys:
+        logger.info("Graph cache not found in %s store", backend.name)
         return False
-    if dry_run:
-        logger.info("Dry run: would remove cache file %s", cache_path)
-        return True
-    os.remove(cache_path)
-    logger.info("Removed cache file %s", cache_path)
+    for key in keys:
+        if dry_run:
+            logger.info("Dry run: would remove %s from %s store", key, backend.name)
+        else:
+            graph_store.delete(key)
+            logger.info("Removed %s from %s store", key, backend.name)
     return True
 
 
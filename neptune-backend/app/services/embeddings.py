@@ -4,12 +4,16 @@ import json
 import logging
 import threading
 from dataclasses import dataclass
-from typing import Dict, List
+from typing import Dict, List, Tuple
 
-import requests
+import httpx
 from sqlalchemy.orm import Session
 
 from app.core.settings import settings
+from app.services.http_client import http_pool
+from app.services.llm_scheduler import LLMScheduler, Priority, llm_priority
+from app.services.llm_service import llm_service
+from app.services.ollama_pool import OllamaPool, ollama_pool
 from app.db.models import FileSystem, NoteEmbedding
 from app.services.vector_index_faiss import load_index, save_index
 from app.db.database import SessionLocal
@@ -25,30 +29,56 @@ class EmbeddingResult:
 
 
 class EmbeddingService:
-    def __init__(self) -> None:
-        self.session = requests.Session()
-        self.current_endpoint = settings.ollama_url
+    def __init__(self, pool: OllamaPool | None = None, scheduler: LLMScheduler | None = None) -> None:
+        self.http = http_pool
+        self.pool = pool or ollama_pool
+        # Embeddings share the endpoints' slots, so they are admitted like LLM calls.
+        self.scheduler = scheduler or llm_service.scheduler
+
+    def _post(self, path: str, payload: Dict) -> httpx.Response:
+        # Admitted at the caller's priority and routed like LLM calls;
+        # server errors count against the endpoint's breaker.
+        with self.scheduler.slot(), self.pool.endpoint(settings.embedding_model) as endpoint:
+            response = self.http.post(
+                f"{endpoint.url}{path}",
+                json=payload,
+                timeout=(settings.ollama_connect_timeout_seconds, settings.ollama_timeout_seconds),
+            )
+            if response.status_code >= 500:
+                response.raise_for_status()
+        return response
 
     def embed(self, text: str) -> EmbeddingResult:
         payload = {
             "model": settings.embedding_model,
             "prompt": text[: settings.embedding_max_chars],
         }
-        response = self.session.post(
-            f"{self.current_endpoint}/api/embeddings",
-            json=payload,
-            timeout=(settings.ollama_connect_timeout_seconds, settings.ollama_timeout_seconds),
-        )
+        response = self._post("/api/embeddings", payload)
         response.raise_for_status()
         data = response.json()
         vector = data.get("embedding", [])
         return EmbeddingResult(vector=vector, dim=len(vector))
 
-    def set_endpoint(self, endpoint: str) -> None:
-        self.current_endpoint = endpoint
+    def embed_batch(self, texts: List[str]) -> List[EmbeddingResult]:
+        """Embed several texts in one request, falling back to per-text calls."""
+        if not texts:
+            return []
+        payload = {
+            "model": settings.embedding_model,
+            "input": [text[: settings.embedding_max_chars] for text in texts],
+        }
+        response = self._post("/api/embed", payload)
+        if response.status_code == 404:
+            # Older Ollama versions only expose the single-prompt endpoint.
+            return [self.embed(text) for text in texts]
+        response.raise_for_status()
+        vectors = response.json().get("embeddings", [])
+        if len(vectors) != len(texts):
+            raise ValueError("Embedding batch size mismatch")
+        return [EmbeddingResult(vector=vector, dim=len(vector)) for vector in vectors]
 
     def get_endpoint(self) -> str:
-        return self.current_endpoint
+        return self.pool.urls()[0]
 
 
 embedding_service = EmbeddingService()
@@ -90,6 +120,63 @@ def upsert_embedding(db: Session, item: FileSystem, content: str) -> None:
     save_index()
 
 
+def upsert_embeddings_batch(db: Session, items: List[Tuple[FileSystem, str]]) -> Dict[int, List[float]]:
+    """
+    Embed a batch of notes with one request and return their vectors.
+
+    Notes whose stored embedding matches the content checksum are reused
+    without calling the model. The vector index is saved once per batch.
+    """
+    if not items:
+        return {}
+    ids = [item.id for item, _ in items]
+    existing_rows = {
+        row.file_id: row
+        for row in db.query(NoteEmbedding).filter(NoteEmbedding.file_id.in_(ids)).all()
+    }
+    vectors: Dict[int, List[float]] = {}
+    to_embed: List[Tuple[FileSystem, str]] = []
+    for item, content in items:
+        row = existing_rows.get(item.id)
+        if row and item.content_checksum and row.content_checksum == item.content_checksum:
+            try:
+                vectors[item.id] = json.loads(row.vector)
+                continue
+            except Exception:
+                pass
+        to_embed.append((item, content))
+
+    if not to_embed:
+        return vectors
+
+    results = embedding_service.embed_batch([content for _, content in to_embed])
+    index = None
+    for (item, _), result in zip(to_embed, results):
+        if not result.vector:
+            continue
+        vector_json = json.dumps(result.vector)
+        row = existing_rows.get(item.id)
+        if row:
+            row.vector = vector_json
+            row.dim = result.dim
+            row.content_checksum = item.content_checksum
+        else:
+            db.add(
+                NoteEmbedding(
+                    file_id=item.id,
+                    vector=vector_json,
+                    dim=result.dim,
+                    content_checksum=item.content_checksum,
+                )
+            )
+        index = index or load_index(result.dim)
+        index.upsert(item.id, result.vector)
+        vectors[item.id] = result.vector
+    if index is not None:
+        save_index()
+    return vectors
+
+
 def delete_embedding(db: Session, file_id: int) -> None:
     existing = _get_note_embedding(db, file_id)
     if not existing:
@@ -148,7 +235,9 @@ def backfill_embeddings(db: Session, limit: int = 200) -> Dict[str, int]:
             skipped += 1
             continue
         try:
-            upsert_embedding(db, note, content)
+            # Bulk work: keep the reserved slot free for interactive calls.
+            with llm_priority(Priority.BACKFILL):
+                upsert_embedding(db, note, content)
             updated += 1
         except Exception as e:
             logger.warning("Embedding backfill failed for %s: %s", note.id, e)
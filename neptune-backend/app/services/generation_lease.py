@@ -0,0 +1,207 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
+
+from app.db.database import SessionLocal
+from app.db.models import GenerationLease as LeaseRow
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class LeaseState:
+    holder: Optional[str]
+    expires_at: float
+    heartbeat_at: Optional[float]
+    status: Optional[Dict[str, Any]]
+
+    def active(self, now: float | None = None) -> bool:
+        return self.holder is not None and self.expires_at > (now or time.time())
+
+
+class GenerationLease:
+    """
+    Cluster-wide single-flight lease stored in the ``generation_leases`` table.
+
+    Acquisition is a conditional UPDATE (free, expired, or already ours), so
+    exactly one replica wins regardless of database. While held, a heartbeat
+    thread extends the expiry every third of the TTL; a holder that crashes
+    simply stops renewing and the lease becomes available after the TTL.
+    The same row carries the holder's generation status so every replica
+    reports identical progress.
+    """
+
+    def __init__(self, name: str, ttl_seconds: float) -> None:
+        self.name = name
+        self.ttl_seconds = max(1.0, ttl_seconds)
+        self.holder_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.lost = threading.Event()
+        self._stop = threading.Event()
+        self._heartbeat: threading.Thread | None = None
+
+    def _ensure_row(self, db) -> None:
+        if db.query(LeaseRow.name).filter(LeaseRow.name == self.name).first() is not None:
+            return
+        db.add(LeaseRow(name=self.name, holder=None, expires_at=0.0))
+        try:
+            db.commit()
+        except IntegrityError:
+            # Another replica created the row first.
+            db.rollback()
+
+    def try_acquire(self) -> bool:
+        """Take the lease if it is free, expired or already ours."""
+        now = time.time()
+        db = SessionLocal()
+        try:
+            self._ensure_row(db)
+            updated = (
+                db.query(LeaseRow)
+                .filter(LeaseRow.name == self.name)
+                .filter(
+                    or_(
+                        LeaseRow.holder.is_(None),
+                        LeaseRow.holder == self.holder_id,
+                        LeaseRow.expires_at < now,
+                    )
+                )
+                .update(
+                    {
+                        LeaseRow.holder: self.holder_id,
+                        LeaseRow.expires_at: now + self.ttl_seconds,
+                        LeaseRow.heartbeat_at: now,
+                    },
+                    synchronize_session=False,
+                )
+            )
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.warning("Generation lease acquire failed: %s", e)
+            return False
+        finally:
+            db.close()
+
+        if not updated:
+            return False
+        self.lost.clear()
+        self._start_heartbeat()
+        return True
+
+    def renew(self) -> bool:
+        """Extend the expiry; False means another replica took the lease."""
+        now = time.time()
+        db = SessionLocal()
+        try:
+            updated = (
+                db.query(LeaseRow)
+                .filter(LeaseRow.name == self.name)
+                .filter(LeaseRow.holder == self.holder_id)
+                .update(
+                    {LeaseRow.expires_at: now + self.ttl_seconds, LeaseRow.heartbeat_at: now},
+                    synchronize_session=False,
+                )
+            )
+            db.commit()
+            return bool(updated)
+        except Exception as e:
+            db.rollback()
+            logger.warning("Generation lease renew failed: %s", e)
+            # Keep the lease on transient errors; expiry still bounds it.
+            return True
+        finally:
+            db.close()
+
+    def release(self) -> None:
+        self._stop_heartbeat()
+        db = SessionLocal()
+        try:
+            (
+                db.query(LeaseRow)
+                .filter(LeaseRow.name == self.name)
+                .filter(LeaseRow.holder == self.holder_id)
+                .update({LeaseRow.holder: None, LeaseRow.expires_at: 0.0}, synchronize_session=False)
+            )
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.warning("Generation lease release failed: %s", e)
+        finally:
+            db.close()
+
+    def publish_status(self, status: Dict[str, Any]) -> None:
+        """Store generation status on the lease row; only the holder can write."""
+        db = SessionLocal()
+        try:
+            (
+                db.query(LeaseRow)
+                .filter(LeaseRow.name == self.name)
+                .filter(LeaseRow.holder == self.holder_id)
+                .update({LeaseRow.status: json.dumps(status)}, synchronize_session=False)
+            )
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.debug("Generation status publish failed: %s", e)
+        finally:
+            db.close()
+
+    def read(self) -> Optional[LeaseState]:
+        db = SessionLocal()
+        try:
+            row = db.query(LeaseRow).filter(LeaseRow.name == self.name).first()
+            if row is None:
+                return None
+            status = None
+            if row.status:
+                try:
+                    status = json.loads(row.status)
+                except ValueError:
+                    status = None
+            return LeaseState(
+                holder=row.holder,
+                expires_at=row.expires_at or 0.0,
+                heartbeat_at=row.heartbeat_at,
+                status=status,
+            )
+        except Exception as e:
+            logger.debug("Generation lease read failed: %s", e)
+            return None
+        finally:
+            db.close()
+
+    def held_elsewhere(self) -> bool:
+        state = self.read()
+        return bool(state and state.active() and state.holder != self.holder_id)
+
+    def _start_heartbeat(self) -> None:
+        if self._heartbeat is not None and self._heartbeat.is_alive():
+            return
+        self._stop.clear()
+        self._heartbeat = threading.Thread(target=self._heartbeat_loop, name="kg-lease", daemon=True)
+        self._heartbeat.start()
+
+    def _stop_heartbeat(self) -> None:
+        self._stop.set()
+        if self._heartbeat is not None and self._heartbeat is not threading.current_thread():
+            self._heartbeat.join(timeout=5)
+        self._heartbeat = None
+
+    def _heartbeat_loop(self) -> None:
+        interval = self.ttl_seconds / 3
+        while not self._stop.wait(interval):
+            if not self.renew():
+                logger.warning("Generation lease %s lost to another replica", self.name)
+                self.lost.set()
+                return
@@ -0,0 +1,196 @@
+from __future__ import annotations
+
+import logging
+import math
+import re
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from sklearn.cluster import MiniBatchKMeans
+
+from app.core.settings import settings
+from app.services.llm_scheduler import LLMUnavailableError, retry_busy
+from app.services.llm_service import llm_service
+
+logger = logging.getLogger(__name__)
+
+_TOKEN = re.compile(r"[a-z][a-z0-9]{2,}")
+_STOPWORDS = {
+    "the", "and", "for", "are", "but", "not", "you", "all", "any", "can", "had", "her", "was",
+    "one", "our", "out", "has", "have", "this", "that", "with", "from", "they", "will", "would",
+    "there", "their", "what", "about", "which", "when", "where", "your", "into", "than", "then",
+    "them", "these", "those", "been", "were", "also", "some", "such", "only", "other", "more",
+    "most", "very", "just", "like", "each", "how", "who", "its", "may", "use", "used", "using",
+}
+_REPRESENTATIVES = 3
+_KEYWORDS = 5
+
+
+def note_terms(content: str, limit: int = 50) -> Dict[str, int]:
+    """Most frequent content words of a note, used for c-TF-IDF cluster keywords."""
+    counts = Counter(token for token in _TOKEN.findall(content.lower()) if token not in _STOPWORDS)
+    return dict(counts.most_common(limit))
+
+
+@dataclass
+class ClusterModel:
+    """Named k-means centroids; new notes join the nearest centroid."""
+
+    names: List[str]
+    centroids: np.ndarray
+
+    def assign(self, vector: List[float]) -> Optional[str]:
+        if not self.names or len(vector) != self.centroids.shape[1]:
+            return None
+        vec = _normalize(np.asarray([vector], dtype="float32"))
+        return self.names[int(np.argmax(_normalize(self.centroids) @ vec[0]))]
+
+    def topic_vectors(self) -> Dict[str, List[float]]:
+        return {name: self.centroids[i].tolist() for i, name in enumerate(self.names)}
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"names": self.names, "centroids": self.centroids.tolist()}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> Optional["ClusterModel"]:
+        names = data.get("names") or []
+        centroids = data.get("centroids") or []
+        if not names or len(names) != len(centroids):
+            return None
+        return cls(names=list(names), centroids=np.asarray(centroids, dtype="float32"))
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def cluster_count(note_count: int) -> int:
+    if settings.kg_cluster_count > 0:
+        return max(1, min(settings.kg_cluster_count, note_count))
+    return max(1, min(note_count, round(math.sqrt(note_count / 2))))
+
+
+def fit_clusters(
+    vectors: np.ndarray,
+    k: int,
+    previous: Optional[ClusterModel] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Mini-batch k-means on normalized vectors (cosine geometry).
+
+    Previous centroids seed the run when the shape still matches, which
+    keeps cluster identities (and names) stable across refreshes.
+    """
+    data = _normalize(vectors.astype("float32"))
+    if previous is not None and previous.centroids.shape == (k, data.shape[1]):
+        init: Any = _normalize(previous.centroids.astype("float32"))
+        n_init = 1
+    else:
+        init = "k-means++"
+        n_init = 3
+    model = MiniBatchKMeans(
+        n_clusters=k,
+        init=init,
+        n_init=n_init,
+        batch_size=1024,
+        random_state=0,
+    )
+    labels = model.fit_predict(data)
+    return labels, model.cluster_centers_.astype("float32")
+
+
+def keyword_labels(cluster_terms: List[Counter], top_n: int = _KEYWORDS) -> List[List[str]]:
+    """Class-based TF-IDF: words frequent in one cluster but rare across clusters."""
+    totals: Counter = Counter()
+    for terms in cluster_terms:
+        totals.update(terms)
+    sizes = [sum(terms.values()) for terms in cluster_terms]
+    average = (sum(sizes) / len(sizes)) if sizes else 0.0
+    keywords = []
+    for terms, size in zip(cluster_terms, sizes):
+        if not size:
+            keywords.append([])
+            continue
+        scored = sorted(
+            terms.items(),
+            key=lambda item: (item[1] / size) * math.log(1 + average / totals[item[0]]),
+            reverse=True,
+        )
+        keywords.append([term for term, _ in scored[:top_n]])
+    return keywords
+
+
+def _unique_names(names: List[str]) -> List[str]:
+    seen: Counter = Counter()
+    unique = []
+    for name in names:
+        seen[name] += 1
+        unique.append(name if seen[name] == 1 else f"{name} {seen[name]}")
+    return unique
+
+
+def name_clusters(keywords: List[List[str]], titles: List[List[str]]) -> List[str]:
+    """One LLM call for all clusters, falling back to the top c-TF-IDF keywords."""
+    fallback = [" ".join(words[:2]) or f"cluster {i}" for i, words in enumerate(keywords)]
+    names: Dict[str, str] = {}
+    if settings.kg_cluster_naming == "llm":
+        clusters = [
+            {"id": str(i), "keywords": words, "titles": titles[i]}
+            for i, words in enumerate(keywords)
+        ]
+        try:
+            names = retry_busy(lambda: llm_service.name_clusters(clusters), what="Cluster naming")
+        except LLMUnavailableError as e:
+            logger.warning("Cluster naming failed: %s", e)
+    return _unique_names([names.get(str(i)) or fallback[i] for i in range(len(keywords))])
+
+
+def build_cluster_model(
+    notes: List[Dict[str, Any]],
+    previous: Optional[ClusterModel] = None,
+) -> Tuple[Optional[ClusterModel], Dict[str, List[str]]]:
+    """
+    Cluster embedded notes and name the clusters.
+
+    ``notes`` carry ``note_id``, ``name``, ``vector`` and ``terms``. Notes
+    without a vector of the common dimension are left out. Returns the
+    model and the topic -> note ids map.
+    """
+    usable = [note for note in notes if note.get("vector")]
+    if not usable:
+        return None, {}
+    dim = len(usable[0]["vector"])
+    usable = [note for note in usable if len(note["vector"]) == dim]
+    vectors = np.asarray([note["vector"] for note in usable], dtype="float32")
+    k = cluster_count(len(usable))
+    labels, centroids = fit_clusters(vectors, k, previous)
+
+    members: List[List[int]] = [[] for _ in range(k)]
+    for index, label in enumerate(labels.tolist()):
+        members[label].append(index)
+    occupied = [cluster for cluster in range(k) if members[cluster]]
+
+    normalized = _normalize(vectors)
+    cluster_terms: List[Counter] = []
+    titles: List[List[str]] = []
+    for cluster in occupied:
+        terms: Counter = Counter()
+        for index in members[cluster]:
+            terms.update(usable[index].get("terms") or {})
+        cluster_terms.append(terms)
+        idx = np.asarray(members[cluster])
+        closest = idx[np.argsort(-(normalized[idx] @ centroids[cluster]))[:_REPRESENTATIVES]]
+        titles.append([usable[i]["name"] for i in closest.tolist()])
+
+    names = name_clusters(keyword_labels(cluster_terms), titles)
+    topic_map = {
+        name: [usable[index]["note_id"] for index in members[cluster]]
+        for name, cluster in zip(names, occupied)
+    }
+    model = ClusterModel(names=names, centroids=centroids[occupied])
+    logger.info("Clustered %s notes into %s named clusters", len(usable), len(names))
+    return model, topic_map
@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any, Collection, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.settings import settings
+
+
+@dataclass
+class EdgeList:
+    """
+    Every scored topic edge above ``kg_edge_floor``, sorted by strength.
+
+    Strength thresholds and edge budgets are applied at read time with a
+    binary search over ``strength``, so density can be tuned per request
+    without rescoring.
+    """
+
+    topics: List[str]
+    source: np.ndarray
+    target: np.ndarray
+    strength: np.ndarray
+
+    @classmethod
+    def from_edges(cls, edges: Iterable[Tuple[str, str, float]], floor: Optional[float] = None) -> "EdgeList":
+        floor = settings.kg_edge_floor if floor is None else floor
+        positions: Dict[str, int] = {}
+        # Undirected key -> (strength, source, target); the edge keeps its orientation.
+        best: Dict[Tuple[int, int], Tuple[float, int, int]] = {}
+        for a, b, strength in edges:
+            if a == b or strength < floor:
+                continue
+            i = positions.setdefault(a, len(positions))
+            j = positions.setdefault(b, len(positions))
+            key = (i, j) if i < j else (j, i)
+            if key not in best or strength > best[key][0]:
+                best[key] = (float(strength), i, j)
+        rows = np.asarray(list(best.values()), dtype="float64").reshape(-1, 3)
+        weights = rows[:, 0]
+        pairs = rows[:, 1:].astype("int64")
+        order = np.argsort(-weights, kind="stable")
+        limit = settings.kg_edge_store_max
+        if limit > 0:
+            order = order[:limit]
+        return cls(
+            topics=list(positions.keys()),
+            source=pairs[order, 0],
+            target=pairs[order, 1],
+            strength=weights[order],
+        )
+
+    @classmethod
+    def from_links(cls, links: Iterable[Dict[str, Any]]) -> "EdgeList":
+        return cls.from_edges(
+            ((link["source"], link["target"], float(link.get("strength", 0.0))) for link in links),
+            floor=0.0,
+        )
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "EdgeList":
+        return cls(
+            topics=list(data.get("topics", [])),
+            source=np.asarray(data.get("source", []), dtype="int64"),
+            target=np.asarray(data.get("target", []), dtype="int64"),
+            strength=np.asarray(data.get("strength", []), dtype="float64"),
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "topics": self.topics,
+            "source": self.source.tolist(),
+            "target": self.target.tolist(),
+            "strength": self.strength.tolist(),
+        }
+
+    def __len__(self) -> int:
+        return len(self.strength)
+
+    def edges(self) -> List[Tuple[str, str, float]]:
+        return [
+            (self.topics[a], self.topics[b], weight)
+            for a, b, weight in zip(self.source.tolist(), self.target.tolist(), self.strength.tolist())
+        ]
+
+    def without(self, topics: Collection[str]) -> List[Tuple[str, str, float]]:
+        """Edges not touching any of ``topics``."""
+        excluded = np.asarray([topic in topics for topic in self.topics], dtype=bool)
+        if not excluded.size:
+            return []
+        keep = ~(excluded[self.source] | excluded[self.target])
+        return [
+            (self.topics[a], self.topics[b], weight)
+            for a, b, weight in zip(
+                self.source[keep].tolist(), self.target[keep].tolist(), self.strength[keep].tolist()
+            )
+        ]
+
+    def select(
+        self,
+        min_strength: Optional[float] = None,
+        max_edges: Optional[int] = None,
+        max_degree: int = 0,
+        node_ids: Optional[Collection[str]] = None,
+    ) -> List[Tuple[str, str, float]]:
+        """
+        Strongest edges at or above ``min_strength``, at most ``max_edges``.
+
+        ``max_degree`` caps links per node (greedily, strongest first) and
+        ``node_ids`` drops edges to topics no longer in the graph.
+        """
+        min_strength = settings.kg_min_strength if min_strength is None else min_strength
+        max_edges = settings.kg_max_edges if max_edges is None else max_edges
+        # ``strength`` is descending, so ``-strength`` is ascending.
+        end = int(np.searchsorted(-self.strength, -min_strength, side="right"))
+        source, target, strength = self.source[:end], self.target[:end], self.strength[:end]
+        if node_ids is not None:
+            present = np.asarray([topic in node_ids for topic in self.topics], dtype=bool)
+            if present.size:
+                keep = present[source] & present[target]
+                source, target, strength = source[keep], target[keep], strength[keep]
+        if max_degree > 0:
+            degree = np.zeros(len(self.topics), dtype="int64")
+            keep = np.zeros(len(strength), dtype=bool)
+            kept = 0
+            for i, (a, b) in enumerate(zip(source.tolist(), target.tolist())):
+                if degree[a] < max_degree and degree[b] < max_degree:
+                    degree[a] += 1
+                    degree[b] += 1
+                    keep[i] = True
+                    kept += 1
+                    if max_edges > 0 and kept >= max_edges:
+                        break
+            source, target, strength = source[keep], target[keep], strength[keep]
+        if max_edges > 0:
+            source, target, strength = source[:max_edges], target[:max_edges], strength[:max_edges]
+        return [
+            (self.topics[a], self.topics[b], weight)
+            for a, b, weight in zip(source.tolist(), target.tolist(), strength.tolist())
+        ]
+
+    def links(self, **kwargs: Any) -> List[Dict[str, Any]]:
+        return [{"source": a, "target": b, "strength": weight} for a, b, weight in self.select(**kwargs)]
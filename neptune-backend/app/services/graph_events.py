@@ -0,0 +1,224 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app.core.settings import settings
+from app.services.graph_store import CachedGraph
+
+logger = logging.getLogger(__name__)
+
+_DIFF_CACHE_SIZE = 8
+
+
+class GraphEventBus:
+    """
+    Wakes event streams in this process when the graph or status changes.
+
+    Publishers run in worker threads, so subscribers are woken through their
+    own event loop. Changes made by other replicas are picked up by the
+    streams' store polling instead.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._subscribers: set[Tuple[asyncio.AbstractEventLoop, asyncio.Event]] = set()
+        self.version = 0
+
+    def subscribe(self) -> asyncio.Event:
+        event = asyncio.Event()
+        with self._lock:
+            self._subscribers.add((asyncio.get_running_loop(), event))
+        return event
+
+    def unsubscribe(self, event: asyncio.Event) -> None:
+        with self._lock:
+            self._subscribers = {item for item in self._subscribers if item[1] is not event}
+
+    def notify(self) -> None:
+        with self._lock:
+            self.version += 1
+            subscribers = list(self._subscribers)
+        for loop, event in subscribers:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                # The subscriber's loop has shut down.
+                self.unsubscribe(event)
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return len(self._subscribers)
+
+
+def _link_key(link: Dict[str, Any]) -> Tuple[str, str]:
+    a, b = str(link["source"]), str(link["target"])
+    return (a, b) if a <= b else (b, a)
+
+
+def _diff_items(
+    old: Dict[Any, Dict[str, Any]],
+    new: Dict[Any, Dict[str, Any]],
+) -> Tuple[List[Dict[str, Any]], List[Any], List[Dict[str, Any]]]:
+    added = [item for key, item in new.items() if key not in old]
+    removed = [key for key in old if key not in new]
+    changed = [item for key, item in new.items() if key in old and old[key] != item]
+    return added, removed, changed
+
+
+def graph_diff(old: Dict[str, Any], new: Dict[str, Any]) -> Dict[str, Any]:
+    """Nodes and links added, removed or changed between two graph payloads."""
+    nodes_added, nodes_removed, nodes_changed = _diff_items(
+        {node["id"]: node for node in old.get("nodes", [])},
+        {node["id"]: node for node in new.get("nodes", [])},
+    )
+    links_added, links_removed, links_changed = _diff_items(
+        {_link_key(link): link for link in old.get("links", [])},
+        {_link_key(link): link for link in new.get("links", [])},
+    )
+    return {
+        "nodes": {"added": nodes_added, "removed": nodes_removed, "changed": nodes_changed},
+        "links": {
+            "added": links_added,
+            "removed": [{"source": a, "target": b} for a, b in links_removed],
+            "changed": links_changed,
+        },
+    }
+
+
+_diff_lock = threading.Lock()
+_diff_cache: "OrderedDict[Tuple[int, int], Dict[str, Any]]" = OrderedDict()
+
+
+def _cached_diff(old: CachedGraph, new: CachedGraph) -> Dict[str, Any]:
+    """Diff between two generations, computed once for all connected clients."""
+    key = (old.generation, new.generation)
+    with _diff_lock:
+        if key in _diff_cache:
+            _diff_cache.move_to_end(key)
+            return _diff_cache[key]
+    diff = graph_diff(old.graph, new.graph)
+    with _diff_lock:
+        _diff_cache[key] = diff
+        while len(_diff_cache) > _DIFF_CACHE_SIZE:
+            _diff_cache.popitem(last=False)
+    return diff
+
+
+def format_event(event: str, data: Any, event_id: Optional[int] = None) -> str:
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, separators=(',', ':'))}")
+    return "\n".join(lines) + "\n\n"
+
+
+class _StatusSnapshot:
+    """
+    Generation status per owner, shared by that owner's streams and
+    refreshed at most once per poll interval or bus change.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._entries: Dict[Optional[str], Tuple[Tuple[int, int], Dict[str, Any]]] = {}
+
+    def get(
+        self, owner_id: Optional[str], load: Callable[[], Dict[str, Any]], poll_seconds: float
+    ) -> Dict[str, Any]:
+        bucket = int(time.monotonic() / poll_seconds) if poll_seconds > 0 else time.monotonic_ns()
+        key = (graph_event_bus.version, bucket)
+        with self._lock:
+            entry = self._entries.get(owner_id)
+            if entry is not None and entry[0] == key:
+                return entry[1]
+        value = load()
+        with self._lock:
+            self._entries[owner_id] = (key, value)
+        return value
+
+
+_status_snapshot = _StatusSnapshot()
+
+
+async def stream_graph_events(
+    load_entry: Callable[[], Optional[CachedGraph]],
+    load_status: Callable[[], Dict[str, Any]],
+    is_disconnected: Callable[[], Awaitable[bool]],
+    last_generation: Optional[int] = None,
+    owner_id: Optional[str] = None,
+) -> AsyncIterator[str]:
+    """
+    Server-sent events for the cached graph.
+
+    Emits a ``graph`` snapshot when the client's ``last_generation`` is
+    unknown or stale, then a ``diff`` per new store generation, ``status``
+    whenever generation progress changes, and ``heartbeat`` when idle.
+    Event ids are graph generations, so a reconnecting browser resumes with
+    ``Last-Event-ID``. ``owner_id`` names whose status ``load_status``
+    returns, so streams of different owners never share a snapshot.
+    """
+    poll_seconds = max(0.05, settings.kg_events_poll_seconds)
+    heartbeat_seconds = max(poll_seconds, settings.kg_events_heartbeat_seconds)
+    wake = graph_event_bus.subscribe()
+    sent: Optional[CachedGraph] = None
+    sent_generation = last_generation
+    sent_status: Optional[Dict[str, Any]] = None
+    last_sent_at = time.monotonic()
+    try:
+        yield f"retry: {int(poll_seconds * 3000)}\n\n"
+        while not await is_disconnected():
+            wake.clear()
+            messages: List[str] = []
+            entry = await asyncio.to_thread(load_entry)
+            generation = entry.generation if entry is not None else None
+            if generation != sent_generation:
+                if entry is None:
+                    messages.append(format_event("graph", {"generation": None, "nodes": [], "links": []}))
+                elif sent is not None and sent.generation == sent_generation:
+                    diff = await asyncio.to_thread(_cached_diff, sent, entry)
+                    messages.append(
+                        format_event(
+                            "diff",
+                            {"from": sent.generation, "generation": entry.generation, "etag": entry.etag, **diff},
+                            event_id=entry.generation,
+                        )
+                    )
+                else:
+                    messages.append(
+                        format_event(
+                            "graph",
+                            {"generation": entry.generation, "etag": entry.etag, **entry.graph},
+                            event_id=entry.generation,
+                        )
+                    )
+                sent_generation = generation
+            sent = entry
+
+            status = await asyncio.to_thread(_status_snapshot.get, owner_id, load_status, poll_seconds)
+            if status != sent_status:
+                messages.append(format_event("status", status))
+                sent_status = status
+
+            now = time.monotonic()
+            if not messages and now - last_sent_at >= heartbeat_seconds:
+                messages.append(format_event("heartbeat", {"generation": generation, "at": time.time()}))
+            for message in messages:
+                yield message
+            if messages:
+                last_sent_at = now
+            try:
+                await asyncio.wait_for(wake.wait(), timeout=poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        graph_event_bus.unsubscribe(wake)
+
+
+graph_event_bus = GraphEventBus()
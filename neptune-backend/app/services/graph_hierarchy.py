@@ -0,0 +1,187 @@
+from __future__ import annotations
+
+import logging
+import math
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Tuple
+
+import networkx as nx
+from networkx.algorithms.community import louvain_communities
+
+from app.core.settings import settings
+
+logger = logging.getLogger(__name__)
+
+NOTE_PREFIX = "note:"
+
+
+@dataclass
+class GraphHierarchy:
+    """
+    Multi-level view of the topic graph: groups -> topics -> notes.
+
+    Level 0 holds at most ``kg_hierarchy_max_nodes`` nodes. Each deeper
+    level expands the one above it, ending with topics and then notes, so a
+    client can render one level and expand nodes on demand.
+    """
+
+    nodes: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+    children: Dict[str, List[str]] = field(default_factory=dict)
+    levels: List[List[str]] = field(default_factory=list)
+    links: List[List[Tuple[str, str, float]]] = field(default_factory=list)
+
+    def level(self, level: int, limit: int) -> Dict[str, Any]:
+        if level < 0 or level >= len(self.levels):
+            return {"level": level, "levels": len(self.levels), "nodes": [], "links": [], "total": 0}
+        ids = self.levels[level]
+        selected = ids[:limit]
+        return {
+            "level": level,
+            "levels": len(self.levels),
+            "nodes": [self.nodes[node_id] for node_id in selected],
+            "links": self._links_within(level, set(selected)),
+            "total": len(ids),
+        }
+
+    def expand(self, node_id: str, limit: int, offset: int = 0) -> Dict[str, Any] | None:
+        if node_id not in self.nodes:
+            return None
+        child_ids = self.children.get(node_id, [])
+        selected = child_ids[offset : offset + limit]
+        child_level = self.nodes[node_id]["level"] + 1
+        return {
+            "node": self.nodes[node_id],
+            "nodes": [self.nodes[child] for child in selected],
+            "links": self._links_within(child_level, set(selected)),
+            "total": len(child_ids),
+            "offset": offset,
+        }
+
+    def _links_within(self, level: int, ids: set[str]) -> List[Dict[str, Any]]:
+        if level >= len(self.links):
+            return []
+        return [
+            {"source": a, "target": b, "strength": strength}
+            for a, b, strength in self.links[level]
+            if a in ids and b in ids
+        ]
+
+
+def _group(
+    node_ids: List[str],
+    edges: List[Tuple[str, str, float]],
+    sizes: Dict[str, int],
+    max_nodes: int,
+) -> List[List[str]]:
+    """Partition nodes into communities; falls back to size buckets when modularity can't reduce."""
+    graph = nx.Graph()
+    graph.add_nodes_from(node_ids)
+    graph.add_weighted_edges_from(edges)
+    communities = [sorted(c, key=lambda n: -sizes.get(n, 0)) for c in louvain_communities(graph, weight="weight", seed=0)]
+    if len(communities) > max_nodes:
+        # Isolated nodes stay singletons under Louvain; bucket the small
+        # communities by size so the level still fits the budget.
+        communities.sort(key=lambda c: -sum(sizes.get(n, 0) for n in c))
+        keep = communities[: max_nodes - 1]
+        rest = [n for c in communities[max_nodes - 1 :] for n in c]
+        bucket = math.ceil(len(rest) / max(1, max_nodes - len(keep))) if rest else 1
+        communities = keep + [rest[i : i + bucket] for i in range(0, len(rest), bucket)]
+    return communities
+
+
+def _aggregate_edges(
+    edges: List[Tuple[str, str, float]],
+    parent_of: Dict[str, str],
+) -> List[Tuple[str, str, float]]:
+    totals: Dict[Tuple[str, str], float] = {}
+    for a, b, strength in edges:
+        pa, pb = parent_of[a], parent_of[b]
+        if pa == pb:
+            continue
+        key = (pa, pb) if pa < pb else (pb, pa)
+        totals[key] = totals.get(key, 0.0) + strength
+    if not totals:
+        return []
+    peak = max(totals.values())
+    return [(a, b, total / peak) for (a, b), total in totals.items()]
+
+
+def build_hierarchy(graph_data: Dict[str, Any], max_nodes: int | None = None) -> GraphHierarchy:
+    """Build the hierarchy by repeatedly grouping the topic graph with Louvain communities."""
+    max_nodes = max(2, max_nodes or settings.kg_hierarchy_max_nodes)
+    hierarchy = GraphHierarchy()
+    topics = sorted(graph_data.get("nodes", []), key=lambda n: -n.get("noteCount", 0))
+
+    # Bottom two levels: topics and their notes.
+    topic_ids = [topic["id"] for topic in topics]
+    sizes = {topic["id"]: topic.get("noteCount", len(topic.get("noteIds", []))) for topic in topics}
+    note_level: List[str] = []
+    for topic in topics:
+        hierarchy.nodes[topic["id"]] = {
+            "id": topic["id"],
+            "label": topic.get("label", topic["id"]),
+            "kind": "topic",
+            "noteCount": sizes[topic["id"]],
+            "childCount": len(topic.get("noteDetails", [])),
+        }
+        child_ids = []
+        for detail in topic.get("noteDetails", []):
+            note_id = f"{NOTE_PREFIX}{detail['id']}"
+            hierarchy.nodes[note_id] = {
+                "id": note_id,
+                "label": detail.get("name"),
+                "kind": "note",
+                "noteId": detail["id"],
+                "parent": topic["id"],
+            }
+            child_ids.append(note_id)
+            note_level.append(note_id)
+        hierarchy.children[topic["id"]] = child_ids
+    topic_edges = [
+        (link["source"], link["target"], float(link.get("strength", 0.0)))
+        for link in graph_data.get("links", [])
+        if link["source"] in sizes and link["target"] in sizes
+    ]
+
+    tiers: List[Tuple[List[str], List[Tuple[str, str, float]]]] = [(note_level, []), (topic_ids, topic_edges)]
+    current, edges, depth = topic_ids, topic_edges, 0
+    while len(current) > max_nodes:
+        communities = _group(current, edges, sizes, max_nodes)
+        if len(communities) >= len(current):
+            break
+        parent_of: Dict[str, str] = {}
+        parents: List[str] = []
+        for index, members in enumerate(sorted(communities, key=lambda c: -sum(sizes.get(n, 0) for n in c))):
+            group_id = f"group:{depth}:{index}"
+            note_count = sum(sizes.get(member, 0) for member in members)
+            labels = [hierarchy.nodes[member]["label"] for member in members[:3]]
+            label = ", ".join(labels) + (f" +{len(members) - 3}" if len(members) > 3 else "")
+            hierarchy.nodes[group_id] = {
+                "id": group_id,
+                "label": label,
+                "kind": "group",
+                "noteCount": note_count,
+                "childCount": len(members),
+            }
+            hierarchy.children[group_id] = list(members)
+            sizes[group_id] = note_count
+            for member in members:
+                parent_of[member] = group_id
+                hierarchy.nodes[member]["parent"] = group_id
+            parents.append(group_id)
+        edges = _aggregate_edges(edges, parent_of)
+        current = parents
+        depth += 1
+        tiers.append((current, edges))
+
+    for level, (ids, level_edges) in enumerate(reversed(tiers)):
+        for node_id in ids:
+            hierarchy.nodes[node_id]["level"] = level
+        hierarchy.levels.append(ids)
+        hierarchy.links.append(level_edges)
+    logger.info(
+        "Built graph hierarchy with %s levels (%s top-level nodes)",
+        len(hierarchy.levels),
+        len(hierarchy.levels[0]) if hierarchy.levels else 0,
+    )
+    return hierarchy
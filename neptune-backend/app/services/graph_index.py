@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+
+@dataclass
+class GraphIndex:
+    """
+    CSR adjacency over the cached topic graph.
+
+    Row ``i`` of (``indptr``, ``indices``, ``weights``) lists topic ``i``'s
+    neighbours ordered by descending link strength, so neighbourhood and
+    subgraph queries touch only the rows they need.
+    """
+
+    topics: List[str]
+    positions: Dict[str, int]
+    nodes: List[Dict[str, Any]]
+    indptr: np.ndarray
+    indices: np.ndarray
+    weights: np.ndarray
+    note_topics: Dict[str, List[int]]
+
+    @classmethod
+    def from_graph(cls, graph_data: Dict[str, Any]) -> "GraphIndex":
+        nodes = list(graph_data.get("nodes", []))
+        topics = [node["id"] for node in nodes]
+        positions = {topic: i for i, topic in enumerate(topics)}
+        src: List[int] = []
+        dst: List[int] = []
+        strength: List[float] = []
+        for link in graph_data.get("links", []):
+            a = positions.get(link["source"])
+            b = positions.get(link["target"])
+            if a is None or b is None or a == b:
+                continue
+            weight = float(link.get("strength", 0.0))
+            src.extend((a, b))
+            dst.extend((b, a))
+            strength.extend((weight, weight))
+
+        src_arr = np.asarray(src, dtype="int64")
+        dst_arr = np.asarray(dst, dtype="int64")
+        weight_arr = np.asarray(strength, dtype="float64")
+        order = np.lexsort((-weight_arr, src_arr))
+        indptr = np.zeros(len(topics) + 1, dtype="int64")
+        if len(topics):
+            np.cumsum(np.bincount(src_arr, minlength=len(topics)), out=indptr[1:])
+
+        note_topics: Dict[str, List[int]] = {}
+        for i, node in enumerate(nodes):
+            for note_id in node.get("noteIds", []):
+                note_topics.setdefault(str(note_id), []).append(i)
+
+        return cls(
+            topics=topics,
+            positions=positions,
+            nodes=nodes,
+            indptr=indptr,
+            indices=dst_arr[order],
+            weights=weight_arr[order],
+            note_topics=note_topics,
+        )
+
+    def _row(self, position: int) -> tuple[np.ndarray, np.ndarray]:
+        start, end = self.indptr[position], self.indptr[position + 1]
+        return self.indices[start:end], self.weights[start:end]
+
+    def _payload(self, selected: Iterable[int]) -> Dict[str, Any]:
+        chosen = list(dict.fromkeys(selected))
+        members = set(chosen)
+        links = []
+        for position in chosen:
+            neighbours, weights = self._row(position)
+            for other, weight in zip(neighbours.tolist(), weights.tolist()):
+                if other in members and position < other:
+                    links.append(
+                        {"source": self.topics[position], "target": self.topics[other], "strength": weight}
+                    )
+        return {"nodes": [self.nodes[position] for position in chosen], "links": links}
+
+    def neighbors(self, topic: str, depth: int = 1, limit: int = 50) -> Optional[Dict[str, Any]]:
+        """Breadth-first neighbourhood, strongest links first, capped at ``limit`` nodes."""
+        start = self.positions.get(topic)
+        if start is None:
+            return None
+        seen = [start]
+        visited = {start}
+        frontier = [start]
+        for _ in range(max(0, depth)):
+            next_frontier = []
+            for position in frontier:
+                for other in self._row(position)[0].tolist():
+                    if other in visited:
+                        continue
+                    if len(seen) >= limit:
+                        break
+                    visited.add(other)
+                    seen.append(other)
+                    next_frontier.append(other)
+            frontier = next_frontier
+            if not frontier or len(seen) >= limit:
+                break
+        return {"topic": topic, "depth": depth, **self._payload(seen)}
+
+    def subgraph(self, note_ids: Iterable[str], limit: int = 500) -> Dict[str, Any]:
+        """Topics containing any of ``note_ids`` and the links among them."""
+        selected: List[int] = []
+        for note_id in note_ids:
+            selected.extend(self.note_topics.get(str(note_id), []))
+        return self._payload(selected[:limit])
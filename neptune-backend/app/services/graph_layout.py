@@ -0,0 +1,198 @@
+from __future__ import annotations
+
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.settings import settings
+
+logger = logging.getLogger(__name__)
+
+_BLOCK = 256
+# Matches the sphere radius the frontend used before server-side layout.
+_BASE_RADIUS = 50.0
+
+
+def _radius(count: int) -> float:
+    return _BASE_RADIUS * max(1.0, (count / 50.0) ** (1.0 / 3.0))
+
+
+def _edges(graph_data: Dict[str, Any], positions: Dict[str, int]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    src, dst, weights = [], [], []
+    for link in graph_data.get("links", []):
+        a = positions.get(link["source"])
+        b = positions.get(link["target"])
+        if a is None or b is None or a == b:
+            continue
+        src.append(a)
+        dst.append(b)
+        weights.append(float(link.get("strength", 0.5)))
+    return (
+        np.asarray(src, dtype="int64"),
+        np.asarray(dst, dtype="int64"),
+        np.asarray(weights, dtype="float64"),
+    )
+
+
+def _neighbours(links: List[Dict[str, Any]]) -> Dict[str, set]:
+    adjacency: Dict[str, set] = {}
+    for link in links:
+        adjacency.setdefault(link["source"], set()).add(link["target"])
+        adjacency.setdefault(link["target"], set()).add(link["source"])
+    return adjacency
+
+
+def _repulsion(pos: np.ndarray, k2: float, rng: np.random.Generator) -> np.ndarray:
+    """
+    Pairwise repulsion ``k^2 / d`` along each pair direction.
+
+    Squared distances come from one matrix product per block, and the
+    force sum uses ``sum_j w_ij (p_i - p_j) = p_i * sum_j w_ij - W @ P``.
+    Graphs above ``kg_layout_sample`` nodes repel against a uniform sample.
+    """
+    count = len(pos)
+    sample_size = max(1, settings.kg_layout_sample)
+    if count > sample_size:
+        others = pos[rng.choice(count, size=sample_size, replace=False)]
+        scale = count / sample_size
+    else:
+        others = pos
+        scale = 1.0
+    others_sq = np.einsum("ij,ij->i", others, others)
+    disp = np.empty_like(pos)
+    for start in range(0, count, _BLOCK):
+        block = pos[start : start + _BLOCK]
+        dist2 = np.einsum("ij,ij->i", block, block)[:, None] + others_sq[None, :] - 2.0 * block @ others.T
+        weights = np.where(dist2 > 1e-9, k2 / np.maximum(dist2, 1e-9), 0.0)
+        disp[start : start + _BLOCK] = (block * weights.sum(axis=1)[:, None] - weights @ others) * scale
+    return disp
+
+
+def force_layout(
+    initial: np.ndarray,
+    src: np.ndarray,
+    dst: np.ndarray,
+    weights: np.ndarray,
+    iterations: int,
+    temperature: float,
+    mobility: np.ndarray | None = None,
+    seed: int = 0,
+) -> np.ndarray:
+    """
+    Vectorized 3D Fruchterman-Reingold in unit space.
+
+    Attraction is accumulated along edges with ``np.add.at``. Displacements
+    are capped by a cooling temperature, scaled per node by ``mobility`` so
+    warm starts can hold already-placed nodes nearly still.
+    """
+    pos = initial.astype("float64").copy()
+    count = len(pos)
+    if count < 2 or iterations <= 0:
+        return pos
+    rng = np.random.default_rng(seed)
+    k = (1.0 / count) ** (1.0 / 3.0)
+    k2 = k * k
+    cooling = temperature / (iterations + 1)
+    step_scale = np.ones((count, 1)) if mobility is None else mobility.reshape(-1, 1)
+    for _ in range(iterations):
+        disp = _repulsion(pos, k2, rng)
+        if src.size:
+            delta = pos[src] - pos[dst]
+            dist = np.linalg.norm(delta, axis=1, keepdims=True) + 1e-9
+            pull = delta * (dist / k) * weights[:, None]
+            np.add.at(disp, src, -pull)
+            np.add.at(disp, dst, pull)
+        length = np.linalg.norm(disp, axis=1, keepdims=True) + 1e-9
+        pos += disp / length * np.minimum(length, temperature) * step_scale
+        temperature -= cooling
+    return pos
+
+
+def _initial_positions(
+    ids: List[str],
+    previous: Dict[str, Tuple[float, float, float]],
+    src: np.ndarray,
+    dst: np.ndarray,
+    scale: float,
+    rng: np.random.Generator,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Previous positions where known; new nodes start near their placed neighbours."""
+    count = len(ids)
+    pos = np.zeros((count, 3), dtype="float64")
+    placed = np.zeros(count, dtype=bool)
+    for i, node_id in enumerate(ids):
+        if node_id in previous:
+            pos[i] = np.asarray(previous[node_id], dtype="float64") / scale
+            placed[i] = True
+    for i in np.flatnonzero(~placed):
+        neighbours = np.concatenate([dst[src == i], src[dst == i]])
+        neighbours = neighbours[placed[neighbours]]
+        if neighbours.size:
+            pos[i] = pos[neighbours].mean(axis=0) + rng.normal(scale=0.02, size=3)
+        else:
+            pos[i] = rng.uniform(-0.5, 0.5, size=3)
+    return pos, placed
+
+
+def apply_layout(graph_data: Dict[str, Any], previous: Optional[Dict[str, Any]] = None) -> None:
+    """
+    Add ``x``/``y``/``z`` to every node in place.
+
+    Node positions from ``previous`` (or already on the nodes) seed the
+    simulation; when most nodes are known it runs a short, low-temperature
+    pass so existing nodes barely move. Nodes that were in ``previous`` with
+    the same neighbours keep their exact position, so a local change only
+    moves the nodes around it.
+    """
+    nodes = graph_data.get("nodes", [])
+    if not nodes:
+        return
+    ids = [node["id"] for node in nodes]
+    positions = {node_id: i for i, node_id in enumerate(ids)}
+    src, dst, weights = _edges(graph_data, positions)
+    scale = 2.0 * _radius(len(ids))
+    rng = np.random.default_rng(0)
+
+    known_positions: Dict[str, Tuple[float, float, float]] = {}
+    for node in (previous or {}).get("nodes", []) + nodes:
+        if all(isinstance(node.get(axis), (int, float)) for axis in ("x", "y", "z")):
+            known_positions[node["id"]] = (node["x"], node["y"], node["z"])
+
+    initial, placed = _initial_positions(ids, known_positions, src, dst, scale, rng)
+    known = int(placed.sum())
+    warm = known >= len(ids) * 0.5
+    pinned = np.zeros(len(ids), dtype=bool)
+    if warm and previous:
+        before = _neighbours(previous.get("links", []))
+        after = _neighbours(graph_data.get("links", []))
+        previous_ids = {node["id"] for node in previous.get("nodes", [])}
+        pinned = placed & np.asarray(
+            [node_id in previous_ids and before.get(node_id, set()) == after.get(node_id, set()) for node_id in ids]
+        )
+    if warm:
+        # Placed nodes only settle slightly; new nodes move freely.
+        pos = force_layout(
+            initial,
+            src,
+            dst,
+            weights,
+            settings.kg_layout_warm_iterations if not pinned.all() else 0,
+            temperature=0.03,
+            mobility=np.where(pinned, 0.0, np.where(placed, 0.02, 1.0)),
+        )
+    else:
+        pos = force_layout(initial, src, dst, weights, settings.kg_layout_iterations, temperature=0.1)
+        # Cold start: center and normalize to the target radius. Warm starts
+        # keep the existing frame so placed nodes don't jump.
+        pos -= pos.mean(axis=0)
+        pos = pos / (np.abs(pos).max() or 1.0) * 0.5
+
+    pos = np.round(pos * scale, 2)
+    for node, (x, y, z), keep in zip(nodes, pos.tolist(), pinned.tolist()):
+        if keep:
+            x, y, z = known_positions[node["id"]]
+        node["x"], node["y"], node["z"] = x, y, z
+    logger.info(
+        "Computed layout for %s nodes (%s warm-started, %s pinned)", len(ids), known, int(pinned.sum())
+    )
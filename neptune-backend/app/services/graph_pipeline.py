@@ -0,0 +1,566 @@
+from __future__ import annotations
+
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from app.core.settings import settings
+from app.db.database import SessionLocal
+from app.db.models import FileSystem
+from app.services.embeddings import upsert_embeddings_batch
+from app.services.graph_clustering import note_terms
+from app.services.graph_tenants import owner_clause
+from app.services.llm_scheduler import LLMBusyError, LLMUnavailableError, Priority, llm_priority, retry_busy
+from app.services.llm_service import llm_service
+from app.services.note_content import load_note_content
+from app.services.prompts import pack_topic_batches
+from app.services.topic_assignments import record_assignments, stored_topics
+from app.services.topic_cache import topic_cache
+
+logger = logging.getLogger(__name__)
+
+_DONE = object()
+
+
+@dataclass
+class StageStats:
+    name: str
+    items: int = 0
+    busy_seconds: float = 0.0
+    started_at: float | None = None
+    finished_at: float | None = None
+
+    def record(self, items: int, seconds: float) -> None:
+        self.items += items
+        self.busy_seconds += seconds
+
+    def as_dict(self) -> Dict[str, Any]:
+        wall = 0.0
+        if self.started_at is not None:
+            wall = (self.finished_at or time.monotonic()) - self.started_at
+        return {
+            "items": self.items,
+            "busy_seconds": round(self.busy_seconds, 3),
+            "wall_seconds": round(wall, 3),
+            "items_per_second": round(self.items / wall, 2) if wall > 0 else None,
+        }
+
+
+@dataclass
+class PipelineResult:
+    """Aggregated output of a pipeline run; note content is not retained."""
+
+    topic_map: Dict[str, List[str]] = field(default_factory=dict)
+    topic_vector_sums: Dict[str, np.ndarray] = field(default_factory=dict)
+    topic_vector_counts: Dict[str, int] = field(default_factory=dict)
+    note_names: Dict[int, str] = field(default_factory=dict)
+    # Unclassified notes (id, name, vector, terms) when topics come from clustering
+    notes: List[Dict[str, Any]] = field(default_factory=list)
+    notes_seen: int = 0
+    notes_with_content: int = 0
+    # Notes with content that got a topic (or, for clustering, an embedding)
+    notes_assigned: int = 0
+    stats: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+
+    @property
+    def complete(self) -> bool:
+        """Whether every note with content is reflected in the result."""
+        return self.notes_assigned >= self.notes_with_content
+
+    def topic_vectors(self) -> Dict[str, List[float]]:
+        return {
+            topic: (sums / self.topic_vector_counts[topic]).tolist()
+            for topic, sums in self.topic_vector_sums.items()
+            if self.topic_vector_counts.get(topic)
+        }
+
+
+class _Pipeline:
+    def __init__(
+        self,
+        on_progress: Callable[[str, Dict[str, Dict[str, Any]]], None] | None,
+        classify: bool = True,
+        owner_id: Optional[str] = None,
+    ) -> None:
+        self.classify = classify
+        self.owner_id = owner_id
+        size = max(1, settings.kg_pipeline_queue_size)
+        self.pages: queue.Queue = queue.Queue(maxsize=size)
+        self.loaded: queue.Queue = queue.Queue(maxsize=size)
+        self.embedded: queue.Queue = queue.Queue(maxsize=size)
+        self.topics: queue.Queue = queue.Queue(maxsize=size * 4)
+        self.abort = threading.Event()
+        self.error: Optional[BaseException] = None
+        self.stats = {
+            name: StageStats(name) for name in ("fetch", "load", "embed", "topics", "assemble")
+        }
+        self._stats_lock = threading.Lock()
+        self._on_progress = on_progress
+        self.notes_seen = 0
+        self.notes_with_content = 0
+
+    # Queue helpers -----------------------------------------------------
+
+    def _put(self, target: queue.Queue, item: Any) -> None:
+        while not self.abort.is_set():
+            try:
+                target.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+    def _get(self, source: queue.Queue) -> Any:
+        while True:
+            try:
+                return source.get(timeout=0.5)
+            except queue.Empty:
+                if self.abort.is_set():
+                    return _DONE
+
+    def _fail(self, stage: str, exc: BaseException) -> None:
+        logger.error("Graph pipeline stage %s failed: %s", stage, exc)
+        if self.error is None:
+            self.error = exc
+        self.abort.set()
+
+    def _record(self, stage: str, items: int, started: float) -> None:
+        with self._stats_lock:
+            stats = self.stats[stage]
+            if stats.started_at is None:
+                stats.started_at = started
+            stats.record(items, time.monotonic() - started)
+        if self._on_progress:
+            self._on_progress(stage, self.snapshot())
+
+    def _finish(self, stage: str) -> None:
+        with self._stats_lock:
+            stats = self.stats[stage]
+            if stats.started_at is None:
+                stats.started_at = time.monotonic()
+            stats.finished_at = time.monotonic()
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._stats_lock:
+            return {name: stats.as_dict() for name, stats in self.stats.items()}
+
+    # Stages ------------------------------------------------------------
+
+    def fetch(self) -> None:
+        """Page through notes by primary key so no stage holds the whole corpus."""
+        db = SessionLocal()
+        try:
+            last_id = 0
+            page_size = max(1, settings.kg_pipeline_page_size)
+            while not self.abort.is_set():
+                started = time.monotonic()
+                rows = (
+                    db.query(FileSystem)
+                    .filter(FileSystem.type == "file")
+                    .filter(FileSystem.deleted_at.is_(None))
+                    .filter(owner_clause(self.owner_id))
+                    .filter(FileSystem.id > last_id)
+                    .order_by(FileSystem.id)
+                    .limit(page_size)
+                    .all()
+                )
+                if not rows:
+                    break
+                last_id = rows[-1].id
+                page = [_detached_copy(row) for row in rows]
+                db.expunge_all()
+                self._record("fetch", len(page), started)
+                self._put(self.pages, page)
+        except Exception as e:
+            self._fail("fetch", e)
+        finally:
+            db.close()
+            self._finish("fetch")
+            self._put(self.pages, _DONE)
+
+    def load(self) -> None:
+        """Load note content concurrently (object storage GETs overlap)."""
+        workers = max(1, settings.kg_pipeline_content_workers)
+        try:
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="kg-load") as pool:
+                while True:
+                    page = self._get(self.pages)
+                    if page is _DONE:
+                        break
+                    started = time.monotonic()
+                    loaded = [note for note in pool.map(_load_content, page) if note["content"] is not None]
+                    self.notes_seen += len(page)
+                    self.notes_with_content += len(loaded)
+                    self._record("load", len(page), started)
+                    if loaded:
+                        self._put(self.loaded, loaded)
+        except Exception as e:
+            self._fail("load", e)
+        finally:
+            self._finish("load")
+            self._put(self.loaded, _DONE)
+
+    def embed(self) -> None:
+        """
+        Embed notes in batches and persist vectors; content is passed through.
+
+        Embedding calls run at backfill priority and are retried while the
+        LLM scheduler pushes back. A batch that still fails leaves its notes
+        without a vector.
+        """
+        db = SessionLocal()
+        batch_size = max(1, settings.kg_pipeline_embed_batch_size)
+        pending: List[Dict[str, Any]] = []
+
+        def _upsert(batch: List[Dict[str, Any]]) -> Dict[int, List[float]]:
+            try:
+                vectors = upsert_embeddings_batch(db, [(note["item"], note["content"]) for note in batch])
+                db.commit()
+            except Exception:
+                db.rollback()
+                raise
+            return vectors
+
+        def _flush(batch: List[Dict[str, Any]]) -> None:
+            started = time.monotonic()
+            try:
+                with llm_priority(Priority.BACKFILL, self.owner_id):
+                    vectors = retry_busy(lambda: _upsert(batch), self.abort, what="Embedding batch")
+            except Exception as e:
+                if not self.abort.is_set():
+                    logger.warning("Embedding batch failed: %s", e)
+                vectors = {}
+            for note in batch:
+                note["vector"] = vectors.get(note["item"].id)
+                note.pop("item", None)
+            self._record("embed", len(batch), started)
+            self._put(self.embedded, batch)
+
+        try:
+            while True:
+                loaded = self._get(self.loaded)
+                if loaded is _DONE:
+                    break
+                pending.extend(loaded)
+                while len(pending) >= batch_size:
+                    _flush(pending[:batch_size])
+                    pending = pending[batch_size:]
+            if pending and not self.abort.is_set():
+                _flush(pending)
+        except Exception as e:
+            self._fail("embed", e)
+        finally:
+            db.close()
+            self._finish("embed")
+            self._put(self.embedded, _DONE)
+
+    @property
+    def topic_workers(self) -> int:
+        return max(1, llm_service.pool.capacity)
+
+    def extract_topics(self) -> None:
+        """
+        Resolve topics from the cache, persisted assignments or the LLM.
+
+        Cache misses are packed into LLM batches that fit the context window
+        (across incoming chunks) and fanned out to ``topic_workers`` threads.
+        At most twice that many batches are in flight, so upstream stages see
+        backpressure. Each
+        batch is written through to the topic cache as soon as it completes,
+        so an interrupted run keeps the work already done.
+        """
+        executor = ThreadPoolExecutor(max_workers=self.topic_workers, thread_name_prefix="kg-llm")
+        slots = threading.BoundedSemaphore(self.topic_workers * 2)
+        futures = []
+        pending: List[Dict[str, Any]] = []
+
+        def _submit(batch: List[Dict[str, Any]]) -> None:
+            while not slots.acquire(timeout=0.5):
+                if self.abort.is_set():
+                    return
+            future = executor.submit(self._classify_batch, batch)
+            future.add_done_callback(lambda _: slots.release())
+            futures.append(future)
+
+        try:
+            while True:
+                notes = self._get(self.embedded)
+                if notes is _DONE:
+                    break
+                started = time.monotonic()
+                if not self.classify:
+                    # Clustering assigns topics later; keep only what it needs.
+                    self._record("topics", len(notes), started)
+                    self._put(self.topics, [_cluster_input(note) for note in notes])
+                    continue
+                results = []
+                misses = []
+                for note in notes:
+                    cached = topic_cache.get(note["id"], note["checksum"])
+                    if cached:
+                        results.append(_topic_result(note, cached))
+                    else:
+                        misses.append(note)
+                if misses:
+                    persisted = self._stored_topics(misses)
+                    for note in [note for note in misses if note["id"] in persisted]:
+                        topic = persisted[note["id"]]
+                        if note["checksum"]:
+                            topic_cache.set(note["id"], note["checksum"], topic)
+                        results.append(_topic_result(note, topic))
+                    misses = [note for note in misses if note["id"] not in persisted]
+                if results:
+                    self._record("topics", len(results), started)
+                    self._put(self.topics, results)
+                pending.extend(misses)
+                # Every batch but the last is full; the last keeps filling.
+                batches = pack_topic_batches(pending)
+                for batch in batches[:-1]:
+                    _submit(batch)
+                pending = batches[-1] if batches else []
+            if pending and not self.abort.is_set():
+                _submit(pending)
+            for future in futures:
+                future.result()
+        except Exception as e:
+            self._fail("topics", e)
+        finally:
+            executor.shutdown(wait=True, cancel_futures=self.abort.is_set())
+            self._finish("topics")
+            self._put(self.topics, _DONE)
+
+    def _classify_batch(self, batch: List[Dict[str, Any]]) -> None:
+        """
+        One LLM call; results go to the topic cache and the assemble stage.
+
+        Topics are written to the cache as the streamed answer parses, so a
+        batch interrupted mid-answer keeps what it already produced.
+
+        Calls run at backfill priority. When the LLM scheduler pushes back
+        the batch is retried with backoff; when the LLM is unavailable its
+        notes stay unclassified until the next run.
+        """
+        started = time.monotonic()
+        delay = 0.5
+        extracted = []
+        checksums = {note["id"]: note["checksum"] for note in batch}
+
+        def cache_topic(note_id: str, topic: str) -> None:
+            if checksums.get(note_id):
+                topic_cache.set(note_id, checksums[note_id], topic)
+
+        while not self.abort.is_set():
+            try:
+                with llm_priority(Priority.BACKFILL, self.owner_id):
+                    extracted = llm_service.extract_topics_batch(batch, on_topic=cache_topic)
+                break
+            except LLMBusyError as e:
+                logger.info("Topic batch deferred: %s", e)
+                self.abort.wait(delay)
+                delay = min(delay * 2, 10.0)
+            except LLMUnavailableError as e:
+                logger.warning("Topic batch of %s notes skipped: %s", len(batch), e)
+                break
+        if self.abort.is_set():
+            return
+        by_id = {item["note_id"]: item["topic"] for item in extracted}
+        results = []
+        for note in batch:
+            topic = by_id.get(note["id"])
+            if not topic:
+                continue
+            results.append(_topic_result(note, topic))
+        topic_cache.flush()
+        self._record("topics", len(batch), started)
+        if results:
+            self._put(self.topics, results)
+
+    def _stored_topics(self, notes: List[Dict[str, Any]]) -> Dict[str, str]:
+        db = SessionLocal()
+        try:
+            found = stored_topics(db, [(int(note["id"]), note["checksum"]) for note in notes])
+        except Exception as e:
+            logger.warning("Persisted topic lookup failed: %s", e)
+            return {}
+        finally:
+            db.close()
+        return {str(note_id): topic for note_id, topic in found.items()}
+
+    def _persist(self, items: List[Dict[str, Any]]) -> None:
+        db = SessionLocal()
+        try:
+            assignments = [
+                (int(item["note_id"]), item["topic"], item.get("checksum"))
+                for item in items
+                if item["note_id"].isdigit()
+            ]
+            record_assignments(db, assignments)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.warning("Persisting topic assignments failed: %s", e)
+        finally:
+            db.close()
+
+    def assemble(self, result: PipelineResult) -> None:
+        """
+        Fold topic results into topic membership and running centroid sums.
+
+        In topic mode each batch is also persisted to ``note_topics``.
+        """
+        while True:
+            items = self._get(self.topics)
+            if items is _DONE:
+                break
+            started = time.monotonic()
+            if self.classify:
+                result.notes_assigned += len(items)
+                for item in items:
+                    _fold(result, item)
+                self._persist(items)
+            else:
+                # Clustering leaves out notes without an embedding.
+                result.notes_assigned += sum(1 for item in items if item.get("vector"))
+                result.notes.extend(items)
+                for item in items:
+                    if item["note_id"].isdigit():
+                        result.note_names[int(item["note_id"])] = item["name"]
+            self._record("assemble", len(items), started)
+        self._finish("assemble")
+
+
+def _detached_copy(row: FileSystem) -> FileSystem:
+    return FileSystem(
+        id=row.id,
+        owner_id=row.owner_id,
+        name=row.name,
+        type=row.type,
+        content=row.content,
+        storage_backend=row.storage_backend,
+        storage_key=row.storage_key,
+        storage_checksum=row.storage_checksum,
+        storage_size=row.storage_size,
+        content_checksum=row.content_checksum,
+    )
+
+
+def _load_content(item: FileSystem) -> Dict[str, Any]:
+    try:
+        content = load_note_content(item).content or ""
+    except Exception:
+        content = ""
+    note = {
+        "id": str(item.id),
+        "name": item.name,
+        "checksum": item.content_checksum or "",
+        "item": item,
+        "content": content,
+    }
+    if len(content.strip()) < settings.min_note_chars:
+        note["content"] = None
+    return note
+
+
+def _cluster_input(note: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "note_id": note["id"],
+        "name": note["name"],
+        "vector": note.get("vector"),
+        "terms": note_terms(note["content"]),
+    }
+
+
+def _topic_result(note: Dict[str, Any], topic: str) -> Dict[str, Any]:
+    return {
+        "note_id": note["id"],
+        "name": note["name"],
+        "topic": topic,
+        "checksum": note["checksum"],
+        "vector": note.get("vector"),
+    }
+
+
+def _fold(result: PipelineResult, item: Dict[str, Any]) -> None:
+    topic = item["topic"]
+    note_id = item["note_id"]
+    result.topic_map.setdefault(topic, []).append(note_id)
+    if note_id.isdigit():
+        result.note_names[int(note_id)] = item["name"]
+    vector = item.get("vector")
+    if not vector:
+        return
+    sums = result.topic_vector_sums.get(topic)
+    if sums is None:
+        result.topic_vector_sums[topic] = np.asarray(vector, dtype="float64")
+    elif sums.shape[0] == len(vector):
+        sums += np.asarray(vector, dtype="float64")
+    else:
+        return
+    result.topic_vector_counts[topic] = result.topic_vector_counts.get(topic, 0) + 1
+
+
+def _watch_cancel(cancel: threading.Event, abort: threading.Event, finished: threading.Event) -> None:
+    while not finished.is_set():
+        if cancel.wait(0.5):
+            logger.warning("Graph pipeline cancelled")
+            abort.set()
+            return
+
+
+def run_graph_pipeline(
+    on_progress: Callable[[str, Dict[str, Dict[str, Any]]], None] | None = None,
+    classify: bool = True,
+    owner_id: Optional[str] = None,
+    cancel: Optional[threading.Event] = None,
+) -> PipelineResult:
+    """
+    Run the staged knowledge-graph pipeline.
+
+    Stages are connected by bounded queues so database paging, content
+    loading, embedding and LLM topic extraction overlap, and memory stays
+    proportional to the queue sizes rather than the corpus. With
+    ``classify=False`` no per-note LLM call is made; notes are collected in
+    ``PipelineResult.notes`` for clustering instead. Only notes of
+    ``owner_id`` (``None``: notes without an owner) are processed. Setting
+    ``cancel`` (e.g. a lost generation lease) aborts every stage; the
+    partial result is returned and must not be stored.
+    """
+    pipeline = _Pipeline(on_progress, classify=classify, owner_id=owner_id)
+    result = PipelineResult()
+    finished = threading.Event()
+    if cancel is not None:
+        threading.Thread(
+            target=_watch_cancel, args=(cancel, pipeline.abort, finished), name="kg-cancel", daemon=True
+        ).start()
+
+    threads = [
+        threading.Thread(target=pipeline.fetch, name="kg-fetch", daemon=True),
+        threading.Thread(target=pipeline.load, name="kg-load", daemon=True),
+        threading.Thread(target=pipeline.embed, name="kg-embed", daemon=True),
+    ]
+    threads.append(threading.Thread(target=pipeline.extract_topics, name="kg-topics", daemon=True))
+    for thread in threads:
+        thread.start()
+
+    pipeline.assemble(result)
+    for thread in threads:
+        thread.join(timeout=5)
+    finished.set()
+    result.notes_seen = pipeline.notes_seen
+    result.notes_with_content = pipeline.notes_with_content
+
+    try:
+        topic_cache.flush()
+    except Exception as e:
+        logger.warning("Topic cache flush failed: %s", e)
+
+    result.stats = pipeline.snapshot()
+    logger.info("Graph pipeline stage throughput: %s", result.stats)
+    if pipeline.error is not None:
+        raise pipeline.error
+    return result
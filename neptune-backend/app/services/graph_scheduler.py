@@ -0,0 +1,163 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _TenantState:
+    dirty: bool = False
+    immediate: bool = False
+    pending: int = 0
+    running: bool = False
+    first_dirty_mono: Optional[float] = None
+    last_dirty_mono: Optional[float] = None
+    last_dirty_at: Optional[str] = None
+    last_run_started_mono: Optional[float] = None
+    runs: int = 0
+
+
+class RegenerationScheduler:
+    """
+    Coalesces regeneration requests into debounced, rate-limited runs.
+
+    Every request marks a tenant's graph dirty (``key=None`` is the default
+    tenant). A run becomes due once the debounce window has passed without
+    new requests (bounded by ``max_delay_seconds`` so constant autosaves
+    cannot starve it) and at least ``min_interval_seconds`` after that
+    tenant's previous run started. Requests that arrive while a run is in
+    progress leave the dirty flag set, which guarantees one trailing run.
+
+    Up to ``workers`` tenants run in parallel, never the same tenant twice.
+    When several are due the least recently served goes first, so one large
+    tenant cannot delay everyone else.
+    """
+
+    def __init__(
+        self,
+        run: Callable[..., None],
+        debounce_seconds: float,
+        min_interval_seconds: float,
+        max_delay_seconds: float,
+        workers: int = 1,
+    ) -> None:
+        self._run = run
+        self.debounce_seconds = max(0.0, debounce_seconds)
+        self.min_interval_seconds = max(0.0, min_interval_seconds)
+        self.max_delay_seconds = max(self.debounce_seconds, max_delay_seconds)
+        self.workers = max(1, workers)
+        self._cond = threading.Condition()
+        self._tenants: Dict[Optional[Hashable], _TenantState] = {}
+        self._threads: List[threading.Thread] = []
+
+    def request(self, immediate: bool = False, key: Optional[Hashable] = None) -> bool:
+        """Mark a tenant's graph dirty and make sure a run will follow."""
+        with self._cond:
+            now = time.monotonic()
+            state = self._tenants.setdefault(key, _TenantState())
+            state.dirty = True
+            state.immediate = state.immediate or immediate
+            state.pending += 1
+            if state.first_dirty_mono is None:
+                state.first_dirty_mono = now
+            state.last_dirty_mono = now
+            state.last_dirty_at = datetime.now().isoformat()
+            self._ensure_workers()
+            self._cond.notify_all()
+        return True
+
+    def _ensure_workers(self) -> None:
+        self._threads = [thread for thread in self._threads if thread.is_alive()]
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(
+                target=self._loop, name=f"kg-scheduler-{len(self._threads)}", daemon=True
+            )
+            self._threads.append(thread)
+            thread.start()
+
+    def _seconds_until_due(self, state: _TenantState, now: float) -> float:
+        waits = [0.0]
+        if not state.immediate and state.last_dirty_mono is not None:
+            debounce_wait = self.debounce_seconds - (now - state.last_dirty_mono)
+            max_wait = self.max_delay_seconds - (now - (state.first_dirty_mono or now))
+            waits.append(min(debounce_wait, max_wait))
+        if state.last_run_started_mono is not None:
+            waits.append(self.min_interval_seconds - (now - state.last_run_started_mono))
+        return max(waits)
+
+    def _next_due(self) -> tuple[Optional[Hashable], Optional[_TenantState], Optional[float]]:
+        """The due tenant served least recently, or how long until one is due."""
+        now = time.monotonic()
+        best_key, best_state, best_served, wait_for = None, None, None, None
+        for key, state in self._tenants.items():
+            if not state.dirty or state.running:
+                continue
+            wait = self._seconds_until_due(state, now)
+            if wait > 0:
+                wait_for = wait if wait_for is None else min(wait_for, wait)
+                continue
+            served = state.last_run_started_mono if state.last_run_started_mono is not None else float("-inf")
+            if best_served is None or served < best_served:
+                best_key, best_state, best_served = key, state, served
+        return best_key, best_state, wait_for
+
+    def _loop(self) -> None:
+        while True:
+            with self._cond:
+                while True:
+                    key, state, wait_for = self._next_due()
+                    if state is not None:
+                        break
+                    self._cond.wait(wait_for)
+                state.dirty = False
+                state.immediate = False
+                state.pending = 0
+                state.first_dirty_mono = None
+                state.running = True
+                state.last_run_started_mono = time.monotonic()
+            try:
+                if key is None:
+                    self._run()
+                else:
+                    self._run(key)
+            except Exception as e:
+                logger.error("Scheduled graph regeneration failed for %s: %s", key or "default tenant", e)
+            finally:
+                with self._cond:
+                    state.running = False
+                    state.runs += 1
+                    self._cond.notify_all()
+
+    def wait_idle(self, timeout: float | None = None) -> bool:
+        """Block until no run is pending or in progress for any tenant."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while any(state.dirty or state.running for state in self._tenants.values()):
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            return True
+
+    def status(self, key: Optional[Hashable] = None) -> Dict[str, Any]:
+        """One tenant's scheduler state; the default tenant when ``key`` is None."""
+        with self._cond:
+            state = self._tenants.get(key, _TenantState())
+            return {
+                "dirty": state.dirty,
+                "running": state.running,
+                "queue_depth": state.pending,
+                "last_dirty_at": state.last_dirty_at,
+                "runs": state.runs,
+                "debounce_seconds": self.debounce_seconds,
+                "min_interval_seconds": self.min_interval_seconds,
+                "workers": self.workers,
+                "tenants_dirty": sum(1 for s in self._tenants.values() if s.dirty),
+                "tenants_running": sum(1 for s in self._tenants.values() if s.running),
+            }
@@ -0,0 +1,351 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from app.core.settings import settings
+from app.db.database import SessionLocal
+from app.db.models import GraphCacheEntry
+from app.services.storage import storage_client
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class CachedGraph:
+    generation: int
+    fingerprint: Optional[str]
+    etag: Optional[str]
+    timestamp: Optional[str]
+    graph: Dict[str, Any]
+
+    def meta(self) -> Dict[str, Any]:
+        return {
+            "generation": self.generation,
+            "fingerprint": self.fingerprint,
+            "etag": self.etag,
+            "timestamp": self.timestamp,
+        }
+
+
+class GraphStoreBackend(ABC):
+    """Persistent location of cached graphs shared by every process."""
+
+    name = "base"
+
+    @abstractmethod
+    def version(self, key: str) -> Any:
+        """Cheap change token; a different value means ``read`` must be called."""
+
+    @abstractmethod
+    def read(self, key: str) -> Optional[CachedGraph]:
+        """Stored entry of ``key``, or None."""
+
+    @abstractmethod
+    def write(self, key: str, graph: Dict[str, Any], fingerprint: Optional[str], etag: Optional[str]) -> CachedGraph:
+        """Store ``graph`` under the next generation of ``key`` and return the entry."""
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        """Remove ``key``; missing keys are ignored."""
+
+
+def graph_etag(graph: Dict[str, Any]) -> str:
+    """Content hash of a graph payload, used as its HTTP ETag."""
+    payload = json.dumps(graph, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32]
+
+
+def _versioned_path(base_path: str, key: str) -> str:
+    if "{version}" in base_path:
+        base_path = base_path.format(version=settings.kg_cache_version)
+        suffix = ""
+    else:
+        suffix = f".{settings.kg_cache_version}"
+    base, ext = os.path.splitext(base_path)
+    key_part = "" if key == "graph" else f".{key}"
+    if ext:
+        return f"{base}{key_part}{suffix}{ext}"
+    return f"{base_path}{key_part}{suffix}"
+
+
+def _now() -> str:
+    return datetime.now().isoformat()
+
+
+class FileGraphStore(GraphStoreBackend):
+    """Local JSON file per key; suitable for desktop mode and single hosts."""
+
+    name = "file"
+
+    def __init__(self, base_path: str) -> None:
+        self.base_path = base_path
+
+    def path(self, key: str) -> str:
+        return _versioned_path(self.base_path, key)
+
+    def version(self, key: str) -> Any:
+        try:
+            stat = os.stat(self.path(key))
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def read(self, key: str) -> Optional[CachedGraph]:
+        path = self.path(key)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r") as handle:
+            data = json.load(handle)
+        return CachedGraph(
+            generation=int(data.get("generation", 0)),
+            fingerprint=data.get("fingerprint"),
+            etag=data.get("etag"),
+            timestamp=data.get("timestamp"),
+            graph=data.get("graph") or {"nodes": [], "links": []},
+        )
+
+    def write(self, key: str, graph: Dict[str, Any], fingerprint: Optional[str], etag: Optional[str]) -> CachedGraph:
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        previous = None
+        try:
+            previous = self.read(key)
+        except Exception:
+            previous = None
+        entry = CachedGraph(
+            generation=(previous.generation if previous else 0) + 1,
+            fingerprint=fingerprint,
+            etag=etag,
+            timestamp=_now(),
+            graph=graph,
+        )
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as handle:
+            json.dump({**entry.meta(), "graph": graph}, handle)
+        os.replace(tmp_path, path)
+        return entry
+
+    def delete(self, key: str) -> None:
+        path = self.path(key)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+class DbGraphStore(GraphStoreBackend):
+    """``graph_cache`` table row per key; shared by every pod on the database."""
+
+    name = "db"
+
+    def version(self, key: str) -> Any:
+        db = SessionLocal()
+        try:
+            row = db.query(GraphCacheEntry.generation).filter(GraphCacheEntry.key == key).first()
+            return row[0] if row else None
+        finally:
+            db.close()
+
+    def read(self, key: str) -> Optional[CachedGraph]:
+        db = SessionLocal()
+        try:
+            row = db.query(GraphCacheEntry).filter(GraphCacheEntry.key == key).first()
+            if row is None:
+                return None
+            return CachedGraph(
+                generation=row.generation,
+                fingerprint=row.fingerprint,
+                etag=row.etag,
+                timestamp=row.updated_at.isoformat() if row.updated_at else None,
+                graph=json.loads(row.payload),
+            )
+        finally:
+            db.close()
+
+    def write(self, key: str, graph: Dict[str, Any], fingerprint: Optional[str], etag: Optional[str]) -> CachedGraph:
+        db = SessionLocal()
+        try:
+            row = db.query(GraphCacheEntry).filter(GraphCacheEntry.key == key).with_for_update().first()
+            payload = json.dumps(graph)
+            if row is None:
+                row = GraphCacheEntry(key=key, generation=1, fingerprint=fingerprint, etag=etag, payload=payload)
+                db.add(row)
+            else:
+                row.generation = (row.generation or 0) + 1
+                row.fingerprint = fingerprint
+                row.etag = etag
+                row.payload = payload
+            db.commit()
+            return CachedGraph(
+                generation=row.generation,
+                fingerprint=fingerprint,
+                etag=etag,
+                timestamp=_now(),
+                graph=graph,
+            )
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def delete(self, key: str) -> None:
+        db = SessionLocal()
+        try:
+            db.query(GraphCacheEntry).filter(GraphCacheEntry.key == key).delete()
+            db.commit()
+        finally:
+            db.close()
+
+
+class ObjectGraphStore(GraphStoreBackend):
+    """
+    Graph payload plus a small metadata object in S3-compatible storage.
+
+    The metadata object is written after the payload and is the only thing
+    polled for changes.
+    """
+
+    name = "s3"
+
+    def _key(self, key: str, suffix: str) -> str:
+        return f"{settings.s3_prefix}graph/{settings.kg_cache_version}/{key}.{suffix}"
+
+    def _read_meta(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            return json.loads(storage_client.get_object(self._key(key, "meta.json")))
+        except Exception:
+            return None
+
+    def version(self, key: str) -> Any:
+        meta = self._read_meta(key)
+        return meta.get("generation") if meta else None
+
+    def read(self, key: str) -> Optional[CachedGraph]:
+        meta = self._read_meta(key)
+        if meta is None:
+            return None
+        graph = json.loads(storage_client.get_object(self._key(key, "json")))
+        return CachedGraph(
+            generation=int(meta.get("generation", 0)),
+            fingerprint=meta.get("fingerprint"),
+            etag=meta.get("etag"),
+            timestamp=meta.get("timestamp"),
+            graph=graph,
+        )
+
+    def write(self, key: str, graph: Dict[str, Any], fingerprint: Optional[str], etag: Optional[str]) -> CachedGraph:
+        meta = self._read_meta(key) or {}
+        entry = CachedGraph(
+            generation=int(meta.get("generation", 0)) + 1,
+            fingerprint=fingerprint,
+            etag=etag,
+            timestamp=_now(),
+            graph=graph,
+        )
+        storage_client.put_object(self._key(key, "json"), json.dumps(graph).encode("utf-8"), "application/json")
+        storage_client.put_object(
+            self._key(key, "meta.json"), json.dumps(entry.meta()).encode("utf-8"), "application/json"
+        )
+        return entry
+
+    def delete(self, key: str) -> None:
+        for suffix in ("meta.json", "json"):
+            try:
+                storage_client.delete_object(self._key(key, suffix))
+            except Exception as e:
+                logger.warning("Graph cache object delete failed: %s", e)
+
+
+class GraphStore:
+    """
+    Memoizing front for a graph store backend.
+
+    Each process keeps the last graph it read per key and only re-reads the
+    payload when the backend's change token differs. Token checks are
+    throttled to ``poll_seconds`` so hot GET paths rarely touch the backend.
+    """
+
+    def __init__(self, backend: GraphStoreBackend, poll_seconds: float) -> None:
+        self.backend = backend
+        self.poll_seconds = max(0.0, poll_seconds)
+        self._lock = threading.Lock()
+        self._memo: Dict[str, CachedGraph] = {}
+        self._tokens: Dict[str, Any] = {}
+        self._checked_at: Dict[str, float] = {}
+
+    def get(self, key: str) -> Optional[CachedGraph]:
+        now = time.monotonic()
+        with self._lock:
+            cached = self._memo.get(key)
+            checked_at = self._checked_at.get(key)
+            if checked_at is not None and now - checked_at < self.poll_seconds:
+                return cached
+        try:
+            token = self.backend.version(key)
+        except Exception as e:
+            logger.warning("Graph cache version check failed: %s", e)
+            return cached
+        with self._lock:
+            self._checked_at[key] = now
+            if token is not None and token == self._tokens.get(key) and key in self._memo:
+                return self._memo[key]
+        if token is None:
+            with self._lock:
+                self._memo.pop(key, None)
+                self._tokens.pop(key, None)
+            return None
+        try:
+            entry = self.backend.read(key)
+        except Exception as e:
+            logger.warning("Graph cache read failed: %s", e)
+            return cached
+        with self._lock:
+            if entry is None:
+                self._memo.pop(key, None)
+                self._tokens.pop(key, None)
+            else:
+                self._memo[key] = entry
+                self._tokens[key] = token
+        return entry
+
+    def put(self, key: str, graph: Dict[str, Any], fingerprint: Optional[str], etag: Optional[str]) -> CachedGraph:
+        entry = self.backend.write(key, graph, fingerprint, etag)
+        try:
+            token = self.backend.version(key)
+        except Exception:
+            token = None
+        with self._lock:
+            self._memo[key] = entry
+            self._tokens[key] = token
+            self._checked_at[key] = time.monotonic()
+        return entry
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._memo.pop(key, None)
+            self._tokens.pop(key, None)
+            self._checked_at.pop(key, None)
+        self.backend.delete(key)
+
+
+def create_graph_store_backend() -> GraphStoreBackend:
+    backend = settings.kg_cache_backend
+    if backend == "db":
+        return DbGraphStore()
+    if backend in {"s3", "object"}:
+        if not storage_client.enabled:
+            logger.warning("KG_CACHE_BACKEND=%s but object storage is not configured; using file", backend)
+            return FileGraphStore(settings.kg_cache_path)
+        return ObjectGraphStore()
+    return FileGraphStore(settings.kg_cache_path)
+
+
+graph_store = GraphStore(create_graph_store_backend(), settings.kg_cache_poll_seconds)
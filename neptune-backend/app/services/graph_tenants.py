@@ -0,0 +1,35 @@
+from __future__ import annotations
+
+import hashlib
+from typing import Optional
+
+from sqlalchemy.orm import Session
+
+from app.db.models import FileSystem
+
+
+def scoped_key(key: str, owner_id: Optional[str]) -> str:
+    """
+    Store key (or lease name) of ``key`` for one owner.
+
+    Notes without an owner keep the unscoped key, so single-user installs
+    read the caches they already have. Owner ids are hashed because they
+    end up in file names and object keys.
+    """
+    if owner_id is None:
+        return key
+    digest = hashlib.sha256(owner_id.encode("utf-8")).hexdigest()[:16]
+    return f"{key}.owner-{digest}"
+
+
+def owner_clause(owner_id: Optional[str]):
+    """Filter matching the notes of one owner (``None`` = notes without an owner)."""
+    if owner_id is None:
+        return FileSystem.owner_id.is_(None)
+    return FileSystem.owner_id == owner_id
+
+
+def note_owner(db: Session, note_id: int) -> Optional[str]:
+    """Owner of a note, including soft-deleted notes."""
+    row = db.query(FileSystem.owner_id).filter(FileSystem.id == note_id).first()
+    return row[0] if row else None
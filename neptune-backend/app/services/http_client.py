@@ -0,0 +1,172 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import queue
+import threading
+from typing import Any, Dict, Iterator, Optional, Tuple, Union
+from urllib.parse import urlsplit
+
+import httpx
+
+from app.core.settings import settings
+
+logger = logging.getLogger(__name__)
+
+Timeout = Union[None, float, Tuple[float, float]]
+
+_END = object()
+
+
+def _timeout(value: Timeout) -> httpx.Timeout:
+    """``requests``-style timeout (seconds or ``(connect, read)``) as ``httpx.Timeout``."""
+    if value is None:
+        return httpx.Timeout(settings.ollama_timeout_seconds, connect=settings.ollama_connect_timeout_seconds)
+    if isinstance(value, tuple):
+        connect, read = value
+        return httpx.Timeout(read, connect=connect)
+    return httpx.Timeout(value)
+
+
+def _http2_available() -> bool:
+    if not settings.http2:
+        return False
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        logger.warning("HTTP2=true but the h2 package is not installed; using HTTP/1.1")
+        return False
+    return True
+
+
+class HTTPPool:
+    """
+    Shared asyncio HTTP client for Ollama and the indexer.
+
+    One ``httpx.AsyncClient`` runs on a dedicated event-loop thread, so
+    connections are pooled and kept alive across every caller. Async code
+    awaits ``request``; synchronous callers (pipeline workers, route
+    handlers) use ``get``/``post``, which wait on the shared loop instead of
+    each thread holding its own session. Concurrent requests per host are
+    capped at ``http_max_connections_per_host``.
+    """
+
+    def __init__(self, transport: Optional[httpx.AsyncBaseTransport] = None) -> None:
+        self._transport = transport
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._client: Optional[httpx.AsyncClient] = None
+        self._hosts: Dict[str, asyncio.Semaphore] = {}
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is not None and self._loop.is_running():
+                return self._loop
+            loop = asyncio.new_event_loop()
+            started = threading.Event()
+
+            def _run() -> None:
+                asyncio.set_event_loop(loop)
+                loop.call_soon(started.set)
+                loop.run_forever()
+
+            threading.Thread(target=_run, name="http-pool", daemon=True).start()
+            started.wait()
+            self._loop = loop
+            self._client = None
+            self._hosts = {}
+            return loop
+
+    def _get_client(self) -> httpx.AsyncClient:
+        # Only called on the pool loop.
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                http2=_http2_available(),
+                limits=httpx.Limits(
+                    max_connections=settings.http_max_connections,
+                    max_keepalive_connections=settings.http_max_connections,
+                    keepalive_expiry=settings.http_keepalive_seconds,
+                ),
+                timeout=_timeout(None),
+                transport=self._transport,
+            )
+        return self._client
+
+    def _host_slot(self, url: str) -> asyncio.Semaphore:
+        host = urlsplit(url).netloc
+        slot = self._hosts.get(host)
+        if slot is None:
+            slot = asyncio.Semaphore(max(1, settings.http_max_connections_per_host))
+            self._hosts[host] = slot
+        return slot
+
+    async def _send(self, method: str, url: str, timeout: Timeout, **kwargs: Any) -> httpx.Response:
+        async with self._host_slot(url):
+            return await self._get_client().request(method, url, timeout=_timeout(timeout), **kwargs)
+
+    async def request(self, method: str, url: str, timeout: Timeout = None, **kwargs: Any) -> httpx.Response:
+        """Send a request from any event loop."""
+        loop = self._ensure_loop()
+        if asyncio.get_running_loop() is loop:
+            return await self._send(method, url, timeout, **kwargs)
+        future = asyncio.run_coroutine_threadsafe(self._send(method, url, timeout, **kwargs), loop)
+        return await asyncio.wrap_future(future)
+
+    def send(self, method: str, url: str, timeout: Timeout = None, **kwargs: Any) -> httpx.Response:
+        """Blocking request for synchronous callers."""
+        loop = self._ensure_loop()
+        future = asyncio.run_coroutine_threadsafe(self._send(method, url, timeout, **kwargs), loop)
+        return future.result()
+
+    def get(self, url: str, timeout: Timeout = None, **kwargs: Any) -> httpx.Response:
+        return self.send("GET", url, timeout=timeout, **kwargs)
+
+    def post(self, url: str, timeout: Timeout = None, **kwargs: Any) -> httpx.Response:
+        return self.send("POST", url, timeout=timeout, **kwargs)
+
+    def stream_lines(self, method: str, url: str, timeout: Timeout = None, **kwargs: Any) -> Iterator[str]:
+        """
+        Response lines for synchronous callers as they arrive.
+
+        Error statuses raise ``httpx.HTTPStatusError`` on the first ``next``.
+        Closing the iterator early cancels the request and drops the
+        connection, so the server can stop producing output.
+        """
+        loop = self._ensure_loop()
+        lines: "queue.Queue[Any]" = queue.Queue()
+
+        async def _pump() -> None:
+            async with self._host_slot(url):
+                async with self._get_client().stream(method, url, timeout=_timeout(timeout), **kwargs) as response:
+                    if response.status_code >= 400:
+                        await response.aread()
+                        response.raise_for_status()
+                    async for line in response.aiter_lines():
+                        lines.put(line)
+
+        future = asyncio.run_coroutine_threadsafe(_pump(), loop)
+        future.add_done_callback(lambda _: lines.put(_END))
+        try:
+            while True:
+                line = lines.get()
+                if line is _END:
+                    break
+                yield line
+            future.result()
+        finally:
+            if not future.done():
+                future.cancel()
+
+    def close(self) -> None:
+        """Close pooled connections and stop the loop thread."""
+        with self._lock:
+            loop, client = self._loop, self._client
+            self._loop, self._client, self._hosts = None, None, {}
+        if loop is None:
+            return
+        if client is not None:
+            asyncio.run_coroutine_threadsafe(client.aclose(), loop).result(timeout=5)
+        loop.call_soon_threadsafe(loop.stop)
+
+
+http_pool = HTTPPool()
@@ -2,9 +2,9 @@ from __future__ import annotations
 
 import logging
 import time
-import requests
 
 from app.core.settings import settings
+from app.services.http_client import http_pool
 
 logger = logging.getLogger(__name__)
 
@@ -17,7 +17,7 @@ def _post(path: str, payload: dict) -> None:
     delay = 0.2
     for attempt in range(attempts):
         try:
-            requests.post(url, json=payload, timeout=2)
+            http_pool.post(url, json=payload, timeout=2)
             return
         except Exception as e:
             if attempt == attempts - 1:
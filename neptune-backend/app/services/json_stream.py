@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import json
+from typing import Any, List
+
+
+class JSONListStream:
+    """
+    Incremental parser for a top-level JSON list.
+
+    ``feed`` takes text as it arrives and returns the list items it
+    completed. Text before the opening ``[`` is skipped; ``closed`` turns
+    true at the matching ``]`` and anything after it is ignored, so callers
+    can stop reading there. Items that fail to parse are dropped.
+    """
+
+    def __init__(self) -> None:
+        self.started = False
+        self.closed = False
+        self.items: List[Any] = []
+        self._consumed: List[str] = []
+        self._item: List[str] = []
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+
+    @property
+    def text(self) -> str:
+        """Text from the opening ``[`` up to the closing ``]`` (or what arrived so far)."""
+        return "".join(self._consumed)
+
+    def feed(self, chunk: str) -> List[Any]:
+        completed: List[Any] = []
+        for ch in chunk:
+            if self.closed:
+                break
+            if not self.started:
+                if ch == "[":
+                    self.started = True
+                    self._depth = 1
+                    self._consumed.append(ch)
+                continue
+            self._consumed.append(ch)
+            if self._in_string:
+                self._item.append(ch)
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                continue
+            if ch == '"':
+                self._in_string = True
+                self._item.append(ch)
+            elif ch in "[{":
+                self._depth += 1
+                self._item.append(ch)
+            elif ch in "]}":
+                self._depth -= 1
+                if self._depth == 0:
+                    self._finish(completed)
+                    self.closed = True
+                    break
+                self._item.append(ch)
+                if self._depth == 1:
+                    self._finish(completed)
+            elif ch == "," and self._depth == 1:
+                self._finish(completed)
+            elif self._depth > 1 or not ch.isspace():
+                self._item.append(ch)
+        self.items.extend(completed)
+        return completed
+
+    def _finish(self, completed: List[Any]) -> None:
+        text = "".join(self._item).strip()
+        self._item = []
+        if not text:
+            return
+        try:
+            completed.append(json.loads(text))
+        except ValueError:
+            pass
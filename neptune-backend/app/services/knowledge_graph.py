@@ -1,274 +1,730 @@
-from typing import Dict, List, Any
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from dataclasses import dataclass, field
 from sqlalchemy.orm import Session
-from datetime import datetime, timedelta
+from datetime import datetime
+import hashlib
 import json
-import os
 import threading
+import time
 import logging
 
-from app.services.llm_service import extract_topics_from_notes, llm_service
-from app.services.visualize_topics import create_topic_graph, graph_to_frontend_format
+from app.services.llm_scheduler import Priority, llm_priority
+from app.services.llm_service import llm_service
+from app.services.visualize_topics import (
+    compute_topic_centroids,
+    create_topic_graph,
+    graph_to_frontend_format,
+    relationships_from_centroids,
+)
 from app.db.models import FileSystem
 from app.db.database import SessionLocal
 from app.core.settings import settings
+from app.services.topic_assignments import (
+    record_assignments,
+    remove_assignments,
+    stored_topics,
+)
 from app.services.topic_cache import topic_cache
 from app.services.note_content import load_note_content
-from app.services.embeddings import load_embeddings_map, upsert_embedding
+from app.services.embeddings import load_embeddings_map
+from app.services.graph_pipeline import run_graph_pipeline
+from app.services.graph_scheduler import RegenerationScheduler
+from app.services.graph_events import graph_event_bus
+from app.services.graph_store import CachedGraph, graph_etag, graph_store
+from app.services.graph_tenants import note_owner, owner_clause, scoped_key
+from app.services.generation_lease import GenerationLease
+from app.services.graph_edges import EdgeList
+from app.services.graph_clustering import ClusterModel, build_cluster_model
+from app.services.graph_hierarchy import GraphHierarchy, build_hierarchy
+from app.services.graph_index import GraphIndex
+from app.services.graph_layout import apply_layout
+from app.services.note_graph import NOTE_GRAPH_KEY, apply_note_graph_change, refresh_note_graph
 
 logger = logging.getLogger(__name__)
-# Cache for the latest graph data
-latest_graph_data = None
-generation_status = {
-    "is_generating": False,
-    "progress": "idle",
-    "started_at": None,
-    "finished_at": None,
-    "last_error": None,
-    "last_heartbeat": None,
-    "last_success_at": None,
-}
-generation_lock = threading.Lock()
-
-# Caching configuration
-def _resolve_cache_path() -> str:
-    if "{version}" in settings.kg_cache_path:
-        return settings.kg_cache_path.format(version=settings.kg_cache_version)
-    base, ext = os.path.splitext(settings.kg_cache_path)
-    if ext:
-        return f"{base}.{settings.kg_cache_version}{ext}"
-    return f"{settings.kg_cache_path}.{settings.kg_cache_version}"
-
-
-cache_file = _resolve_cache_path()
-cache_duration = timedelta(minutes=settings.kg_cache_ttl_minutes)
-
-def get_cached_graph_data() -> Dict:
-    """Get cached graph data from file if valid, otherwise return empty"""
+# Store key of the shared knowledge graph
+GRAPH_CACHE_KEY = "graph"
+# Store key of the named cluster centroids used by KG_GRAPH_MODE=cluster
+CLUSTER_MODEL_KEY = "clusters"
+# Store key of every scored topic edge, sorted by strength, for query-time filtering
+EDGE_LIST_KEY = "edges"
+# Lease name prefix; each owner's graph has its own lease
+LEASE_NAME = "knowledge_graph"
+
+
+def _new_status() -> Dict[str, Any]:
+    return {
+        "is_generating": False,
+        "progress": "idle",
+        "started_at": None,
+        "finished_at": None,
+        "last_error": None,
+        "last_heartbeat": None,
+        "last_success_at": None,
+        "stages": {},
+    }
+
+
+@dataclass
+class _Tenant:
+    """Generation state of one owner's graph (``owner_id=None``: notes without an owner)."""
+
+    owner_id: Optional[str]
+    status: Dict[str, Any] = field(default_factory=_new_status)
+    lock: threading.Lock = field(default_factory=threading.Lock)
+    # Cluster-wide single-flight lease; also carries the shared generation status
+    lease: GenerationLease | None = None
+    status_published_at: float = 0.0
+    # Topic centroid vectors backing the cached graph, used for incremental updates
+    centroids: Dict[str, List[float]] = field(default_factory=dict)
+
+    def __post_init__(self) -> None:
+        if self.lease is None:
+            self.lease = GenerationLease(scoped_key(LEASE_NAME, self.owner_id), settings.kg_lease_ttl_seconds)
+
+
+_tenants: Dict[Optional[str], _Tenant] = {}
+_tenants_lock = threading.Lock()
+delta_lock = threading.Lock()
+# Views derived from cached graphs, rebuilt once per store generation
+_derived_views: Dict[Tuple[str, str], Tuple[int | None, Any]] = {}
+_derived_lock = threading.Lock()
+
+
+def _tenant(owner_id: Optional[str] = None) -> _Tenant:
+    with _tenants_lock:
+        tenant = _tenants.get(owner_id)
+        if tenant is None:
+            tenant = _tenants[owner_id] = _Tenant(owner_id)
+        return tenant
+
+def _settings_fingerprint() -> str:
+    return "|".join(
+        [
+            settings.kg_cache_version,
+            settings.llm_prompt_version,
+            settings.ollama_model,
+            settings.embedding_model,
+            str(settings.kg_min_strength),
+            str(settings.kg_max_edges),
+            str(settings.kg_edge_floor),
+            str(settings.kg_edge_store_max),
+            str(settings.kg_knn_threshold),
+            str(settings.kg_knn_neighbors),
+            settings.kg_relationship_mode,
+            settings.kg_graph_mode,
+            str(settings.kg_cluster_count),
+            settings.kg_cluster_naming,
+            str(settings.min_note_chars),
+        ]
+    )
+
+
+def compute_graph_fingerprint(db: Session, owner_id: Optional[str] = None) -> str:
+    """
+    Fingerprint the inputs of an owner's graph.
+
+    Hashes the sorted (note_id, content_checksum) set together with the
+    prompt, model and graph settings versions. Equal fingerprints mean a
+    regeneration would produce the same graph, so it can be skipped.
+    """
+    digest = hashlib.sha256(_settings_fingerprint().encode("utf-8"))
+    rows = (
+        db.query(FileSystem.id, FileSystem.content_checksum, FileSystem.updated_at)
+        .filter(FileSystem.type == "file")
+        .filter(FileSystem.deleted_at.is_(None))
+        .filter(owner_clause(owner_id))
+        .order_by(FileSystem.id)
+        .yield_per(1000)
+    )
+    for note_id, checksum, updated_at in rows:
+        # Notes created without content have no checksum yet.
+        marker = checksum or (updated_at.isoformat() if updated_at else "")
+        digest.update(f"\n{note_id}:{marker}".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def get_graph_entry(owner_id: Optional[str] = None) -> CachedGraph | None:
+    """Stored graph entry (payload and generation metadata) of an owner."""
+    return graph_store.get(scoped_key(GRAPH_CACHE_KEY, owner_id))
+
+
+def get_cached_graph_data(owner_id: Optional[str] = None) -> Dict:
+    """Get cached graph data from the shared graph store, otherwise return empty"""
     try:
-        if os.path.exists(cache_file):
-            with open(cache_file, 'r') as f:
-                cached_data = json.load(f)
-            
-            cache_time = datetime.fromisoformat(cached_data['timestamp'])
-            if datetime.now() - cache_time < cache_duration:
-                print("Using cached knowledge graph from file")
-                return cached_data['graph']
-        
-        logger.info("Cache expired or missing")
+        entry = get_graph_entry(owner_id)
+        if entry is not None:
+            return entry.graph
         return {"nodes": [], "links": []}
-        
     except Exception as e:
         logger.warning("Cache error: %s", e)
         return {"nodes": [], "links": []}
 
-def cache_graph_data(graph_data: Dict):
-    """Cache the graph data with timestamp"""
-    global latest_graph_data
-    
+def cache_graph_data(graph_data: Dict, fingerprint: str | None = None, owner_id: Optional[str] = None):
+    """Publish an owner's graph to the shared store with its input fingerprint and ETag"""
+    key = scoped_key(GRAPH_CACHE_KEY, owner_id)
     try:
-        os.makedirs(os.path.dirname(cache_file) or ".", exist_ok=True)
-        
-        cache_data = {
-            "timestamp": datetime.now().isoformat(),
-            "graph": graph_data
-        }
-        
-        with open(cache_file, 'w') as f:
-            json.dump(cache_data, f)
-        
-        latest_graph_data = graph_data
-        logger.info("Knowledge graph cached")
-        
+        entry = graph_store.put(
+            key,
+            graph_data,
+            fingerprint=fingerprint,
+            etag=graph_etag(graph_data),
+        )
+        logger.info("Knowledge graph cached (generation %s)", entry.generation)
     except Exception as e:
         logger.warning("Cache save error: %s", e)
+        return
+    with _derived_lock:
+        for view in [view for view in _derived_views if view[1] == key]:
+            del _derived_views[view]
+    graph_event_bus.notify()
+    try:
+        get_graph_index(owner_id)
+        get_graph_hierarchy(owner_id)
+    except Exception as e:
+        logger.warning("Graph view build failed: %s", e)
 
-def get_latest_graph_data() -> Dict:
-    """Get the latest graph data from memory or file cache"""
-    global latest_graph_data
-    
-    if latest_graph_data is not None:
-        print("Using in-memory cached knowledge graph")
-        return latest_graph_data
-    
-    file_cached = get_cached_graph_data()
-    if file_cached.get("nodes"):
-        latest_graph_data = file_cached
-        return file_cached
-    
-    return {"nodes": [], "links": []}
+def get_latest_graph_data(owner_id: Optional[str] = None) -> Dict:
+    """Get the latest graph data; memoized per process, shared across processes"""
+    return get_cached_graph_data(owner_id)
 
-def get_generation_status() -> Dict:
-    """Get current generation status"""
-    global generation_status
-    return generation_status.copy()
 
-def generate_knowledge_graph_background():
-    """Generate knowledge graph without blocking the server."""
-    global generation_status
-    
-    generation_status["is_generating"] = True
-    generation_status["progress"] = "starting"
-    generation_status["started_at"] = datetime.now().isoformat()
-    generation_status["finished_at"] = None
-    generation_status["last_error"] = None
-    generation_status["last_heartbeat"] = datetime.now().isoformat()
-    
-    logger.info("Generating knowledge graph in background")
+def get_latest_graph_meta(owner_id: Optional[str] = None) -> Dict[str, Any]:
+    """Generation, fingerprint, ETag and timestamp of an owner's cached graph."""
+    entry = get_graph_entry(owner_id)
+    if entry is None:
+        return {"generation": None, "fingerprint": None, "etag": None, "timestamp": None}
+    return entry.meta()
+
+
+def _derived_view(name: str, builder: Callable[[Dict[str, Any]], Any], key: str) -> Any:
+    """Memoize a view of a stored graph until its store generation changes."""
+    entry = graph_store.get(key)
+    generation = entry.generation if entry is not None else None
+    with _derived_lock:
+        cached = _derived_views.get((name, key))
+        if cached is not None and cached[0] == generation:
+            return cached[1]
+    view = builder(entry.graph if entry is not None else {"nodes": [], "links": []})
+    with _derived_lock:
+        _derived_views[(name, key)] = (generation, view)
+    return view
+
+
+def get_graph_hierarchy(owner_id: Optional[str] = None) -> GraphHierarchy:
+    """Groups -> topics -> notes hierarchy of an owner's cached graph."""
+    return _derived_view("hierarchy", build_hierarchy, scoped_key(GRAPH_CACHE_KEY, owner_id))
+
+
+def get_graph_index(owner_id: Optional[str] = None) -> GraphIndex:
+    """CSR adjacency of an owner's cached graph for neighbourhood/subgraph queries."""
+    return _derived_view("index", GraphIndex.from_graph, scoped_key(GRAPH_CACHE_KEY, owner_id))
+
+
+def get_edge_list(owner_id: Optional[str] = None) -> EdgeList:
+    """Sorted scored edges of an owner's graph; caches without one fall back to their links."""
+    key = scoped_key(EDGE_LIST_KEY, owner_id)
+    if graph_store.get(key) is None:
+        return _derived_view(
+            "links",
+            lambda graph: EdgeList.from_links(graph.get("links", [])),
+            scoped_key(GRAPH_CACHE_KEY, owner_id),
+        )
+    return _derived_view("edges", EdgeList.from_dict, key)
+
+
+def get_filtered_graph_data(
+    min_strength: float | None = None,
+    max_edges: int | None = None,
+    max_degree: int = 0,
+    owner_id: Optional[str] = None,
+) -> Dict[str, Any]:
+    """The cached graph with links re-selected from the sorted edge list (no rescoring)."""
+    graph_data = get_latest_graph_data(owner_id)
+    node_ids = {node["id"] for node in graph_data.get("nodes", [])}
+    links = get_edge_list(owner_id).links(
+        min_strength=min_strength,
+        max_edges=max_edges,
+        max_degree=max_degree,
+        node_ids=node_ids,
+    )
+    return {**graph_data, "links": links}
+
+
+def get_latest_graph_etag(owner_id: Optional[str] = None) -> str | None:
+    """ETag of the graph returned by ``get_latest_graph_data``."""
+    return get_latest_graph_meta(owner_id).get("etag")
+
+
+def _update_status(tenant: _Tenant, publish: bool = True, **fields: Any) -> None:
+    """Update a tenant's local generation status and mirror it to its lease row."""
+    tenant.status.update(fields)
+    tenant.status["last_heartbeat"] = datetime.now().isoformat()
+    if not publish:
+        # Pipeline progress fires per batch; publish at most once a second.
+        if time.monotonic() - tenant.status_published_at < 1.0:
+            return
+    tenant.status_published_at = time.monotonic()
+    tenant.lease.publish_status(tenant.status)
+    graph_event_bus.notify()
+
+
+def get_generation_status(owner_id: Optional[str] = None) -> Dict:
+    """
+    Get current generation status of an owner's graph.
+
+    Replicas that are not generating report the status published by the
+    lease holder, so every process shows the same progress.
+    """
+    tenant = _tenant(owner_id)
+    status = tenant.status.copy()
+    lease = tenant.lease.read()
+    if lease is None:
+        return status
+    active = lease.active()
+    if lease.status and not tenant.status["is_generating"]:
+        status.update(lease.status)
+        if status.get("is_generating") and not active:
+            # The holder stopped heartbeating without finishing.
+            status["is_generating"] = False
+            status["progress"] = "abandoned"
+    status["lease"] = {
+        "holder": lease.holder if active else None,
+        "expires_at": datetime.fromtimestamp(lease.expires_at).isoformat() if active else None,
+        "held_by_this_process": active and lease.holder == tenant.lease.holder_id,
+    }
+    return status
+
+def generate_knowledge_graph_background(owner_id: Optional[str] = None):
+    """Generate an owner's knowledge graph without blocking the server."""
+    tenant = _tenant(owner_id)
+    status = tenant.status
+    _update_status(
+        tenant,
+        is_generating=True,
+        progress="starting",
+        started_at=datetime.now().isoformat(),
+        finished_at=None,
+        last_error=None,
+        stages={},
+    )
     
-    # Create new database session
-    db = SessionLocal()
+    logger.info("Generating knowledge graph in background for %s", owner_id or "default tenant")
     
+    def _on_progress(stage: str, stages: Dict[str, Dict[str, Any]]) -> None:
+        _update_status(tenant, publish=False, progress=f"pipeline_{stage}", stages=stages)
+
     try:
-        generation_status["progress"] = "fetching_notes"
-        generation_status["last_heartbeat"] = datetime.now().isoformat()
-        
-        # Get ALL notes from database
-        notes = (
-            db.query(FileSystem)
-            .filter(FileSystem.type == "file")
-            .filter(FileSystem.deleted_at.is_(None))
-            .all()
+        _update_status(tenant, progress="fingerprinting")
+        db = SessionLocal()
+        try:
+            fingerprint = compute_graph_fingerprint(db, owner_id)
+        finally:
+            db.close()
+        if fingerprint == get_latest_graph_meta(owner_id).get("fingerprint"):
+            logger.info("Knowledge graph inputs unchanged; skipping regeneration")
+            finished_at = datetime.now().isoformat()
+            _update_status(tenant, progress="unchanged", finished_at=finished_at, last_success_at=finished_at)
+            return
+
+        _update_status(tenant, progress="fetching_notes")
+
+        cluster_mode = settings.kg_graph_mode == "cluster"
+        result = run_graph_pipeline(
+            on_progress=_on_progress, classify=not cluster_mode, owner_id=owner_id, cancel=tenant.lease.lost
         )
-        
-        if not notes:
-            logger.info("No notes found in database")
-            empty_graph = {"nodes": [], "links": []}
-            cache_graph_data(empty_graph)
+        status["stages"] = result.stats
+        if _lease_lost(tenant):
             return
-        
-        # Format notes for LLM processing
-        formatted_notes = []
-        for note in notes:
-            try:
-                loaded = load_note_content(note)
-                content = loaded.content or ""
-            except Exception:
-                content = ""
-            if content and len(content.strip()) >= settings.min_note_chars:
-                formatted_notes.append({
-                    "id": str(note.id),
-                    "content": content,
-                    "checksum": note.content_checksum or ""
-                })
-
-            if content and len(content.strip()) >= settings.min_note_chars:
-                try:
-                    upsert_embedding(db, note, content)
-                except Exception as e:
-                    logger.warning("Embedding upsert failed for note %s: %s", note.id, e)
-        
-        if formatted_notes:
-            try:
-                db.commit()
-            except Exception as e:
-                logger.warning("Failed to commit embeddings: %s", e)
-                db.rollback()
 
-        if not formatted_notes:
+        if not result.notes_seen:
+            logger.info("No notes found in database")
+        elif not result.notes_with_content:
             logger.info("No meaningful content found in notes")
-            empty_graph = {"nodes": [], "links": []}
-            cache_graph_data(empty_graph)
-            return
-        
-        generation_status["progress"] = f"processing_{len(formatted_notes)}_notes"
-        generation_status["last_heartbeat"] = datetime.now().isoformat()
-        logger.info("Processing %s notes with Ollama", len(formatted_notes))
-        
-        # Process with Ollama (topic extraction) with cache.
-        cached_topics = []
-        notes_to_process = []
-        for note in formatted_notes:
-            cached = topic_cache.get(note["id"], note.get("checksum", ""))
-            if cached:
-                cached_topics.append({"topic": cached, "note_id": note["id"]})
-            else:
-                notes_to_process.append(note)
-
-        new_topics = []
-        if notes_to_process:
-            batch_size = max(1, settings.llm_topic_batch_size)
-            for i in range(0, len(notes_to_process), batch_size):
-                batch = notes_to_process[i : i + batch_size]
-                batch_topics = llm_service.extract_topics_batch(batch)
-                new_topics.extend(batch_topics)
-
-            for item in new_topics:
-                note = next((n for n in notes_to_process if n["id"] == item["note_id"]), None)
-                if note and note.get("checksum"):
-                    topic_cache.set(note["id"], note["checksum"], item["topic"])
-            topic_cache.flush()
-
-        topics_data = cached_topics + new_topics
-        
-        if topics_data:
-            generation_status["progress"] = "building_graph"
-            generation_status["last_heartbeat"] = datetime.now().isoformat()
-            
-            topic_map: Dict[str, List[str]] = {}
-            for item in topics_data:
-                topic = item.get("topic")
-                note_id = str(item.get("note_id", "")).strip()
-                if not topic or not note_id:
-                    continue
-                topic_map.setdefault(topic, []).append(note_id)
+        # A graph missing notes (failed or skipped topic batches) must not
+        # claim the inputs' fingerprint, or later runs would skip as unchanged.
+        graph_fingerprint = fingerprint if result.complete else None
+        if graph_fingerprint is None:
+            logger.info(
+                "Only %s of %s notes got a topic; the graph will be regenerated next run",
+                result.notes_assigned,
+                result.notes_with_content,
+            )
+
+        # The note graph only needs the embeddings the pipeline just refreshed.
+        _update_status(tenant, progress="note_graph")
+        try:
+            refresh_note_graph(fingerprint=fingerprint, owner_id=owner_id)
+        except Exception as e:
+            logger.warning("Note graph build failed: %s", e)
+
+        topic_map = result.topic_map
+        topic_vectors = result.topic_vectors()
+        if cluster_mode:
+            _update_status(tenant, progress="clustering")
+            model, topic_map = build_cluster_model(result.notes, previous=_load_cluster_model(owner_id))
+            topic_vectors = model.topic_vectors() if model else {}
+            if model is not None and not _lease_lost(tenant):
+                graph_store.put(
+                    scoped_key(CLUSTER_MODEL_KEY, owner_id), model.to_dict(), fingerprint=fingerprint, etag=None
+                )
+
+        if topic_map:
+            _update_status(tenant, progress="building_graph")
 
             condensed = [{"topic": topic, "note_ids": note_ids} for topic, note_ids in topic_map.items()]
-            note_ids = []
-            for item in condensed:
-                note_ids.extend([int(n) for n in item.get("note_ids", []) if str(n).isdigit()])
-            embeddings_map = load_embeddings_map(db, list(set(note_ids)))
-            graph = create_topic_graph(condensed, note_embeddings=embeddings_map)
-            graph_data = graph_to_frontend_format(graph)
+            graph = create_topic_graph(condensed, topic_vectors=topic_vectors)
+            graph_data = graph_to_frontend_format(graph, note_names=result.note_names)
+            edge_list = graph.graph.get("edge_list") or EdgeList.from_links(graph_data["links"])
+            _update_status(tenant, progress="layout")
+            apply_layout(graph_data, previous=get_latest_graph_data(owner_id))
+            if _lease_lost(tenant):
+                return
+            graph_store.put(
+                scoped_key(EDGE_LIST_KEY, owner_id), edge_list.to_dict(), fingerprint=graph_fingerprint, etag=None
+            )
+            tenant.centroids.clear()
+            tenant.centroids.update(topic_vectors)
             
             # Cache the result
-            cache_graph_data(graph_data)
-            generation_status["progress"] = "completed"
-            generation_status["finished_at"] = datetime.now().isoformat()
-            generation_status["last_success_at"] = generation_status["finished_at"]
+            cache_graph_data(graph_data, fingerprint=graph_fingerprint, owner_id=owner_id)
+            finished_at = datetime.now().isoformat()
+            _update_status(tenant, progress="completed", finished_at=finished_at, last_success_at=finished_at)
             logger.info("Knowledge graph generated with %s nodes", len(graph_data.get("nodes", [])))
         else:
             logger.info("No topics extracted from notes")
+            if _lease_lost(tenant):
+                return
             empty_graph = {"nodes": [], "links": []}
-            cache_graph_data(empty_graph)
+            graph_store.delete(scoped_key(EDGE_LIST_KEY, owner_id))
+            cache_graph_data(empty_graph, fingerprint=graph_fingerprint, owner_id=owner_id)
     
     except Exception as e:
         logger.error("Error generating knowledge graph: %s", e)
-        generation_status["progress"] = f"error: {str(e)}"
-        generation_status["last_error"] = str(e)
-        empty_graph = {"nodes": [], "links": []}
-        cache_graph_data(empty_graph)
+        status["progress"] = f"error: {str(e)}"
+        status["last_error"] = str(e)
+        if not tenant.lease.lost.is_set():
+            empty_graph = {"nodes": [], "links": []}
+            cache_graph_data(empty_graph, owner_id=owner_id)
     
     finally:
-        db.close()
-        generation_status["is_generating"] = False
-        if generation_status["finished_at"] is None:
-            generation_status["finished_at"] = datetime.now().isoformat()
+        status["is_generating"] = False
+        if status["finished_at"] is None:
+            status["finished_at"] = datetime.now().isoformat()
+        _update_status(tenant)
         logger.info("Graph generation completed")
 
-def start_background_generation():
-    """Start knowledge graph generation in background thread"""
-    if not generation_lock.acquire(blocking=False):
-        logger.info("Generation already running")
+def _lease_lost(tenant: _Tenant) -> bool:
+    """True (and recorded in the status) once another replica took the generation lease."""
+    if not tenant.lease.lost.is_set():
         return False
-    def _run():
+    logger.warning("Generation lease lost; discarding this run's graph")
+    _update_status(tenant, progress="lease_lost", last_error="generation lease lost to another replica")
+    return True
+
+
+def _run_scheduled_generation(owner_id: Optional[str] = None) -> None:
+    """Run one generation of an owner's graph if this replica wins its lease."""
+    tenant = _tenant(owner_id)
+    # The local lock comes first: a note delta holding it also holds the
+    # lease, which this process would otherwise re-acquire as its own.
+    with tenant.lock:
+        if not tenant.lease.try_acquire():
+            # Another replica is generating or patching. Retry after the minimum
+            # interval; the fingerprint check makes the retry cheap once it has finished.
+            logger.info("Knowledge graph generation is running on another replica")
+            regeneration_scheduler.request(key=owner_id)
+            return
         try:
-            generate_knowledge_graph_background()
+            with llm_priority(Priority.BACKFILL, owner_id):
+                generate_knowledge_graph_background(owner_id)
+            if tenant.lease.lost.is_set():
+                # The replica that took over generates from current inputs; make
+                # sure this owner is looked at again if it gives up.
+                regeneration_scheduler.request(key=owner_id)
         finally:
-            generation_lock.release()
+            tenant.lease.release()
 
-    thread = threading.Thread(target=_run, daemon=True)
-    thread.start()
-    logger.info("Knowledge graph generation started")
+
+regeneration_scheduler = RegenerationScheduler(
+    _run_scheduled_generation,
+    debounce_seconds=settings.kg_debounce_seconds,
+    min_interval_seconds=settings.kg_min_interval_seconds,
+    max_delay_seconds=settings.kg_debounce_max_seconds,
+    workers=settings.kg_tenant_workers,
+)
+
+
+def start_background_generation(immediate: bool = False, owner_id: Optional[str] = None):
+    """
+    Schedule generation of an owner's knowledge graph.
+
+    Requests are coalesced by the regeneration scheduler: bursts of saves
+    collapse into one debounced run, and a request made while a run is in
+    progress triggers exactly one trailing run afterwards.
+    ``immediate`` skips the debounce window (the minimum interval between
+    runs still applies). Owners are regenerated in parallel, least recently
+    served first.
+    """
+    regeneration_scheduler.request(immediate=immediate, key=owner_id)
+    logger.info("Knowledge graph generation scheduled for %s", owner_id or "default tenant")
     return True
 
-def invalidate_cache():
-    """Clear all cached data"""
-    global latest_graph_data
-    latest_graph_data = None
+
+def get_scheduler_status(owner_id: Optional[str] = None) -> Dict:
+    """Get an owner's regeneration scheduler state (dirty flag, queue depth, last change)."""
+    return regeneration_scheduler.status(owner_id)
+
+def invalidate_cache(owner_id: Optional[str] = None):
+    """Clear all cached data of an owner"""
+    _tenant(owner_id).centroids.clear()
     
     try:
-        if os.path.exists(cache_file):
-            os.remove(cache_file)
+        for key in (GRAPH_CACHE_KEY, CLUSTER_MODEL_KEY, EDGE_LIST_KEY, NOTE_GRAPH_KEY):
+            graph_store.delete(scoped_key(key, owner_id))
+        graph_event_bus.notify()
         logger.info("Cache invalidated")
     except Exception as e:
         logger.warning("Error invalidating cache: %s", e)
+
+
+def _node_note_ids(node: Dict[str, Any]) -> List[str]:
+    return [str(note_id) for note_id in node.get("noteIds", [])]
+
+
+def _move_note(
+    graph_data: Dict[str, Any],
+    note_id: str,
+    topic: str | None,
+    note_name: str | None = None,
+) -> set[str]:
+    """
+    Move a note to ``topic`` (or drop it when ``topic`` is None) in place.
+
+    Returns the topics whose membership changed. Topics left without notes
+    are removed together with their links.
+    """
+    affected: set[str] = set()
+    nodes = graph_data.setdefault("nodes", [])
+    for node in nodes:
+        note_ids = _node_note_ids(node)
+        if note_id in note_ids and node["id"] != topic:
+            node["noteIds"] = [n for n in note_ids if n != note_id]
+            node["noteDetails"] = [
+                detail for detail in node.get("noteDetails", []) if str(detail.get("id")) != note_id
+            ]
+            affected.add(node["id"])
+
+    if topic:
+        node = next((n for n in nodes if n["id"] == topic), None)
+        if node is None:
+            node = {"id": topic, "label": topic, "topic": topic, "noteIds": [], "noteDetails": []}
+            nodes.append(node)
+        note_ids = _node_note_ids(node)
+        if note_id not in note_ids:
+            node["noteIds"] = note_ids + [note_id]
+            node.setdefault("noteDetails", []).append(
+                {"id": int(note_id) if note_id.isdigit() else note_id, "name": note_name or f"Note {note_id}"}
+            )
+            affected.add(topic)
+        else:
+            for detail in node.get("noteDetails", []):
+                if str(detail.get("id")) == note_id and note_name:
+                    detail["name"] = note_name
+
+    for node in nodes:
+        if node["id"] in affected:
+            node["noteCount"] = len(node["noteIds"])
+            node["size"] = node["noteCount"] * 20
+
+    removed = {node["id"] for node in nodes if not node.get("noteIds")}
+    if removed:
+        graph_data["nodes"] = [node for node in nodes if node["id"] not in removed]
+        graph_data["links"] = [
+            link
+            for link in graph_data.get("links", [])
+            if link["source"] not in removed and link["target"] not in removed
+        ]
+    return affected
+
+
+def _rebuild_edges(
+    graph_data: Dict[str, Any],
+    centroids: Dict[str, List[float]],
+    affected: set[str],
+    edge_list: EdgeList | None = None,
+) -> EdgeList:
+    """
+    Rescore edges touching ``affected`` topics and re-apply the edge budget.
+
+    Returns the updated sorted edge list; ``edge_list`` defaults to the
+    graph's current links.
+    """
+    node_ids = {node["id"] for node in graph_data.get("nodes", [])}
+    base = edge_list if edge_list is not None else EdgeList.from_links(graph_data.get("links", []))
+    kept = base.without(affected | (set(base.topics) - node_ids))
+    vectors = {topic: vec for topic, vec in centroids.items() if topic in node_ids}
+    rescored = relationships_from_centroids(
+        vectors,
+        focus=affected & node_ids,
+        min_strength=min(settings.kg_edge_floor, settings.kg_min_strength),
+    )
+    updated = EdgeList.from_edges(kept + rescored)
+    graph_data["links"] = updated.links(node_ids=node_ids)
+    return updated
+
+
+def _extract_note_topic(db: Session, note_id: str, content: str, checksum: str) -> str | None:
+    cached = topic_cache.get(note_id, checksum) or stored_topics(db, [(int(note_id), checksum)]).get(int(note_id))
+    if cached:
+        return cached
+    results = llm_service.extract_topics_batch(
+        [{"id": note_id, "content": content, "checksum": checksum}]
+    )
+    topic = next((item["topic"] for item in results if item["note_id"] == note_id), None)
+    if topic and checksum:
+        # Committed with the cache's next batch; note_topics persists it now.
+        topic_cache.set(note_id, checksum, topic)
+    return topic
+
+
+def _load_cluster_model(owner_id: Optional[str] = None) -> ClusterModel | None:
+    entry = graph_store.get(scoped_key(CLUSTER_MODEL_KEY, owner_id))
+    if entry is None:
+        return None
+    return ClusterModel.from_dict(entry.graph)
+
+
+def _assign_note_cluster(db: Session, note_id: int, owner_id: Optional[str] = None) -> str | None:
+    """Nearest named cluster for a note's stored embedding (no LLM call)."""
+    model = _load_cluster_model(owner_id)
+    if model is None:
+        return None
+    vector = load_embeddings_map(db, [note_id]).get(note_id)
+    if not vector:
+        return None
+    return model.assign(vector)
+
+
+def apply_note_change(note_id: int, deleted: bool = False, owner_id: Optional[str] = None) -> bool:
+    """
+    Patch the owner's cached graph for a single changed note.
+
+    Only the changed note is re-classified and only the centroids and links of
+    the topics it left or joined are recomputed. The patch holds the owner's
+    generation lease, so no replica patches or regenerates the same graph at
+    the same time. Returns False when the delta cannot be applied (no cached
+    graph, lease held elsewhere, extraction failure) and a full regeneration
+    is required instead.
+    """
+    tenant = _tenant(owner_id)
+    if not tenant.lock.acquire(blocking=False):
+        return False
+    try:
+        if not tenant.lease.try_acquire():
+            return False
+        try:
+            return _patch_note(tenant, note_id, deleted, owner_id)
+        finally:
+            tenant.lease.release()
+    finally:
+        tenant.lock.release()
+
+
+def _patch_note(tenant: _Tenant, note_id: int, deleted: bool, owner_id: Optional[str]) -> bool:
+    topic_centroids = tenant.centroids
+    with delta_lock:
+        current = get_latest_graph_data(owner_id)
+        if not current.get("nodes"):
+            return False
+
+        db = SessionLocal()
+        try:
+            note_key = str(note_id)
+            topic = None
+            note_name = None
+            if not deleted:
+                note = (
+                    db.query(FileSystem)
+                    .filter(FileSystem.id == note_id)
+                    .filter(FileSystem.deleted_at.is_(None))
+                    .first()
+                )
+                if note is not None:
+                    note_name = note.name
+                    content = load_note_content(note).content or ""
+                    if len(content.strip()) >= settings.min_note_chars:
+                        if settings.kg_graph_mode == "cluster":
+                            topic = _assign_note_cluster(db, note_id, owner_id)
+                        else:
+                            topic = _extract_note_topic(db, note_key, content, note.content_checksum or "")
+                        if not topic:
+                            return False
+            if settings.kg_graph_mode != "cluster":
+                if topic:
+                    record_assignments(db, [(note_id, topic, note.content_checksum)])
+                else:
+                    remove_assignments(db, note_id)
+                    topic_cache.forget(note_key)
+                db.commit()
+
+            graph_data = json.loads(json.dumps(current))
+            affected = _move_note(graph_data, note_key, topic, note_name)
+            if not affected:
+                return True
+
+            node_map = {node["id"]: node for node in graph_data["nodes"]}
+            missing = [topic_id for topic_id in node_map if topic_id not in topic_centroids]
+            recompute = (affected | set(missing)) & set(node_map)
+            topic_note_map = {
+                topic_id: _node_note_ids(node_map[topic_id]) for topic_id in recompute
+            }
+            note_ids = {
+                int(n) for ids in topic_note_map.values() for n in ids if str(n).isdigit()
+            }
+            embeddings_map = load_embeddings_map(db, list(note_ids))
+            for topic_id in affected:
+                topic_centroids.pop(topic_id, None)
+            topic_centroids.update(compute_topic_centroids(topic_note_map, embeddings_map))
+
+            edge_list = _rebuild_edges(graph_data, topic_centroids, affected, get_edge_list(owner_id))
+            # Only topics whose links changed move; the diff stays local.
+            apply_layout(graph_data, previous=current)
+            if tenant.lease.lost.is_set():
+                logger.warning("Generation lease lost while patching note %s", note_id)
+                return False
+            # The patch reflects this note only; a fingerprint of the live
+            # inputs could cover other notes' concurrent edits and make their
+            # fallback regeneration skip as unchanged.
+            graph_store.put(scoped_key(EDGE_LIST_KEY, owner_id), edge_list.to_dict(), fingerprint=None, etag=None)
+            cache_graph_data(graph_data, fingerprint=None, owner_id=owner_id)
+            logger.info("Applied incremental graph update for note %s (%s topics)", note_id, len(affected))
+            return True
+        except Exception as e:
+            logger.warning("Incremental graph update failed for note %s: %s", note_id, e)
+            return False
+        finally:
+            db.close()
+
+
+def start_incremental_update(note_id: int, deleted: bool = False) -> None:
+    """
+    Apply a note delta to its owner's graph in the background, falling back
+    to a full regeneration of that owner only.
+    """
+    def _run():
+        db = SessionLocal()
+        try:
+            owner_id = note_owner(db, note_id)
+        finally:
+            db.close()
+        with llm_priority(Priority.INCREMENTAL, owner_id):
+            applied = apply_note_change(note_id, deleted=deleted, owner_id=owner_id)
+        if not applied:
+            start_background_generation(owner_id=owner_id)
+        try:
+            apply_note_graph_change(note_id, deleted=deleted, owner_id=owner_id)
+        except Exception as e:
+            logger.warning("Note graph update failed for note %s: %s", note_id, e)
+
+    thread = threading.Thread(target=_run, daemon=True)
+    thread.start()
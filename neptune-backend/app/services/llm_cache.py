@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from app.core.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+def request_key(model: str, prompt: str, options: Dict[str, Any]) -> str:
+    """Stable hash of everything that determines an LLM response."""
+    payload = json.dumps({"model": model, "prompt": prompt, "options": options}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class _Call:
+    done: threading.Event = field(default_factory=threading.Event)
+    result: Any = None
+    error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """Runs one call per key at a time; concurrent callers share its result."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _Call] = {}
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """Result of ``fn`` and whether it was shared from another caller."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+        return call.result, False
+
+
+class LLMResponseCache:
+    """
+    Raw LLM responses keyed by ``request_key``.
+
+    Stored in a SQLite table next to the graph cache so retried generations
+    and restarts reuse answers already paid for. The least recently used
+    entries are evicted past ``llm_response_cache_max_entries``. With
+    ``LLM_RESPONSE_CACHE=deterministic`` only temperature-0 requests are
+    cached; ``off`` disables the cache.
+    """
+
+    def __init__(self, path: Optional[str] = None) -> None:
+        self.path = path or self._resolve_path()
+        self._lock = threading.RLock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._writes = 0
+
+    def _resolve_path(self) -> str:
+        base, ext = os.path.splitext(settings.kg_cache_path)
+        return f"{base if ext else settings.kg_cache_path}.llm.sqlite"
+
+    def _connect(self, create: bool = True) -> Optional[sqlite3.Connection]:
+        if self._conn is not None:
+            return self._conn
+        if not create and not os.path.exists(self.path):
+            return None
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS llm_responses (
+                key TEXT PRIMARY KEY,
+                response TEXT NOT NULL,
+                used_at REAL NOT NULL
+            )
+            """
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_llm_responses_used ON llm_responses (used_at)")
+        self._conn = conn
+        return conn
+
+    @staticmethod
+    def cacheable(options: Dict[str, Any]) -> bool:
+        mode = settings.llm_response_cache
+        if mode == "off":
+            return False
+        if mode == "deterministic":
+            return float(options.get("temperature", 0.0)) == 0.0
+        return True
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            conn = self._connect(create=False)
+            if conn is None:
+                return None
+            row = conn.execute("SELECT response FROM llm_responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE llm_responses SET used_at = ? WHERE key = ?", (time.time(), key))
+            return row[0]
+
+    def set(self, key: str, response: str) -> None:
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_responses (key, response, used_at) VALUES (?, ?, ?)",
+                (key, response, time.time()),
+            )
+            self._writes += 1
+            # Counting rows on every write is wasteful; evict every 100 writes.
+            if self._writes % 100 == 1:
+                self._evict(conn)
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        limit = settings.llm_response_cache_max_entries
+        if limit <= 0:
+            return
+        excess = conn.execute("SELECT COUNT(*) FROM llm_responses").fetchone()[0] - limit
+        if excess > 0:
+            conn.execute(
+                """
+                DELETE FROM llm_responses WHERE key IN (
+                    SELECT key FROM llm_responses ORDER BY used_at LIMIT ?
+                )
+                """,
+                (excess,),
+            )
+
+
+llm_response_cache = LLMResponseCache()
@@ -0,0 +1,220 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from enum import IntEnum
+from typing import Any, Callable, Deque, Dict, Iterator, Optional, Tuple, TypeVar
+
+from app.core.settings import settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class LLMUnavailableError(RuntimeError):
+    """The LLM could not answer (cooldown, repeated failures)."""
+
+
+class LLMBusyError(LLMUnavailableError):
+    """Backpressure: the request was refused or waited past its deadline."""
+
+
+class Priority(IntEnum):
+    INTERACTIVE = 0
+    INCREMENTAL = 1
+    BACKFILL = 2
+
+
+_current: ContextVar[Tuple[Priority, Optional[str]]] = ContextVar(
+    "llm_priority", default=(Priority.INTERACTIVE, None)
+)
+
+
+@contextmanager
+def llm_priority(priority: Priority, owner_id: Optional[str] = None) -> Iterator[None]:
+    """Run LLM calls made in this block (and this thread) at ``priority`` for ``owner_id``."""
+    token = _current.set((priority, owner_id))
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+def current_priority() -> Tuple[Priority, Optional[str]]:
+    return _current.get()
+
+
+def _deadline_seconds(priority: Priority) -> float:
+    return {
+        Priority.INTERACTIVE: settings.llm_deadline_interactive_seconds,
+        Priority.INCREMENTAL: settings.llm_deadline_incremental_seconds,
+        Priority.BACKFILL: settings.llm_deadline_backfill_seconds,
+    }[priority]
+
+
+def retry_busy(call: Callable[[], T], abort: Optional[threading.Event] = None, what: str = "LLM call") -> T:
+    """
+    Run ``call``, backing off and retrying while the LLM pushes back.
+
+    ``LLMBusyError`` means the work was refused, not that it failed, so it
+    is retried (0.5s doubling up to 10s) until it is admitted or ``abort``
+    is set, in which case the last ``LLMBusyError`` is raised.
+    ``LLMUnavailableError`` reaches the caller unchanged.
+    """
+    delay = 0.5
+    while True:
+        try:
+            return call()
+        except LLMBusyError as e:
+            if abort is not None and abort.is_set():
+                raise
+            logger.info("%s deferred: %s", what, e)
+            if abort is not None:
+                abort.wait(delay)
+            else:
+                time.sleep(delay)
+            delay = min(delay * 2, 10.0)
+
+
+@dataclass(eq=False)
+class _Waiter:
+    priority: Priority
+    owner_id: Optional[str]
+    granted: bool = False
+
+
+class LLMScheduler:
+    """
+    Admits LLM calls into ``slots`` concurrent slots by priority class.
+
+    Interactive calls go before incremental updates, which go before
+    backfill (full regeneration). ``reserved`` slots are kept free for
+    interactive calls so regeneration cannot occupy every slot. Within a
+    class, owners take turns, so one owner's regeneration does not queue
+    ahead of another's. A class holds at most ``max_waiting`` waiters and
+    every waiter has a deadline; both raise ``LLMBusyError`` instead of
+    silently dropping the call.
+    """
+
+    def __init__(self, slots: int, reserved: int = 1, max_waiting: int = 16) -> None:
+        self._reserve = max(0, reserved)
+        self.slots = max(1, slots)
+        self.reserved = min(self._reserve, self.slots - 1)
+        self.max_waiting = max(1, max_waiting)
+        self._cond = threading.Condition()
+        self._active = 0
+        self._active_bulk = 0
+        self._queues: Dict[Priority, "OrderedDict[Optional[str], Deque[_Waiter]]"] = {
+            priority: OrderedDict() for priority in Priority
+        }
+        self._waiting: Dict[Priority, int] = {priority: 0 for priority in Priority}
+
+    def resize(self, slots: int) -> None:
+        """Change the slot count, e.g. when Ollama endpoints are added or removed."""
+        with self._cond:
+            self.slots = max(1, slots)
+            self.reserved = min(self._reserve, self.slots - 1)
+            self._dispatch()
+            self._cond.notify_all()
+
+    def _admissible(self, priority: Priority) -> bool:
+        if self._active >= self.slots:
+            return False
+        return priority == Priority.INTERACTIVE or self._active_bulk < self.slots - self.reserved
+
+    def _dispatch(self) -> None:
+        for priority in Priority:
+            queues = self._queues[priority]
+            while queues and self._admissible(priority):
+                owner_id, waiters = next(iter(queues.items()))
+                waiter = waiters.popleft()
+                # Round-robin: the owner just served moves to the back.
+                del queues[owner_id]
+                if waiters:
+                    queues[owner_id] = waiters
+                self._waiting[priority] -= 1
+                self._grant(waiter)
+            if queues:
+                # Lower classes never overtake a waiting higher class.
+                return
+
+    def _grant(self, waiter: _Waiter) -> None:
+        waiter.granted = True
+        self._active += 1
+        if waiter.priority != Priority.INTERACTIVE:
+            self._active_bulk += 1
+
+    def acquire(
+        self,
+        priority: Optional[Priority] = None,
+        owner_id: Optional[str] = None,
+        timeout: Optional[float] = None,
+    ) -> _Waiter:
+        """Wait for a slot; the priority and owner default to ``llm_priority``."""
+        if priority is None:
+            priority, owner_id = current_priority()
+        timeout = _deadline_seconds(priority) if timeout is None else timeout
+        waiter = _Waiter(priority, owner_id)
+        with self._cond:
+            if self._waiting[priority] >= self.max_waiting:
+                raise LLMBusyError(f"LLM queue full for {priority.name.lower()} requests")
+            self._queues[priority].setdefault(owner_id, deque()).append(waiter)
+            self._waiting[priority] += 1
+            self._dispatch()
+            self._cond.notify_all()
+            deadline = time.monotonic() + timeout
+            while not waiter.granted:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._withdraw(waiter)
+                    self._dispatch()
+                    self._cond.notify_all()
+                    raise LLMBusyError(
+                        f"No LLM slot within {timeout:.0f}s for {priority.name.lower()} request"
+                    )
+                self._cond.wait(remaining)
+        return waiter
+
+    def _withdraw(self, waiter: _Waiter) -> None:
+        queues = self._queues[waiter.priority]
+        waiters = queues.get(waiter.owner_id)
+        if waiters is not None and waiter in waiters:
+            waiters.remove(waiter)
+            self._waiting[waiter.priority] -= 1
+            if not waiters:
+                del queues[waiter.owner_id]
+
+    def release(self, waiter: _Waiter) -> None:
+        with self._cond:
+            self._active -= 1
+            if waiter.priority != Priority.INTERACTIVE:
+                self._active_bulk -= 1
+            self._dispatch()
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(
+        self,
+        priority: Optional[Priority] = None,
+        owner_id: Optional[str] = None,
+        timeout: Optional[float] = None,
+    ) -> Iterator[None]:
+        waiter = self.acquire(priority, owner_id, timeout)
+        try:
+            yield
+        finally:
+            self.release(waiter)
+
+    def status(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "slots": self.slots,
+                "active": self._active,
+                "waiting": {priority.name.lower(): self._waiting[priority] for priority in Priority},
+            }
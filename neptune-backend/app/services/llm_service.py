@@ -1,100 +1,174 @@
-import requests
+import httpx
 import json
-from typing import List, Dict, Any
-from datetime import datetime, timedelta
+import re
+from typing import Any, Callable, Dict, List, Optional
 from app.services import prompts
 from dotenv import load_dotenv
 from app.core.settings import settings
+from app.services.http_client import http_pool
+from app.services.json_stream import JSONListStream
+from app.services.llm_cache import SingleFlight, llm_response_cache, request_key
+from app.services.llm_scheduler import LLMScheduler, LLMUnavailableError
+from app.services.ollama_pool import OllamaPool, ollama_pool
 import logging
 import threading
 
 load_dotenv()
 
+# Ollama structured output: constrain list answers to a JSON array of objects.
+# (``format: "json"`` would force a single top-level object.)
+_LIST_FORMAT = {"type": "array", "items": {"type": "object"}}
+
 class LLMService:
-    def __init__(self, model_name: str | None = None):
+    def __init__(self, model_name: str | None = None, pool: OllamaPool | None = None):
         self.model_name = model_name or settings.ollama_model
-        self.ollama_url = settings.ollama_url
-        self.current_endpoint = settings.ollama_url
+        self.pool = pool or ollama_pool
         self._checked_models = False
-        self._failure_count = 0
-        self._cooldown_until: datetime | None = None
-        self.session = requests.Session()
+        self._json_format = settings.ollama_json_format
+        self.http = http_pool
         self.logger = logging.getLogger(__name__)
-        self._semaphore = threading.Semaphore(settings.llm_max_concurrency)
-        self._queue_lock = threading.Lock()
-        self._inflight = 0
+        self.scheduler = LLMScheduler(
+            slots=self.pool.capacity,
+            reserved=settings.llm_interactive_reserved,
+            max_waiting=settings.llm_max_queue,
+        )
         self._metrics_lock = threading.Lock()
-        self._metrics = {"calls": 0, "batches": 0, "failures": 0}
+        self._metrics = {
+            "calls": 0,
+            "batches": 0,
+            "failures": 0,
+            "cache_hits": 0,
+            "coalesced": 0,
+            "early_stops": 0,
+        }
+        self._single_flight = SingleFlight()
         self.logger.info("LLM service configured with model %s", self.model_name)
-        self.logger.info("LLM endpoint: %s", self.current_endpoint)
-        if settings.ollama_shared and "localhost" in self.current_endpoint:
+        self.logger.info("LLM endpoints: %s", ", ".join(self.pool.urls()))
+        if settings.ollama_shared and any("localhost" in url for url in self.pool.urls()):
             self.logger.warning("OLLAMA_SHARED is enabled but endpoint is localhost")
 
     def _maybe_check_models(self) -> None:
-        if self._checked_models or not settings.ollama_healthcheck:
+        """Refresh per-endpoint model lists; fall back to another model if none serves ours."""
+        if not settings.ollama_healthcheck:
+            return
+        available_models = self.pool.refresh_models(self.http)
+        if self._checked_models or not available_models:
             return
         self._checked_models = True
+        self.logger.info("Ollama available models: %s", sorted(available_models))
+        if not self.pool.serves(self.model_name):
+            fallback = sorted(available_models)[0]
+            self.logger.warning("Model %s not found, using %s instead", self.model_name, fallback)
+            self.model_name = fallback
 
-        try:
-            response = self.session.get(
-                f"{self.current_endpoint}/api/tags",
-                timeout=min(settings.ollama_timeout_seconds, 10),
-            )
-            if response.status_code == 200:
-                available_models = [model["name"] for model in response.json().get("models", [])]
-                self.logger.info("Ollama available models: %s", available_models)
-                if self.model_name not in available_models and available_models:
-                    self.logger.warning(
-                        "Model %s not found, using %s instead",
-                        self.model_name,
-                        available_models[0],
-                    )
-                    self.model_name = available_models[0]
-            else:
-                self.logger.warning("Ollama tags endpoint returned %s", response.status_code)
-        except Exception as e:
-            self.logger.warning("Ollama healthcheck failed: %s", e)
-    
-    def _call_ollama(self, prompt: str, max_tokens: int = 10) -> str:
-        """Send a request to Ollama server and get response"""
+    def _call_ollama(
+        self,
+        prompt: str,
+        max_tokens: int = 10,
+        json_list: bool = False,
+        on_item: Optional[Callable[[Dict[str, Any]], None]] = None,
+        use_cache: bool = True,
+    ) -> str:
+        """
+        Send a request to Ollama server and get response.
+
+        Identical in-flight requests (model, prompt, options) share one call,
+        and valid responses (non-empty; a complete JSON list for
+        ``json_list``) are served from the persistent response cache
+        afterwards. ``use_cache=False`` skips the cache lookup, e.g. when
+        retrying after an unusable answer.
+
+        ``json_list`` (implied by ``on_item``) marks prompts answered with a
+        JSON list: the format is requested from Ollama and, with
+        ``llm_stream``, the list is parsed as tokens arrive, each completed
+        object is passed to ``on_item`` and generation stops once the list
+        closes. Cached and shared responses are replayed to ``on_item``; an
+        attempt that fails mid-stream may have delivered items before its
+        retry delivers them again.
+        """
+        json_list = json_list or on_item is not None
         self._maybe_check_models()
-        if self._cooldown_until and datetime.utcnow() < self._cooldown_until:
-            self.logger.warning("LLM cooldown active until %s", self._cooldown_until.isoformat())
-            return "unclassified"
-
-        with self._queue_lock:
-            if self._inflight >= settings.llm_max_queue:
-                self.logger.warning("LLM queue full")
-                return "unclassified"
-            self._inflight += 1
-
-        acquired = self._semaphore.acquire(timeout=1)
-        if not acquired:
-            with self._queue_lock:
-                self._inflight -= 1
-            self.logger.warning("LLM concurrency limit reached")
-            return "unclassified"
+        options = {
+            "num_predict": max_tokens,
+            "temperature": settings.ollama_temperature,
+            "top_p": settings.ollama_top_p,
+            "num_ctx": settings.ollama_num_ctx,
+        }
+        request_format = _LIST_FORMAT if json_list and self._json_format else None
+        stream = json_list and settings.llm_stream
+        key = request_key(
+            self.model_name, prompt, dict(options, format=request_format) if request_format else options
+        )
+        cacheable = llm_response_cache.cacheable(options)
+        if cacheable and use_cache:
+            try:
+                cached = llm_response_cache.get(key)
+            except Exception as e:
+                self.logger.warning("LLM response cache read failed: %s", e)
+                cached = None
+            if cached is not None:
+                with self._metrics_lock:
+                    self._metrics["cache_hits"] += 1
+                _replay(cached, on_item)
+                return cached
 
-        try:
+        result, shared = self._single_flight.do(
+            key, lambda: self._generate(prompt, options, request_format, stream, on_item)
+        )
+        if shared or not stream:
+            _replay(result, on_item)
+        if shared:
+            with self._metrics_lock:
+                self._metrics["coalesced"] += 1
+        elif cacheable and _valid_response(result, json_list):
+            try:
+                llm_response_cache.set(key, result)
+            except Exception as e:
+                self.logger.warning("LLM response cache write failed: %s", e)
+        return result
+
+    def _generate(
+        self,
+        prompt: str,
+        options: Dict[str, Any],
+        request_format: Optional[Dict[str, Any]] = None,
+        stream: bool = False,
+        on_item: Optional[Callable[[Dict[str, Any]], None]] = None,
+    ) -> str:
+        """
+        One Ollama generation with retries, admitted by the priority scheduler.
+
+        Each attempt goes to the least loaded healthy endpoint serving the
+        model, so a retry can land on another endpoint. Raises
+        ``LLMBusyError`` when no slot frees up before the caller's deadline
+        and ``LLMUnavailableError`` when every endpoint is cooling down or
+        all retries failed.
+        """
+        with self.scheduler.slot():
             request_data = {
                 "model": self.model_name,
                 "prompt": prompt,
-                "stream": False,
-                "options": {
-                    "num_predict": max_tokens,
-                    "temperature": settings.ollama_temperature,
-                    "top_p": settings.ollama_top_p,
-                    "num_ctx": 2048,
-                }
+                "stream": stream,
+                "options": options,
             }
-            
+            if request_format:
+                request_data["format"] = request_format
+
             for attempt in range(settings.ollama_max_retries + 1):
+                endpoint = self.pool.acquire(self.model_name)
+                ok = False
                 try:
                     with self._metrics_lock:
                         self._metrics["calls"] += 1
-                    self.logger.info("Calling Ollama with model %s (attempt %s)", self.model_name, attempt + 1)
-                    response = self.session.post(
-                        f"{self.current_endpoint}/api/generate",
+                    self.logger.info(
+                        "Calling Ollama %s with model %s (attempt %s)", endpoint.url, self.model_name, attempt + 1
+                    )
+                    if stream:
+                        result = self._stream_generate(endpoint.url, request_data, on_item)
+                        ok = True
+                        return result
+                    response = self.http.post(
+                        f"{endpoint.url}/api/generate",
                         json=request_data,
                         timeout=(
                             settings.ollama_connect_timeout_seconds,
@@ -102,34 +176,85 @@ class LLMService:
                         ),
                     )
 
+                    if response.status_code == 400 and self._drop_format(request_data):
+                        ok = True
+                        continue
                     if response.status_code == 200:
                         response_data = response.json()
                         result = response_data.get("response", "").strip()
                         self.logger.info("Received Ollama response")
-                        self._failure_count = 0
+                        ok = True
                         return result
 
-                    self.logger.warning("Ollama API error: status %s", response.status_code)
-                except requests.exceptions.Timeout:
-                    self.logger.warning("Ollama request timed out")
+                    self.logger.warning("Ollama API error on %s: status %s", endpoint.url, response.status_code)
+                except httpx.HTTPStatusError as e:
+                    if e.response.status_code == 400 and self._drop_format(request_data):
+                        ok = True
+                        continue
+                    self.logger.warning("Ollama API error on %s: status %s", endpoint.url, e.response.status_code)
+                except httpx.TimeoutException:
+                    self.logger.warning("Ollama request to %s timed out", endpoint.url)
                 except Exception as e:
-                    self.logger.error("Error calling Ollama: %s", e)
+                    self.logger.error("Error calling Ollama %s: %s", endpoint.url, e)
+                finally:
+                    self.pool.release(endpoint, ok)
 
-            self._failure_count += 1
-            with self._metrics_lock:
-                self._metrics["failures"] += 1
-            if self._failure_count >= settings.ollama_failure_threshold:
-                self._cooldown_until = datetime.utcnow() + timedelta(seconds=settings.ollama_cooldown_seconds)
-                self.logger.warning("LLM cooldown triggered for %s seconds", settings.ollama_cooldown_seconds)
-            return "unclassified"
-                
-        except Exception as e:
-            self.logger.error("Unexpected LLM error: %s", e)
-            return "unclassified"
+        with self._metrics_lock:
+            self._metrics["failures"] += 1
+        raise LLMUnavailableError("Ollama request failed after retries")
+
+    def _drop_format(self, request_data: Dict[str, Any]) -> bool:
+        """Stop requesting structured output after an Ollama without it rejects the request."""
+        if "format" not in request_data:
+            return False
+        self.logger.warning("Ollama rejected the JSON schema format; sending plain prompts")
+        self._json_format = False
+        del request_data["format"]
+        return True
+
+    def _stream_generate(
+        self,
+        url: str,
+        request_data: Dict[str, Any],
+        on_item: Optional[Callable[[Dict[str, Any]], None]],
+    ) -> str:
+        """
+        Stream one generation of a JSON list, stopping when the list closes.
+
+        Closing the stream drops the connection, which makes Ollama stop
+        generating instead of spending the rest of ``num_predict``.
+        """
+        parser = JSONListStream()
+        pieces = []
+        lines = self.http.stream_lines(
+            "POST",
+            f"{url}/api/generate",
+            json=request_data,
+            timeout=(settings.ollama_connect_timeout_seconds, settings.ollama_timeout_seconds),
+        )
+        try:
+            for line in lines:
+                if not line.strip():
+                    continue
+                chunk = json.loads(line)
+                if chunk.get("error"):
+                    raise RuntimeError(chunk["error"])
+                piece = chunk.get("response", "")
+                pieces.append(piece)
+                for item in parser.feed(piece):
+                    if on_item is not None and isinstance(item, dict):
+                        on_item(item)
+                if parser.closed:
+                    if not chunk.get("done"):
+                        with self._metrics_lock:
+                            self._metrics["early_stops"] += 1
+                    break
+                if chunk.get("done"):
+                    break
         finally:
-            self._semaphore.release()
-            with self._queue_lock:
-                self._inflight -= 1
+            lines.close()
+        self.logger.info("Received Ollama response")
+        return parser.text if parser.closed else "".join(pieces).strip()
     
     def extract_topic_from_note(self, note_content: str, note_id: str) -> Dict[str, Any]:
         """Extract a single topic from a note using Ollama"""
@@ -143,19 +268,14 @@ class LLMService:
         Return ONLY the topic word, nothing else.
         """
         
-        try:
-            response = self._call_ollama(prompt, max_tokens=5)
-            
-            # Clean up the response (sometimes AI adds extra words)
-            topic = response.split()[0] if response.split() else "unclassified"
-            topic = ''.join(char for char in topic if char.isalnum()).lower()
-            
-            self.logger.info("Extracted topic '%s' for note %s", topic, note_id)
-            return {"topic": topic, "note_id": note_id}
-            
-        except Exception as e:
-            self.logger.error("Error extracting topic for note %s: %s", note_id, e)
-            return {"topic": "unclassified", "note_id": note_id}
+        response = self._call_ollama(prompt, max_tokens=5)
+
+        # Clean up the response (sometimes AI adds extra words)
+        topic = response.split()[0] if response.split() else "unclassified"
+        topic = ''.join(char for char in topic if char.isalnum()).lower()
+
+        self.logger.info("Extracted topic '%s' for note %s", topic, note_id)
+        return {"topic": topic, "note_id": note_id}
     
     def process_notes(self, notes: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """Process notes and return consolidated topics"""
@@ -164,7 +284,11 @@ class LLMService:
         extracted_topics = []
         for i, note in enumerate(notes):
             self.logger.info("Processing note %s/%s: %s", i + 1, len(notes), note["id"])
-            result = self.extract_topic_from_note(note["content"], note["id"])
+            try:
+                result = self.extract_topic_from_note(note["content"], note["id"])
+            except LLMUnavailableError as e:
+                self.logger.warning("Skipping note %s: %s", note["id"], e)
+                continue
             extracted_topics.append(result)
         
         # Consolidate duplicate topics
@@ -186,69 +310,193 @@ class LLMService:
         self.logger.info("Consolidated into %s topics", len(result))
         return result
 
-    def extract_topics_batch(self, notes: List[Dict[str, str]]) -> List[Dict[str, Any]]:
+    def extract_topics_batch(
+        self,
+        notes: List[Dict[str, str]],
+        on_topic: Optional[Callable[[str, str], None]] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Topics for a batch of notes, one LLM call per attempt.
+
+        Entries parsed from partial or truncated output are kept; only the
+        note ids still missing are retried, up to ``llm_topic_retries`` times.
+        ``on_topic(note_id, topic)`` is called once per note as soon as its
+        entry is parsed, while the rest of the answer is still streaming.
+        """
         if not notes:
             return []
+        topics: Dict[str, str] = {}
+        remaining = list(notes)
+        for attempt in range(max(0, settings.llm_topic_retries) + 1):
+            if attempt:
+                self.logger.info("Retrying topic extraction for %s missing notes", len(remaining))
+            try:
+                # A retry must reach the model, not replay the answer that fell short.
+                topics.update(self._extract_topics_once(remaining, on_topic, use_cache=not attempt))
+            except LLMUnavailableError:
+                if not topics:
+                    raise
+                self.logger.warning("Keeping %s topics; %s notes left unclassified", len(topics), len(remaining))
+                break
+            remaining = [note for note in remaining if str(note["id"]) not in topics]
+            if not remaining:
+                break
+        return [{"topic": topic, "note_id": note_id} for note_id, topic in topics.items()]
+
+    def _extract_topics_once(
+        self,
+        notes: List[Dict[str, str]],
+        on_topic: Optional[Callable[[str, str], None]] = None,
+        use_cache: bool = True,
+    ) -> Dict[str, str]:
         with self._metrics_lock:
             self._metrics["batches"] += 1
         prompt = prompts.topic_extraction_prompt(notes)
-        response = self._call_ollama(prompt, max_tokens=settings.ollama_max_tokens)
-        try:
-            data = json.loads(response)
-        except Exception:
-            return []
-        results = []
-        for item in data:
+        max_tokens = max(settings.ollama_max_tokens, prompts.TOPIC_OUTPUT_TOKENS_PER_NOTE * len(notes))
+        wanted = {str(note["id"]) for note in notes}
+        topics: Dict[str, str] = {}
+
+        def collect(item: Dict[str, Any]) -> None:
             topic = str(item.get("topic", "")).strip().lower()
             note_id = str(item.get("id", "")).strip()
-            if topic and note_id:
-                results.append({"topic": topic, "note_id": note_id})
-        return results
+            if topic and note_id in wanted and note_id not in topics:
+                topics[note_id] = topic
+                if on_topic is not None:
+                    on_topic(note_id, topic)
+
+        response = self._call_ollama(prompt, max_tokens=max_tokens, on_item=collect, use_cache=use_cache)
+        for item in _parse_json_objects(response):
+            collect(item)
+        return topics
+
+    def name_clusters(self, clusters: List[Dict[str, Any]]) -> Dict[str, str]:
+        """
+        Name all clusters in one call; returns cluster id -> topic.
+
+        An unparsable answer names nothing. ``LLMBusyError`` and
+        ``LLMUnavailableError`` reach the caller.
+        """
+        if not clusters:
+            return {}
+        with self._metrics_lock:
+            self._metrics["batches"] += 1
+        prompt = prompts.cluster_naming_prompt(clusters)
+        response = self._call_ollama(prompt, max_tokens=settings.ollama_max_tokens, json_list=True)
+        names = {}
+        for item in _parse_json_list(response):
+            topic = str(item.get("topic", "")).strip().lower()
+            cluster_id = str(item.get("id", "")).strip()
+            if topic and cluster_id:
+                names[cluster_id] = topic
+        return names
 
     def healthcheck(self) -> Dict[str, Any]:
-        try:
-            response = self.session.get(
-                f"{self.current_endpoint}/api/tags",
-                timeout=min(settings.ollama_timeout_seconds, 5),
-            )
-            ok = response.status_code == 200
-            return {"ok": ok, "status_code": response.status_code}
-        except Exception as e:
-            return {"ok": False, "error": str(e)}
-
-    def metrics(self) -> Dict[str, int]:
+        endpoints = []
+        for url in self.pool.urls():
+            try:
+                response = self.http.get(
+                    f"{url}/api/tags",
+                    timeout=min(settings.ollama_timeout_seconds, 5),
+                )
+                endpoints.append({"url": url, "ok": response.status_code == 200, "status_code": response.status_code})
+            except Exception as e:
+                endpoints.append({"url": url, "ok": False, "error": str(e)})
+        return {"ok": any(item["ok"] for item in endpoints), "endpoints": endpoints}
+
+    def metrics(self) -> Dict[str, Any]:
         with self._metrics_lock:
-            return dict(self._metrics)
+            metrics: Dict[str, Any] = dict(self._metrics)
+        metrics["scheduler"] = self.scheduler.status()
+        metrics["endpoints"] = self.pool.status()
+        return metrics
 
     def score_relationships_batch(self, pairs: List[Dict[str, str]]) -> List[Dict[str, Any]]:
+        """
+        Score topic pairs in one call; an unparsable answer scores nothing.
+
+        ``LLMBusyError`` and ``LLMUnavailableError`` reach the caller.
+        """
         if not pairs:
             return []
         with self._metrics_lock:
             self._metrics["batches"] += 1
         prompt = prompts.relationship_prompt(pairs)
-        response = self._call_ollama(prompt, max_tokens=settings.ollama_max_tokens)
-        try:
-            data = json.loads(response)
-        except Exception:
-            return []
+        response = self._call_ollama(prompt, max_tokens=settings.ollama_max_tokens, json_list=True)
         results = []
-        for item in data:
+        for item in _parse_json_list(response):
             a = str(item.get("a", "")).strip()
             b = str(item.get("b", "")).strip()
             score = item.get("score")
             try:
                 score_val = float(score)
-            except Exception:
+            except (ValueError, TypeError):
                 continue
             if a and b:
                 results.append({"a": a, "b": b, "score": max(0.0, min(1.0, score_val))})
         return results
 
     def set_endpoint(self, endpoint: str) -> None:
-        self.current_endpoint = endpoint
+        self.set_endpoints([endpoint])
+
+    def set_endpoints(self, endpoints: List[str]) -> None:
+        self.pool.set_endpoints(endpoints)
+        self.scheduler.resize(self.pool.capacity)
 
     def get_endpoint(self) -> str:
-        return self.current_endpoint
+        return self.pool.urls()[0]
+
+    def get_endpoints(self) -> List[str]:
+        return self.pool.urls()
+
+def _parse_json_list(response: str) -> List[Dict[str, Any]]:
+    """Objects of a JSON list response; anything else parses to no objects."""
+    try:
+        data = json.loads(response)
+    except (ValueError, TypeError):
+        return []
+    if not isinstance(data, list):
+        return []
+    return [item for item in data if isinstance(item, dict)]
+
+
+def _parse_json_objects(response: str) -> List[Dict[str, Any]]:
+    """
+    Objects from a JSON list response.
+
+    Truncated or otherwise invalid output falls back to the complete flat
+    ``{...}`` objects it contains, so one cut-off entry does not lose the rest.
+    """
+    try:
+        data = json.loads(response)
+    except Exception:
+        data = None
+    if isinstance(data, list):
+        return [item for item in data if isinstance(item, dict)]
+    items = []
+    for match in re.finditer(r"\{[^{}]*\}", response or ""):
+        try:
+            item = json.loads(match.group(0))
+        except Exception:
+            continue
+        if isinstance(item, dict):
+            items.append(item)
+    return items
+
+def _valid_response(response: str, json_list: bool) -> bool:
+    """Whether a response is worth caching: a complete JSON list, or any text."""
+    if not json_list:
+        return bool(response.strip())
+    try:
+        return isinstance(json.loads(response), list)
+    except ValueError:
+        return False
+
+def _replay(response: str, on_item: Optional[Callable[[Dict[str, Any]], None]]) -> None:
+    """Deliver the objects of a finished list response to a streaming caller."""
+    if on_item is None:
+        return
+    for item in _parse_json_objects(response):
+        on_item(item)
 
 # Create a singleton instance
 llm_service = LLMService()
@@ -283,15 +531,5 @@ def set_llm_model(model_name: str):
 
 def get_available_models() -> list:
     """Get list of available Ollama models"""
-    try:
-        response = llm_service.session.get(
-            f"{llm_service.ollama_url}/api/tags",
-            timeout=min(settings.ollama_timeout_seconds, 10),
-        )
-        if response.status_code == 200:
-            models_data = response.json()
-            return [model["name"] for model in models_data.get("models", [])]
-        else:
-            return ["llama3.1:8b"]
-    except:
-        return ["llama3.1:8b"]
+    models = llm_service.pool.refresh_models(llm_service.http, force=True)
+    return sorted(models) if models else ["llama3.1:8b"]
@@ -0,0 +1,199 @@
+from __future__ import annotations
+
+import logging
+import threading
+from typing import Any, Dict, List, Tuple
+
+import faiss
+import numpy as np
+
+from app.core.settings import settings
+from app.db.database import SessionLocal
+from app.db.models import FileSystem
+from app.services.graph_store import graph_etag, graph_store
+from app.services.graph_tenants import owner_clause, scoped_key
+from app.services.vector_index_faiss import current_index
+
+logger = logging.getLogger(__name__)
+
+# Store key of the note-level similarity graph
+NOTE_GRAPH_KEY = "notes"
+_SEARCH_BATCH = 4096
+_build_lock = threading.Lock()
+_update_lock = threading.Lock()
+
+
+def _search_index(vectors: np.ndarray) -> faiss.Index:
+    """
+    Index used for the all-notes batch search.
+
+    Exact inner product for small corpora; above ``kg_note_ivf_threshold``
+    a temporary IVF index keeps the batch kNN sub-quadratic.
+    """
+    count, dim = vectors.shape
+    if count <= max(1, settings.kg_note_ivf_threshold):
+        index = faiss.IndexFlatIP(dim)
+        index.add(vectors)
+        return index
+    nlist = max(1, int(np.sqrt(count)))
+    quantizer = faiss.IndexFlatIP(dim)
+    index = faiss.IndexIVFFlat(quantizer, dim, nlist, faiss.METRIC_INNER_PRODUCT)
+    # A strided sample is enough to place the coarse centroids.
+    stride = max(1, count // (nlist * 40))
+    index.train(np.ascontiguousarray(vectors[::stride]))
+    index.add(vectors)
+    index.nprobe = 8
+    return index
+
+
+def knn_edges(
+    ids: np.ndarray,
+    vectors: np.ndarray,
+    top_k: int,
+    min_score: float,
+) -> List[Tuple[int, int, float]]:
+    """Undirected top-k neighbour edges for every vector, searched in batches."""
+    if len(ids) < 2:
+        return []
+    vectors = np.ascontiguousarray(vectors, dtype="float32")
+    index = _search_index(vectors)
+    k = min(top_k + 1, len(ids))
+    pair_a: List[np.ndarray] = []
+    pair_b: List[np.ndarray] = []
+    pair_scores: List[np.ndarray] = []
+    for start in range(0, len(ids), _SEARCH_BATCH):
+        batch = vectors[start : start + _SEARCH_BATCH]
+        scores, positions = index.search(batch, k)
+        rows = np.repeat(np.arange(start, start + len(batch)), k)
+        cols = positions.reshape(-1)
+        scores = scores.reshape(-1)
+        keep = (cols >= 0) & (cols != rows) & (scores >= min_score)
+        rows, cols, scores = rows[keep], cols[keep], scores[keep]
+        pair_a.append(np.minimum(rows, cols))
+        pair_b.append(np.maximum(rows, cols))
+        pair_scores.append(scores)
+    a = np.concatenate(pair_a).astype("int64")
+    b = np.concatenate(pair_b).astype("int64")
+    scores = np.concatenate(pair_scores)
+    if a.size == 0:
+        return []
+    _, unique = np.unique(a * len(ids) + b, return_index=True)
+    scores = np.clip(scores[unique], 0.0, 1.0)
+    return list(zip(ids[a[unique]].tolist(), ids[b[unique]].tolist(), scores.tolist()))
+
+
+def _note_names(owner_id: str | None = None) -> Dict[int, str]:
+    db = SessionLocal()
+    try:
+        rows = (
+            db.query(FileSystem.id, FileSystem.name)
+            .filter(FileSystem.type == "file")
+            .filter(FileSystem.deleted_at.is_(None))
+            .filter(owner_clause(owner_id))
+            .all()
+        )
+        return {row[0]: row[1] for row in rows}
+    finally:
+        db.close()
+
+
+def build_note_graph(owner_id: str | None = None) -> Dict[str, Any]:
+    """Note-level graph of one owner: each note links to its top-k semantic neighbours."""
+    index = current_index()
+    if index is None:
+        return {"nodes": [], "links": []}
+    ids, vectors = index.snapshot()
+    names = _note_names(owner_id)
+    live = np.asarray([note_id in names for note_id in ids.tolist()], dtype=bool)
+    ids, vectors = ids[live], vectors[live]
+    edges = knn_edges(ids, vectors, settings.kg_note_neighbors, settings.kg_note_min_score)
+    logger.info("Built note graph with %s notes and %s links", len(ids), len(edges))
+    return {
+        "nodes": [{"id": note_id, "label": names[note_id]} for note_id in ids.tolist()],
+        "links": [{"source": a, "target": b, "strength": score} for a, b, score in edges],
+    }
+
+
+def refresh_note_graph(fingerprint: str | None = None, owner_id: str | None = None) -> Dict[str, Any]:
+    """Rebuild an owner's note graph and publish it to the shared graph store."""
+    with _build_lock:
+        graph = build_note_graph(owner_id)
+        graph_store.put(
+            scoped_key(NOTE_GRAPH_KEY, owner_id), graph, fingerprint=fingerprint, etag=graph_etag(graph)
+        )
+        return graph
+
+
+def start_note_graph_build(owner_id: str | None = None) -> bool:
+    """Build the note graph in the background unless a build is running."""
+    if _build_lock.locked():
+        return False
+
+    def _run():
+        try:
+            refresh_note_graph(owner_id=owner_id)
+        except Exception as e:
+            logger.warning("Note graph build failed: %s", e)
+
+    threading.Thread(target=_run, daemon=True).start()
+    return True
+
+
+def _note_neighbors(note_id: int, known: set) -> List[Tuple[int, float]]:
+    """Nearest neighbours among ``known`` notes (the index spans every owner, so over-fetch)."""
+    index = current_index()
+    if index is None:
+        return []
+    vector = index.vector(note_id)
+    if vector is None:
+        return []
+    neighbors = [
+        (neighbor, score)
+        for neighbor, score in index.query(vector.tolist(), settings.kg_note_neighbors * 4 + 1)
+        if neighbor != note_id and neighbor in known and score >= settings.kg_note_min_score
+    ]
+    return neighbors[: settings.kg_note_neighbors]
+
+
+def _note_name(note_id: int) -> str | None:
+    db = SessionLocal()
+    try:
+        row = (
+            db.query(FileSystem.name)
+            .filter(FileSystem.id == note_id)
+            .filter(FileSystem.deleted_at.is_(None))
+            .first()
+        )
+        return row[0] if row else None
+    finally:
+        db.close()
+
+
+def apply_note_graph_change(note_id: int, deleted: bool = False, owner_id: str | None = None) -> bool:
+    """
+    Replace one note's edges in the stored note graph.
+
+    The note's own neighbour list is re-queried from the vector index; other
+    notes keep their edges until the next full rebuild. Returns False when
+    there is no stored note graph to patch.
+    """
+    key = scoped_key(NOTE_GRAPH_KEY, owner_id)
+    with _update_lock:
+        entry = graph_store.get(key)
+        if entry is None:
+            return False
+        nodes = [node for node in entry.graph.get("nodes", []) if node["id"] != note_id]
+        links = [
+            link
+            for link in entry.graph.get("links", [])
+            if link["source"] != note_id and link["target"] != note_id
+        ]
+        name = None if deleted else _note_name(note_id)
+        if name is not None:
+            known = {node["id"] for node in nodes}
+            nodes.append({"id": note_id, "label": name})
+            for neighbor, score in _note_neighbors(note_id, known):
+                links.append({"source": note_id, "target": neighbor, "strength": min(1.0, score)})
+        graph = {"nodes": nodes, "links": links}
+        graph_store.put(key, graph, fingerprint=None, etag=graph_etag(graph))
+        return True
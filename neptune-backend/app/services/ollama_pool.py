@@ -0,0 +1,235 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set
+
+from app.core.settings import settings
+from app.services.llm_scheduler import LLMBusyError, LLMUnavailableError, _deadline_seconds, current_priority
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+@dataclass(eq=False)
+class Endpoint:
+    url: str
+    max_concurrency: int = 0
+    outstanding: int = 0
+    failures: int = 0
+    state: str = CLOSED
+    open_until: float = 0.0
+    probing: bool = False
+    models: Optional[Set[str]] = None
+    models_checked_at: float = 0.0
+    requests: int = 0
+    errors: int = 0
+
+    @property
+    def limit(self) -> int:
+        """Concurrent requests allowed; ``LLM_MAX_CONCURRENCY`` unless set per endpoint."""
+        return max(1, self.max_concurrency or settings.llm_max_concurrency)
+
+    def serves(self, model: Optional[str]) -> bool:
+        """Whether ``/api/tags`` lists ``model``; unknown until the tags were read."""
+        if not model or self.models is None:
+            return True
+        if model in self.models:
+            return True
+        return ":" not in model and f"{model}:latest" in self.models
+
+
+def parse_endpoints(value: Iterable[str] | str) -> List[Endpoint]:
+    """
+    Endpoints from ``OLLAMA_URLS``-style entries.
+
+    Entries are comma separated; ``http://gpu1:11434|8`` caps that endpoint
+    at 8 concurrent requests.
+    """
+    entries = value.split(",") if isinstance(value, str) else list(value)
+    endpoints = []
+    for entry in entries:
+        entry = entry.strip()
+        if not entry:
+            continue
+        url, _, limit = entry.partition("|")
+        endpoints.append(Endpoint(url=url.strip().rstrip("/"), max_concurrency=int(limit) if limit.strip() else 0))
+    return endpoints
+
+
+class OllamaPool:
+    """
+    Routes Ollama requests across several endpoints.
+
+    Each request goes to the endpoint with the fewest outstanding requests
+    relative to its concurrency limit, among the endpoints whose
+    ``/api/tags`` list the requested model. Every endpoint has its own
+    circuit breaker: ``ollama_failure_threshold`` consecutive failures open
+    it for ``ollama_cooldown_seconds``, after which a single half-open probe
+    decides whether it closes again. ``LLMUnavailableError`` is raised only
+    when no endpoint can take the model at all.
+    """
+
+    def __init__(self, urls: Iterable[str] | str | None = None) -> None:
+        self._cond = threading.Condition()
+        self.endpoints = parse_endpoints(urls if urls is not None else settings.ollama_urls or settings.ollama_url)
+
+    @property
+    def capacity(self) -> int:
+        with self._cond:
+            return sum(endpoint.limit for endpoint in self.endpoints)
+
+    def urls(self) -> List[str]:
+        with self._cond:
+            return [endpoint.url for endpoint in self.endpoints]
+
+    def set_endpoints(self, urls: Iterable[str] | str) -> None:
+        """Replace the endpoint list, keeping state for URLs already known."""
+        known = {endpoint.url: endpoint for endpoint in self.endpoints}
+        endpoints = []
+        for endpoint in parse_endpoints(urls):
+            existing = known.get(endpoint.url)
+            if existing is not None:
+                existing.max_concurrency = endpoint.max_concurrency
+                endpoint = existing
+            endpoints.append(endpoint)
+        if not endpoints:
+            raise ValueError("At least one Ollama endpoint is required")
+        with self._cond:
+            self.endpoints = endpoints
+            self._cond.notify_all()
+
+    def _usable(self, endpoint: Endpoint, now: float) -> bool:
+        if endpoint.state == CLOSED:
+            return True
+        if endpoint.probing:
+            return False
+        return endpoint.state == HALF_OPEN or now >= endpoint.open_until
+
+    def acquire(self, model: Optional[str] = None, timeout: Optional[float] = None) -> Endpoint:
+        """
+        Reserve the least loaded endpoint serving ``model``.
+
+        Waits while every candidate is at its limit, up to the caller's
+        priority deadline (``LLMBusyError``). Pair with ``release``.
+        """
+        timeout = _deadline_seconds(current_priority()[0]) if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                candidates = [e for e in self.endpoints if e.serves(model) and self._usable(e, now)]
+                if not candidates:
+                    if not any(e.serves(model) for e in self.endpoints):
+                        raise LLMUnavailableError(f"No Ollama endpoint serves model {model}")
+                    raise LLMUnavailableError("All Ollama endpoints are cooling down")
+                free = [e for e in candidates if e.outstanding < e.limit]
+                if free:
+                    endpoint = min(free, key=lambda e: (e.outstanding / e.limit, e.outstanding))
+                    if endpoint.state != CLOSED:
+                        endpoint.state = HALF_OPEN
+                        endpoint.probing = True
+                    endpoint.outstanding += 1
+                    return endpoint
+                remaining = deadline - now
+                if remaining <= 0:
+                    raise LLMBusyError(f"No Ollama endpoint free within {timeout:.0f}s")
+                self._cond.wait(remaining)
+
+    def release(self, endpoint: Endpoint, ok: bool) -> None:
+        """Return ``endpoint`` and record the outcome for its circuit breaker."""
+        with self._cond:
+            endpoint.outstanding -= 1
+            endpoint.requests += 1
+            was_probe = endpoint.probing
+            endpoint.probing = False
+            if ok:
+                endpoint.failures = 0
+                endpoint.state = CLOSED
+            else:
+                endpoint.errors += 1
+                endpoint.failures += 1
+                if was_probe or endpoint.failures >= settings.ollama_failure_threshold:
+                    endpoint.state = OPEN
+                    endpoint.open_until = time.monotonic() + settings.ollama_cooldown_seconds
+                    logger.warning(
+                        "Ollama endpoint %s unavailable for %s seconds",
+                        endpoint.url,
+                        settings.ollama_cooldown_seconds,
+                    )
+            self._cond.notify_all()
+
+    @contextmanager
+    def endpoint(self, model: Optional[str] = None) -> Iterator[Endpoint]:
+        """``acquire``/``release`` around a block; an exception counts as a failure."""
+        endpoint = self.acquire(model)
+        ok = False
+        try:
+            yield endpoint
+            ok = True
+        finally:
+            self.release(endpoint, ok)
+
+    def refresh_models(self, http: Any, force: bool = False) -> Set[str]:
+        """
+        Re-read ``/api/tags`` on endpoints whose list is older than
+        ``ollama_models_ttl_seconds`` and return every model seen.
+
+        A failed read keeps the previous list; endpoints that never answered
+        are assumed to serve any model.
+        """
+        now = time.monotonic()
+        with self._cond:
+            stale = [
+                e
+                for e in self.endpoints
+                if force or not e.models_checked_at or now - e.models_checked_at >= settings.ollama_models_ttl_seconds
+            ]
+            for endpoint in stale:
+                # Claim the refresh so concurrent callers do not repeat it.
+                endpoint.models_checked_at = now
+        for endpoint in stale:
+            try:
+                response = http.get(f"{endpoint.url}/api/tags", timeout=min(settings.ollama_timeout_seconds, 10))
+                if response.status_code != 200:
+                    logger.warning("Ollama tags on %s returned %s", endpoint.url, response.status_code)
+                    continue
+                models = {model["name"] for model in response.json().get("models", [])}
+            except Exception as e:
+                logger.warning("Ollama tags on %s failed: %s", endpoint.url, e)
+                continue
+            with self._cond:
+                endpoint.models = models
+                self._cond.notify_all()
+        with self._cond:
+            return set().union(*(e.models or set() for e in self.endpoints))
+
+    def serves(self, model: str) -> bool:
+        with self._cond:
+            return any(endpoint.serves(model) for endpoint in self.endpoints)
+
+    def status(self) -> List[Dict[str, Any]]:
+        now = time.monotonic()
+        with self._cond:
+            return [
+                {
+                    "url": e.url,
+                    "state": e.state,
+                    "outstanding": e.outstanding,
+                    "limit": e.limit,
+                    "requests": e.requests,
+                    "errors": e.errors,
+                    "retry_in": round(max(0.0, e.open_until - now), 1) if e.state == OPEN else 0.0,
+                    "models": sorted(e.models) if e.models is not None else None,
+                }
+                for e in self.endpoints
+            ]
+
+
+ollama_pool = OllamaPool()
@@ -1,16 +1,72 @@
-from typing import List, Dict
+import math
+from typing import List, Dict, Optional
+
+from app.core.settings import settings
+
+TOPIC_PROMPT_HEADER = (
+    "For each note below, generate a single general topic word that best summarizes it.\n"
+    "Return JSON as a list of objects: [{\"id\": \"<note_id>\", \"topic\": \"<topic>\"}].\n"
+    "Use lowercase topics and one word per topic.\n\n"
+)
+# Tokens of JSON output per note ({"id": "123", "topic": "algebra"},).
+TOPIC_OUTPUT_TOKENS_PER_NOTE = 16
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count from character length (``LLM_CHARS_PER_TOKEN``)."""
+    if not text:
+        return 0
+    return max(1, math.ceil(len(text) / max(settings.llm_chars_per_token, 0.1)))
+
+
+def _topic_entry(note: Dict[str, str]) -> str:
+    return f"NoteID: {note['id']}\nContent: {note['content'][:settings.llm_topic_note_chars]}"
+
+
+def topic_note_tokens(note: Dict[str, str]) -> int:
+    """Prompt plus expected output tokens one note adds to a topic batch."""
+    return estimate_tokens(_topic_entry(note)) + 2 + TOPIC_OUTPUT_TOKENS_PER_NOTE
+
+
+def topic_token_budget() -> int:
+    """Tokens available for notes in one topic prompt."""
+    if settings.llm_topic_token_budget > 0:
+        return settings.llm_topic_token_budget
+    return max(1, settings.ollama_num_ctx - estimate_tokens(TOPIC_PROMPT_HEADER))
+
+
+def pack_topic_batches(
+    notes: List[Dict[str, str]],
+    token_budget: Optional[int] = None,
+    max_notes: Optional[int] = None,
+) -> List[List[Dict[str, str]]]:
+    """
+    Split notes into batches that fit the model context window.
+
+    Batches are filled in order until the next note would exceed the token
+    budget or ``max_notes`` (``LLM_TOPIC_BATCH_SIZE``). A note larger than
+    the budget goes into a batch of its own.
+    """
+    token_budget = token_budget or topic_token_budget()
+    max_notes = max(1, max_notes or settings.llm_topic_batch_size)
+    batches: List[List[Dict[str, str]]] = []
+    current: List[Dict[str, str]] = []
+    used = 0
+    for note in notes:
+        cost = topic_note_tokens(note)
+        if current and (used + cost > token_budget or len(current) >= max_notes):
+            batches.append(current)
+            current, used = [], 0
+        current.append(note)
+        used += cost
+    if current:
+        batches.append(current)
+    return batches
 
 
 def topic_extraction_prompt(notes: List[Dict[str, str]]) -> str:
-    joined = "\n\n".join(
-        f"NoteID: {note['id']}\nContent: {note['content'][:2000]}" for note in notes
-    )
-    return (
-        "For each note below, generate a single general topic word that best summarizes it.\n"
-        "Return JSON as a list of objects: [{\"id\": \"<note_id>\", \"topic\": \"<topic>\"}].\n"
-        "Use lowercase topics and one word per topic.\n\n"
-        f"{joined}"
-    )
+    joined = "\n\n".join(_topic_entry(note) for note in notes)
+    return f"{TOPIC_PROMPT_HEADER}{joined}"
 
 
 def relationship_prompt(pairs: List[Dict[str, str]]) -> str:
@@ -23,3 +79,18 @@ def relationship_prompt(pairs: List[Dict[str, str]]) -> str:
         "Pairs:\n"
         f"{joined}"
     )
+
+
+def cluster_naming_prompt(clusters: List[Dict[str, object]]) -> str:
+    joined = "\n\n".join(
+        f"ClusterID: {cluster['id']}\n"
+        f"Keywords: {', '.join(cluster['keywords'])}\n"
+        f"Note titles: {'; '.join(cluster['titles'])}"
+        for cluster in clusters
+    )
+    return (
+        "Each cluster below groups related notes. Give every cluster a short general topic name.\n"
+        "Return JSON as a list of objects: [{\"id\": \"<cluster_id>\", \"topic\": \"<topic>\"}].\n"
+        "Use lowercase topics of one or two words and give different clusters different names.\n\n"
+        f"{joined}"
+    )
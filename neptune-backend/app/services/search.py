@@ -8,6 +8,7 @@ from sqlalchemy.orm import Session
 
 from app.core.settings import settings
 from app.services.embeddings import embedding_service
+from app.services.topic_assignments import topic_note_ids_query
 from app.services.vector_index_faiss import load_index
 from app.db.models import FileSystem
 
@@ -114,12 +115,26 @@ def _preview(text_value: str | None, limit: int = 200) -> str:
     return text_value[:limit].rsplit(" ", 1)[0] + "…"
 
 
+def _scoped(db: Session, query_obj, owner_id: Optional[str], topic: Optional[str]):
+    if owner_id:
+        query_obj = query_obj.filter(FileSystem.owner_id == owner_id)
+    if topic:
+        query_obj = query_obj.filter(FileSystem.id.in_(topic_note_ids_query(db, topic)))
+    return query_obj
+
+
 def search_notes(
     db: Session,
     query: str,
     owner_id: Optional[str] = None,
     limit: Optional[int] = None,
+    topic: Optional[str] = None,
 ) -> list[SearchResult]:
+    """
+    Search notes by semantic similarity, FTS or substring match.
+
+    ``topic`` restricts results to notes with that persisted topic assignment.
+    """
     trimmed = (query or "").strip()
     if len(trimmed) < settings.search_min_query_len:
         return []
@@ -138,8 +153,7 @@ def search_notes(
                     .filter(FileSystem.id.in_(file_ids))
                     .filter(FileSystem.deleted_at.is_(None))
                 )
-                if owner_id:
-                    query_obj = query_obj.filter(FileSystem.owner_id == owner_id)
+                query_obj = _scoped(db, query_obj, owner_id, topic)
                 results = []
                 for item in query_obj.all():
                     results.append(
@@ -177,8 +191,7 @@ def search_notes(
             .filter(FileSystem.id.in_(file_ids))
             .filter(FileSystem.deleted_at.is_(None))
         )
-        if owner_id:
-            query_obj = query_obj.filter(FileSystem.owner_id == owner_id)
+        query_obj = _scoped(db, query_obj, owner_id, topic)
         results = []
         for item in query_obj.all():
             results.append(
@@ -199,11 +212,9 @@ def search_notes(
         .filter(FileSystem.type == "file")
         .filter(FileSystem.deleted_at.is_(None))
         .filter((FileSystem.name.ilike(ilike)) | (FileSystem.content.ilike(ilike)))
-        .order_by(FileSystem.updated_at.desc())
-        .limit(limit)
     )
-    if owner_id:
-        query_obj = query_obj.filter(FileSystem.owner_id == owner_id)
+    query_obj = _scoped(db, query_obj, owner_id, topic)
+    query_obj = query_obj.order_by(FileSystem.updated_at.desc()).limit(limit)
     return [
         SearchResult(
             id=item.id,
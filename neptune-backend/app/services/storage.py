@@ -74,5 +74,10 @@ class StorageClient:
         response = self.client.get_object(Bucket=self.bucket, Key=key)
         return response["Body"].read()
 
+    def delete_object(self, key: str) -> None:
+        if not self.enabled or not self.client:
+            raise RuntimeError("Storage client not configured")
+        self.client.delete_object(Bucket=self.bucket, Key=key)
+
 
 storage_client = StorageClient()
@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import logging
+from typing import Dict, Iterable, Optional, Sequence, Tuple
+
+from sqlalchemy import func, inspect, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.core.settings import settings
+from app.db.models import FileSystem, NoteTopic, Topic
+
+logger = logging.getLogger(__name__)
+
+
+def ensure_topic_schema(engine) -> None:
+    """
+    Recreate ``note_topics`` if it still has the unused pre-assignment layout.
+
+    The old table pointed at ``notes.id`` and was never written, so it is
+    only replaced while empty.
+    """
+    inspector = inspect(engine)
+    if "note_topics" not in inspector.get_table_names():
+        return
+    columns = {column["name"] for column in inspector.get_columns("note_topics")}
+    if {"file_id", "prompt_version"} <= columns:
+        return
+    with engine.begin() as connection:
+        count = connection.execute(text("SELECT COUNT(*) FROM note_topics")).scalar()
+        if count:
+            logger.warning("note_topics has %s rows in the old layout; topic assignments are not persisted", count)
+            return
+        connection.execute(text("DROP TABLE note_topics"))
+        NoteTopic.__table__.create(connection)
+    logger.info("Recreated note_topics for persisted topic assignments")
+
+
+def _topic_ids(db: Session, names: Iterable[str]) -> Dict[str, int]:
+    """Ids of ``names`` in ``topics``, inserting missing names."""
+    wanted = set(names)
+    if not wanted:
+        return {}
+    ids = {name: topic_id for topic_id, name in db.query(Topic.id, Topic.name).filter(Topic.name.in_(wanted))}
+    for name in wanted - ids.keys():
+        try:
+            with db.begin_nested():
+                topic = Topic(name=name)
+                db.add(topic)
+                db.flush()
+            ids[name] = topic.id
+        except IntegrityError:
+            # Another writer created it first.
+            ids[name] = db.query(Topic.id).filter(Topic.name == name).scalar()
+    return ids
+
+
+def record_assignments(
+    db: Session,
+    assignments: Sequence[Tuple[int, str, Optional[str]]],
+    prompt_version: Optional[str] = None,
+) -> int:
+    """
+    Upsert ``(note_id, topic, checksum)`` assignments for a prompt version.
+
+    One note has at most one topic per prompt version. The caller commits.
+    """
+    if not assignments:
+        return 0
+    prompt_version = prompt_version or settings.llm_prompt_version
+    latest = {note_id: (topic, checksum) for note_id, topic, checksum in assignments}
+    topic_ids = _topic_ids(db, (topic for topic, _ in latest.values()))
+    existing = {
+        row.file_id: row
+        for row in db.query(NoteTopic)
+        .filter(NoteTopic.file_id.in_(list(latest)))
+        .filter(NoteTopic.prompt_version == prompt_version)
+    }
+    for note_id, (topic, checksum) in latest.items():
+        row = existing.get(note_id)
+        if row is None:
+            db.add(
+                NoteTopic(
+                    file_id=note_id,
+                    topic_id=topic_ids[topic],
+                    content_checksum=checksum or "",
+                    prompt_version=prompt_version,
+                )
+            )
+        elif row.topic_id != topic_ids[topic] or row.content_checksum != (checksum or ""):
+            row.topic_id = topic_ids[topic]
+            row.content_checksum = checksum or ""
+    db.flush()
+    return len(latest)
+
+
+def remove_assignments(db: Session, note_id: int) -> None:
+    """Drop every assignment of a note (all prompt versions). The caller commits."""
+    db.query(NoteTopic).filter(NoteTopic.file_id == note_id).delete(synchronize_session=False)
+
+
+def stored_topics(
+    db: Session,
+    notes: Sequence[Tuple[int, Optional[str]]],
+    prompt_version: Optional[str] = None,
+) -> Dict[int, str]:
+    """Persisted topics for ``(note_id, checksum)`` pairs whose checksum still matches."""
+    if not notes:
+        return {}
+    checksums = {note_id: checksum or "" for note_id, checksum in notes}
+    rows = (
+        db.query(NoteTopic.file_id, NoteTopic.content_checksum, Topic.name)
+        .join(Topic, Topic.id == NoteTopic.topic_id)
+        .filter(NoteTopic.file_id.in_(list(checksums)))
+        .filter(NoteTopic.prompt_version == (prompt_version or settings.llm_prompt_version))
+    )
+    return {note_id: name for note_id, checksum, name in rows if checksums.get(note_id) == checksum}
+
+
+def topic_note_ids_query(db: Session, topic: str, prompt_version: Optional[str] = None):
+    """
+    Subquery of note ids assigned to ``topic`` (for filtering other queries).
+
+    Only assignments made for the note's current content count.
+    """
+    return (
+        db.query(NoteTopic.file_id)
+        .join(Topic, Topic.id == NoteTopic.topic_id)
+        .join(FileSystem, FileSystem.id == NoteTopic.file_id)
+        .filter(Topic.name == topic)
+        .filter(NoteTopic.prompt_version == (prompt_version or settings.llm_prompt_version))
+        .filter(func.coalesce(FileSystem.content_checksum, "") == NoteTopic.content_checksum)
+    )
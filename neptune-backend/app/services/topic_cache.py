@@ -1,9 +1,30 @@
 import json
+import logging
 import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
 from dataclasses import dataclass
-from typing import Dict, Optional
+from typing import Dict, List, Optional, Tuple
 from app.core.settings import settings
 
+logger = logging.getLogger(__name__)
+
+
+def _database_path() -> str:
+    """SQLite file next to ``kg_cache_path`` holding the topic and pair-score caches."""
+    base, ext = os.path.splitext(settings.kg_cache_path)
+    return f"{base if ext else settings.kg_cache_path}.topics.sqlite"
+
+
+def _open(path: str) -> sqlite3.Connection:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
 
 @dataclass
 class TopicCacheItem:
@@ -13,55 +34,283 @@ class TopicCacheItem:
 
 
 class TopicCache:
-    def __init__(self) -> None:
-        self.path = self._resolve_path()
-        self._data: Dict[str, TopicCacheItem] = {}
-        self._loaded = False
+    """
+    Per-note topics keyed by note id, checksum and prompt version.
 
-    def _resolve_path(self) -> str:
+    Entries live in a small SQLite table next to the graph cache (WAL mode, so
+    the backend and indexer can read and write it concurrently). Writes are
+    buffered and committed in one transaction per ``kg_topic_cache_batch``
+    entries or on ``flush()``; a bounded in-memory LRU serves repeated reads.
+    Entries not read or written recently are evicted once the table exceeds
+    ``kg_topic_cache_max_entries``, which is how entries of deleted notes
+    disappear.
+    """
+
+    def __init__(self, path: Optional[str] = None) -> None:
+        self.path = path or _database_path()
+        self.prompt_version = settings.llm_prompt_version
+        self._lock = threading.RLock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._memory: "OrderedDict[str, TopicCacheItem]" = OrderedDict()
+        self._pending: Dict[str, TopicCacheItem] = {}
+        self._touched: Dict[str, float] = {}
+
+    def _legacy_path(self) -> str:
         base, ext = os.path.splitext(settings.kg_cache_path)
         if ext:
-            return f"{base}.topics.{settings.llm_prompt_version}{ext}"
-        return f"{settings.kg_cache_path}.topics.{settings.llm_prompt_version}.json"
+            return f"{base}.topics.{self.prompt_version}{ext}"
+        return f"{settings.kg_cache_path}.topics.{self.prompt_version}.json"
 
-    def _load(self) -> None:
-        if self._loaded:
-            return
-        self._loaded = True
-        if not os.path.exists(self.path):
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is not None:
+            return self._conn
+        conn = _open(self.path)
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS topic_cache (
+                note_id TEXT NOT NULL,
+                prompt_version TEXT NOT NULL,
+                checksum TEXT NOT NULL,
+                topic TEXT NOT NULL,
+                used_at REAL NOT NULL,
+                PRIMARY KEY (note_id, prompt_version)
+            )
+            """
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_topic_cache_used ON topic_cache (used_at)")
+        self._conn = conn
+        self._import_legacy(conn)
+        return conn
+
+    def _import_legacy(self, conn: sqlite3.Connection) -> None:
+        """One-time import of the JSON file this cache used to be."""
+        legacy = self._legacy_path()
+        if not os.path.exists(legacy):
             return
         try:
-            with open(self.path, "r") as handle:
+            with open(legacy, "r") as handle:
                 raw = json.load(handle)
-            for note_id, item in raw.items():
-                self._data[note_id] = TopicCacheItem(
-                    note_id=note_id,
-                    checksum=item["checksum"],
-                    topic=item["topic"],
+            now = time.time()
+            with conn:
+                conn.execute("BEGIN IMMEDIATE")
+                conn.executemany(
+                    "INSERT OR IGNORE INTO topic_cache VALUES (?, ?, ?, ?, ?)",
+                    [
+                        (note_id, self.prompt_version, item["checksum"], item["topic"], now)
+                        for note_id, item in raw.items()
+                    ],
                 )
-        except Exception:
-            self._data = {}
+            os.replace(legacy, f"{legacy}.imported")
+        except Exception as e:
+            logger.warning("Topic cache import from %s failed: %s", legacy, e)
+
+    def _remember(self, item: TopicCacheItem) -> None:
+        self._memory[item.note_id] = item
+        self._memory.move_to_end(item.note_id)
+        while len(self._memory) > max(0, settings.kg_topic_cache_memory_entries):
+            self._memory.popitem(last=False)
 
     def get(self, note_id: str, checksum: str) -> Optional[str]:
-        self._load()
-        item = self._data.get(note_id)
-        if item and item.checksum == checksum:
+        with self._lock:
+            item = self._pending.get(note_id) or self._memory.get(note_id)
+            if item is None:
+                row = self._connect().execute(
+                    "SELECT checksum, topic FROM topic_cache WHERE note_id = ? AND prompt_version = ?",
+                    (note_id, self.prompt_version),
+                ).fetchone()
+                if row is None:
+                    return None
+                item = TopicCacheItem(note_id=note_id, checksum=row[0], topic=row[1])
+            self._remember(item)
+            if item.checksum != checksum:
+                return None
+            self._touched[note_id] = time.time()
             return item.topic
-        return None
 
     def set(self, note_id: str, checksum: str, topic: str) -> None:
-        self._load()
-        self._data[note_id] = TopicCacheItem(note_id=note_id, checksum=checksum, topic=topic)
+        with self._lock:
+            item = TopicCacheItem(note_id=note_id, checksum=checksum, topic=topic)
+            self._pending[note_id] = item
+            self._remember(item)
+            if len(self._pending) >= max(1, settings.kg_topic_cache_batch):
+                self.flush()
+
+    def forget(self, note_id: str) -> None:
+        """Drop a note's entry (all prompt versions), e.g. when the note is deleted."""
+        with self._lock:
+            self._pending.pop(note_id, None)
+            self._memory.pop(note_id, None)
+            self._touched.pop(note_id, None)
+            self._connect().execute("DELETE FROM topic_cache WHERE note_id = ?", (note_id,))
 
     def flush(self) -> None:
-        self._load()
-        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
-        payload = {
-            note_id: {"checksum": item.checksum, "topic": item.topic}
-            for note_id, item in self._data.items()
-        }
-        with open(self.path, "w") as handle:
-            json.dump(payload, handle)
+        """Commit buffered writes and read timestamps in one transaction, then evict."""
+        with self._lock:
+            if not self._pending and not self._touched:
+                return
+            now = time.time()
+            conn = self._connect()
+            with conn:
+                conn.execute("BEGIN IMMEDIATE")
+                conn.executemany(
+                    """
+                    INSERT INTO topic_cache (note_id, prompt_version, checksum, topic, used_at)
+                    VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT (note_id, prompt_version)
+                    DO UPDATE SET checksum = excluded.checksum, topic = excluded.topic, used_at = excluded.used_at
+                    """,
+                    [
+                        (item.note_id, self.prompt_version, item.checksum, item.topic, now)
+                        for item in self._pending.values()
+                    ],
+                )
+                conn.executemany(
+                    "UPDATE topic_cache SET used_at = ? WHERE note_id = ? AND prompt_version = ?",
+                    [
+                        (used_at, note_id, self.prompt_version)
+                        for note_id, used_at in self._touched.items()
+                        if note_id not in self._pending
+                    ],
+                )
+                self._evict(conn)
+            self._pending.clear()
+            self._touched.clear()
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        limit = settings.kg_topic_cache_max_entries
+        if limit <= 0:
+            return
+        excess = conn.execute("SELECT COUNT(*) FROM topic_cache").fetchone()[0] - limit
+        if excess > 0:
+            conn.execute(
+                """
+                DELETE FROM topic_cache WHERE rowid IN (
+                    SELECT rowid FROM topic_cache ORDER BY used_at LIMIT ?
+                )
+                """,
+                (excess,),
+            )
+
+    def __len__(self) -> int:
+        with self._lock:
+            self.flush()
+            return self._connect().execute("SELECT COUNT(*) FROM topic_cache").fetchone()[0]
+
+
+class PairScoreCache:
+    """
+    LLM relationship scores keyed by the unordered topic pair and prompt version.
+
+    Scores live in a ``pair_scores`` table of the topic-cache SQLite database.
+    ``set`` buffers under a lock and ``flush`` commits the buffer in one
+    transaction, so concurrent batches (and other processes) never overwrite
+    each other's scores.
+    """
+
+    def __init__(self, path: Optional[str] = None) -> None:
+        self.path = path or _database_path()
+        self.prompt_version = settings.llm_prompt_version
+        self._lock = threading.RLock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pending: Dict[Tuple[str, str], float] = {}
+
+    def _legacy_path(self) -> str:
+        base, ext = os.path.splitext(settings.kg_cache_path)
+        if ext:
+            return f"{base}.pairs.{self.prompt_version}{ext}"
+        return f"{settings.kg_cache_path}.pairs.{self.prompt_version}.json"
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is not None:
+            return self._conn
+        conn = _open(self.path)
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS pair_scores (
+                topic_a TEXT NOT NULL,
+                topic_b TEXT NOT NULL,
+                prompt_version TEXT NOT NULL,
+                score REAL NOT NULL,
+                PRIMARY KEY (topic_a, topic_b, prompt_version)
+            )
+            """
+        )
+        self._conn = conn
+        self._import_legacy(conn)
+        return conn
+
+    def _import_legacy(self, conn: sqlite3.Connection) -> None:
+        """One-time import of the JSON file this cache used to be."""
+        legacy = self._legacy_path()
+        if not os.path.exists(legacy):
+            return
+        try:
+            with open(legacy, "r") as handle:
+                raw = json.load(handle)
+            rows = []
+            for key, score in raw.items():
+                first, _, second = key.partition("\x1f")
+                rows.append((first, second, self.prompt_version, float(score)))
+            with conn:
+                conn.execute("BEGIN IMMEDIATE")
+                conn.executemany("INSERT OR IGNORE INTO pair_scores VALUES (?, ?, ?, ?)", rows)
+            os.replace(legacy, f"{legacy}.imported")
+        except Exception as e:
+            logger.warning("Pair score cache import from %s failed: %s", legacy, e)
+
+    @staticmethod
+    def _key(topic_a: str, topic_b: str) -> Tuple[str, str]:
+        first, second = sorted((topic_a, topic_b))
+        return first, second
+
+    def _lookup(self, key: Tuple[str, str]) -> Optional[float]:
+        if key in self._pending:
+            return self._pending[key]
+        row = self._connect().execute(
+            "SELECT score FROM pair_scores WHERE topic_a = ? AND topic_b = ? AND prompt_version = ?",
+            (key[0], key[1], self.prompt_version),
+        ).fetchone()
+        return row[0] if row is not None else None
+
+    def get(self, topic_a: str, topic_b: str) -> Optional[float]:
+        with self._lock:
+            return self._lookup(self._key(topic_a, topic_b))
+
+    def set(self, topic_a: str, topic_b: str, score: float) -> None:
+        with self._lock:
+            self._pending[self._key(topic_a, topic_b)] = float(score)
+
+    def split(self, pairs: List[Tuple[str, str]]) -> Tuple[Dict[Tuple[str, str], float], List[Tuple[str, str]]]:
+        """Partition pairs into cached scores and misses."""
+        hits: Dict[Tuple[str, str], float] = {}
+        misses = []
+        with self._lock:
+            for a, b in pairs:
+                score = self._lookup(self._key(a, b))
+                if score is None:
+                    misses.append((a, b))
+                else:
+                    hits[(a, b)] = score
+        return hits, misses
+
+    def flush(self) -> None:
+        """Commit buffered scores in one transaction."""
+        with self._lock:
+            if not self._pending:
+                return
+            conn = self._connect()
+            with conn:
+                conn.execute("BEGIN IMMEDIATE")
+                conn.executemany(
+                    """
+                    INSERT INTO pair_scores (topic_a, topic_b, prompt_version, score)
+                    VALUES (?, ?, ?, ?)
+                    ON CONFLICT (topic_a, topic_b, prompt_version) DO UPDATE SET score = excluded.score
+                    """,
+                    [(a, b, self.prompt_version, score) for (a, b), score in self._pending.items()],
+                )
+            self._pending.clear()
 
 
 topic_cache = TopicCache()
+pair_score_cache = PairScoreCache()
@@ -38,6 +38,20 @@ class FaissIndex:
             results.append((int(idx), float(score)))
         return results
 
+    def snapshot(self) -> Tuple[np.ndarray, np.ndarray]:
+        """All stored ids and their (normalized) vectors."""
+        if self.index.ntotal == 0:
+            return np.zeros(0, dtype="int64"), np.zeros((0, self.dim), dtype="float32")
+        ids = faiss.vector_to_array(self.index.id_map).astype("int64")
+        vectors = self.index.index.reconstruct_n(0, self.index.ntotal)
+        return ids, vectors
+
+    def vector(self, item_id: int) -> np.ndarray | None:
+        try:
+            return self.index.reconstruct(int(item_id))
+        except RuntimeError:
+            return None
+
 
 _index: FaissIndex | None = None
 _index_dim: int | None = None
@@ -80,6 +94,22 @@ def load_index(dim: int) -> FaissIndex:
     return _index
 
 
+def current_index() -> FaissIndex | None:
+    """The loaded index, or the persisted one when this process has not loaded it yet."""
+    global _index, _index_dim
+    if _index is not None:
+        return _index
+    path = _index_path()
+    if not os.path.exists(path):
+        return None
+    index = faiss.read_index(path)
+    if not isinstance(index, faiss.IndexIDMap2):
+        index = faiss.IndexIDMap2(index)
+    _index = FaissIndex(index=index, dim=index.d)
+    _index_dim = index.d
+    return _index
+
+
 def save_index() -> None:
     if _index is None:
         return
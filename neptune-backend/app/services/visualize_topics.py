@@ -1,92 +1,265 @@
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Iterable, Tuple
+import faiss
 import networkx as nx
 import itertools
+import numpy as np
 import logging
 from app.services.similarity import fallback_similarity, SimilarityStrategy
 from app.core.settings import settings
+from app.services.graph_edges import EdgeList
+from app.services.llm_scheduler import LLMUnavailableError, retry_busy
 from app.services.llm_service import llm_service
+from app.services.topic_cache import pair_score_cache
 
 logger = logging.getLogger(__name__)
 
 
+def candidate_topic_pairs(
+    topic_note_map: Dict[str, set[str]],
+    topic_vectors: Dict[str, List[float]] | None = None,
+) -> List[Tuple[str, str]]:
+    """
+    Plausible topic pairs worth scoring with the LLM.
+
+    Small graphs keep every pair. Larger ones take the union of centroid
+    nearest neighbours, topics sharing notes and topics sharing a label
+    word, so the number of pairs grows roughly linearly with topic count.
+    """
+    topics = list(topic_note_map.keys())
+    if len(topics) <= max(2, settings.kg_llm_exhaustive_max_topics):
+        return list(itertools.combinations(topics, 2))
+
+    neighbors = max(1, settings.kg_llm_candidate_neighbors)
+    candidates: set[Tuple[str, str]] = set()
+
+    def _add(a: str, b: str) -> None:
+        if a != b:
+            candidates.add((a, b) if a < b else (b, a))
+
+    vectors = {topic: vec for topic, vec in (topic_vectors or {}).items() if topic in topic_note_map}
+    if len(vectors) >= 2:
+        names, matrix = _normalized_matrix(vectors)
+        rows, cols, _ = _knn_pairs(matrix, neighbors)
+        for i, j in zip(rows.tolist(), cols.tolist()):
+            _add(names[i], names[j])
+
+    # Co-occurrence: topics sharing at least one note.
+    by_note: Dict[str, List[str]] = {}
+    for topic, note_ids in topic_note_map.items():
+        for note_id in note_ids:
+            by_note.setdefault(note_id, []).append(topic)
+    # Lexical overlap: topics sharing a label word. Very common words are
+    # skipped so the posting lists stay short.
+    by_word: Dict[str, List[str]] = {}
+    for topic in topics:
+        for word in set(topic.lower().replace("-", " ").split()):
+            if len(word) > 2:
+                by_word.setdefault(word, []).append(topic)
+    for group in list(by_note.values()) + list(by_word.values()):
+        if len(group) > neighbors * 4:
+            continue
+        for a, b in itertools.combinations(group, 2):
+            _add(a, b)
+
+    return sorted(candidates)
+
+
 def find_topic_relationships(
     topic_note_map: Dict[str, set[str]],
     strategy: SimilarityStrategy | None = None,
+    topic_vectors: Dict[str, List[float]] | None = None,
 ) -> List[Tuple[str, str, float]]:
     """
-    Find relationships between topics using note co-occurrence.
+    Score topic relationships with the LLM.
+
+    Only candidate pairs (see ``candidate_topic_pairs``) are scored, and
+    scores are cached per pair and prompt version. Batches the scheduler
+    pushes back are retried; pairs the LLM does not answer (or every pair
+    left once it is unavailable) fall back to note co-occurrence and are
+    not cached.
     """
     if len(topic_note_map) < 2:
         return []
 
-    topic_pairs = list(itertools.combinations(topic_note_map.keys(), 2))
+    topic_pairs = candidate_topic_pairs(topic_note_map, topic_vectors)
+    cached, misses = pair_score_cache.split(topic_pairs)
 
-    logger.info("Finding relationships for %s topic pairs", len(topic_pairs))
+    logger.info(
+        "Finding relationships for %s candidate topic pairs (%s cached)",
+        len(topic_pairs),
+        len(cached),
+    )
 
     similarity = strategy or fallback_similarity()
-    edges = []
+    edges = [(a, b, score) for (a, b), score in cached.items()]
     batch_size = max(1, settings.llm_relationship_batch_size)
-    pairs = [{"a": a, "b": b} for a, b in topic_pairs]
+    pairs = [{"a": a, "b": b} for a, b in misses]
 
+    available = True
     for i in range(0, len(pairs), batch_size):
         batch = pairs[i : i + batch_size]
-        scored = llm_service.score_relationships_batch(batch)
-        scored_map = {(item["a"], item["b"]): item["score"] for item in scored}
+        scored = []
+        if available:
+            try:
+                scored = retry_busy(
+                    lambda: llm_service.score_relationships_batch(batch), what="Relationship batch"
+                )
+            except LLMUnavailableError as e:
+                logger.warning("LLM unavailable; %s pairs fall back to co-occurrence: %s", len(pairs) - i, e)
+                available = False
+        scored_map = {}
+        for item in scored:
+            scored_map[(item["a"], item["b"])] = item["score"]
+            scored_map[(item["b"], item["a"])] = item["score"]
         for pair in batch:
             key = (pair["a"], pair["b"])
             if key in scored_map:
+                pair_score_cache.set(pair["a"], pair["b"], scored_map[key])
                 edges.append((pair["a"], pair["b"], scored_map[key]))
             else:
                 strength = similarity.score(pair["a"], pair["b"], topic_note_map)
                 edges.append((pair["a"], pair["b"], strength))
 
+    try:
+        pair_score_cache.flush()
+    except Exception as e:
+        logger.warning("Pair score cache flush failed: %s", e)
+
     logger.info("Found %s relationships between topics", len(edges))
     return edges
 
 
-def find_topic_relationships_embeddings(
-    topic_note_map: Dict[str, set[str]],
+def compute_topic_centroids(
+    topic_note_map: Dict[str, Iterable[str]],
     note_embeddings: Dict[int, List[float]],
-) -> List[Tuple[str, str, float]]:
-    if len(topic_note_map) < 2:
-        return []
-
-    topic_vectors: Dict[str, List[float]] = {}
+) -> Dict[str, List[float]]:
+    """Average the note embeddings of each topic into a single vector (segment mean)."""
+    topics: List[str] = []
+    segments: List[int] = []
+    vectors: List[List[float]] = []
+    dim = None
     for topic, note_ids in topic_note_map.items():
-        vectors = []
+        topic_index = len(topics)
+        topics.append(topic)
         for note_id_str in note_ids:
             try:
                 note_id = int(note_id_str)
             except (ValueError, TypeError):
                 continue
             vec = note_embeddings.get(note_id)
-            if vec:
-                vectors.append(vec)
-        if not vectors:
-            continue
-        dim = len(vectors[0])
-        avg = [0.0] * dim
-        for vec in vectors:
-            for i, val in enumerate(vec):
-                avg[i] += float(val)
-        avg = [val / len(vectors) for val in avg]
-        topic_vectors[topic] = avg
+            if not vec:
+                continue
+            dim = dim or len(vec)
+            if len(vec) != dim:
+                continue
+            segments.append(topic_index)
+            vectors.append(vec)
+    if not vectors:
+        return {}
+
+    matrix = np.asarray(vectors, dtype="float64")
+    segment_ids = np.asarray(segments, dtype="int64")
+    sums = np.zeros((len(topics), dim), dtype="float64")
+    np.add.at(sums, segment_ids, matrix)
+    counts = np.bincount(segment_ids, minlength=len(topics))
+    return {
+        topics[i]: (sums[i] / counts[i]).tolist()
+        for i in np.flatnonzero(counts)
+    }
+
+
+def _normalized_matrix(topic_vectors: Dict[str, List[float]]) -> Tuple[List[str], np.ndarray]:
+    topics = list(topic_vectors.keys())
+    matrix = np.asarray([topic_vectors[topic] for topic in topics], dtype="float32")
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return topics, matrix / norms
 
+
+def _knn_pairs(matrix: np.ndarray, neighbors: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Top-k cosine neighbours per row via an exact FAISS inner-product index."""
+    index = faiss.IndexFlatIP(matrix.shape[1])
+    index.add(np.ascontiguousarray(matrix))
+    k = min(neighbors + 1, matrix.shape[0])
+    scores, ids = index.search(np.ascontiguousarray(matrix), k)
+    rows = np.repeat(np.arange(matrix.shape[0]), k)
+    cols = ids.reshape(-1)
+    scores = scores.reshape(-1)
+    keep = (cols >= 0) & (cols != rows)
+    rows, cols, scores = rows[keep], cols[keep], scores[keep]
+    # Each undirected pair once; a pair found from both ends keeps one copy.
+    a = np.minimum(rows, cols)
+    b = np.maximum(rows, cols)
+    _, unique = np.unique(a * matrix.shape[0] + b, return_index=True)
+    return a[unique], b[unique], scores[unique]
+
+
+def relationships_from_centroids(
+    topic_vectors: Dict[str, List[float]],
+    focus: Iterable[str] | None = None,
+    min_strength: float | None = None,
+) -> List[Tuple[str, str, float]]:
+    """
+    Cosine similarity between topic centroids.
+
+    Scores come from one normalized matrix product; only pairs at or above
+    ``min_strength`` (default ``kg_min_strength``) are materialized. Above ``kg_knn_threshold`` topics
+    each topic keeps only its ``kg_knn_neighbors`` nearest neighbours.
+    When ``focus`` is given only pairs touching at least one focus topic are
+    scored, which keeps incremental updates proportional to the change.
+    """
     if len(topic_vectors) < 2:
         return []
 
-    def _norm(vec: List[float]) -> float:
-        return sum(v * v for v in vec) ** 0.5 or 1.0
+    topics, matrix = _normalized_matrix(topic_vectors)
+    min_strength = settings.kg_min_strength if min_strength is None else min_strength
+    large = len(topics) > max(2, settings.kg_knn_threshold)
 
-    edges = []
-    topics = list(topic_vectors.keys())
-    for a, b in itertools.combinations(topics, 2):
-        va = topic_vectors[a]
-        vb = topic_vectors[b]
-        denom = _norm(va) * _norm(vb)
-        score = sum(x * y for x, y in zip(va, vb)) / denom
-        score = max(0.0, min(1.0, score))
-        edges.append((a, b, float(score)))
+    if focus is not None:
+        positions = {topic: i for i, topic in enumerate(topics)}
+        focus_idx = np.asarray(
+            sorted(positions[topic] for topic in set(focus) if topic in positions), dtype="int64"
+        )
+        if focus_idx.size == 0:
+            return []
+        scores = matrix[focus_idx] @ matrix.T
+        if large:
+            # Keep the focus rows as sparse as a full kNN build would.
+            k = min(settings.kg_knn_neighbors, len(topics) - 1)
+            cutoff = -np.partition(-scores, k, axis=1)[:, k : k + 1]
+            scores = np.where(scores >= cutoff, scores, -1.0)
+        is_focus = np.zeros(len(topics), dtype=bool)
+        is_focus[focus_idx] = True
+        rows, cols = np.nonzero(scores >= min_strength)
+        a = focus_idx[rows]
+        b = cols
+        # Skip self pairs and count focus-focus pairs once.
+        keep = (a != b) & (~is_focus[b] | (a < b))
+        a, b, values = a[keep], b[keep], scores[rows[keep], cols[keep]]
+    elif large:
+        a, b, values = _knn_pairs(matrix, max(1, settings.kg_knn_neighbors))
+        keep = values >= min_strength
+        a, b, values = a[keep], b[keep], values[keep]
+    else:
+        scores = matrix @ matrix.T
+        a, b = np.triu_indices(len(topics), k=1)
+        values = scores[a, b]
+        keep = values >= min_strength
+        a, b, values = a[keep], b[keep], values[keep]
+
+    values = np.clip(values, 0.0, 1.0)
+    return [(topics[i], topics[j], float(score)) for i, j, score in zip(a.tolist(), b.tolist(), values.tolist())]
+
+
+def find_topic_relationships_embeddings(
+    topic_note_map: Dict[str, set[str]],
+    note_embeddings: Dict[int, List[float]],
+) -> List[Tuple[str, str, float]]:
+    if len(topic_note_map) < 2:
+        return []
+
+    topic_vectors = compute_topic_centroids(topic_note_map, note_embeddings)
+    edges = relationships_from_centroids(topic_vectors)
 
     logger.info("Found %s embedding-based relationships between topics", len(edges))
     return edges
@@ -94,9 +267,16 @@ def find_topic_relationships_embeddings(
 def create_topic_graph(
     topics_data: List[Dict[str, Any]],
     note_embeddings: Dict[int, List[float]] | None = None,
+    topic_vectors: Dict[str, List[float]] | None = None,
 ) -> nx.Graph:
     """
     Create a NetworkX graph from topic extraction results.
+
+    Edge strength is centroid cosine similarity from ``topic_vectors`` (or
+    centroids of ``note_embeddings``). With ``KG_RELATIONSHIP_MODE=llm``, or
+    when no vectors are available, candidate pairs are scored by the LLM.
+    The graph keeps the configured edge selection; every scored edge above
+    ``kg_edge_floor`` is kept sorted in ``G.graph["edge_list"]``.
     """
     G = nx.Graph()
     
@@ -117,42 +297,47 @@ def create_topic_graph(
         )
     
     # Find and add relationships between topics
-    if note_embeddings is not None:
-        topic_relationships = find_topic_relationships_embeddings(topic_note_map, note_embeddings)
+    if topic_vectors is None and note_embeddings is not None:
+        topic_vectors = compute_topic_centroids(topic_note_map, note_embeddings)
+    if settings.kg_relationship_mode == "llm" or topic_vectors is None:
+        topic_relationships = find_topic_relationships(topic_note_map, topic_vectors=topic_vectors)
     else:
-        topic_relationships = find_topic_relationships(topic_note_map)
-    filtered = [
-        (t1, t2, s) for t1, t2, s in topic_relationships if s >= settings.kg_min_strength
-    ]
-    filtered.sort(key=lambda item: item[2], reverse=True)
-    if settings.kg_max_edges > 0:
-        filtered = filtered[: settings.kg_max_edges]
-    for topic1, topic2, strength in filtered:
+        topic_relationships = relationships_from_centroids(
+            topic_vectors, min_strength=min(settings.kg_edge_floor, settings.kg_min_strength)
+        )
+    edge_list = EdgeList.from_edges(topic_relationships)
+    G.graph["edge_list"] = edge_list
+    for topic1, topic2, strength in edge_list.select():
         G.add_edge(topic1, topic2, weight=strength)
     
     return G
 
-def graph_to_frontend_format(G: nx.Graph) -> Dict:
-    """
-    Convert NetworkX graph to a frontend-friendly JSON structure with note details
-    """
+def _load_note_names() -> Dict[int, str]:
     from app.db.database import SessionLocal
     from app.db.models import FileSystem
-    
+
     db = SessionLocal()
     try:
-        notes = (
-            db.query(FileSystem)
+        rows = (
+            db.query(FileSystem.id, FileSystem.name)
             .filter(FileSystem.type == "file")
             .filter(FileSystem.deleted_at.is_(None))
             .all()
         )
-        note_names = {note.id: note.name for note in notes}
+        return {row[0]: row[1] for row in rows}
     except Exception as e:
         logger.warning("Error fetching note names: %s", e)
-        note_names = {}
+        return {}
     finally:
         db.close()
+
+
+def graph_to_frontend_format(G: nx.Graph, note_names: Dict[int, str] | None = None) -> Dict:
+    """
+    Convert NetworkX graph to a frontend-friendly JSON structure with note details
+    """
+    if note_names is None:
+        note_names = _load_note_names()
     
     nodes = []
     for node, data in G.nodes(data=True):
@@ -0,0 +1,31 @@
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.db.models import Base, FileSystem
+from app.maintenance import cleanup
+from app.services import graph_store as graph_store_module
+from app.services.graph_store import FileGraphStore, GraphStore
+from app.services.graph_tenants import scoped_key
+
+
+def test_cleanup_cache_removes_every_owners_entries(monkeypatch, tmp_path):
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(bind=engine)
+    db = factory()
+    db.add(FileSystem(name="A", type="file", content="x", owner_id="alice"))
+    db.commit()
+    db.close()
+    monkeypatch.setattr(cleanup, "SessionLocal", factory)
+    store = GraphStore(FileGraphStore(str(tmp_path / "kg_cache.json")), poll_seconds=0)
+    monkeypatch.setattr(graph_store_module, "graph_store", store)
+    keys = ["graph", scoped_key("graph", "alice"), scoped_key("edges", "alice"), scoped_key("notes", "alice")]
+    for key in keys:
+        store.put(key, {"nodes": [], "links": []}, fingerprint=None, etag=None)
+
+    assert cleanup.cleanup_cache(dry_run=True)
+    assert all(store.backend.version(key) is not None for key in keys)
+    assert cleanup.cleanup_cache(dry_run=False)
+    assert all(store.backend.version(key) is None for key in keys)
+    assert not cleanup.cleanup_cache(dry_run=False)
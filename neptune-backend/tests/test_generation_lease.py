@@ -0,0 +1,53 @@
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.db.models import Base, GenerationLease as LeaseRow
+from app.services import generation_lease
+from app.services.generation_lease import GenerationLease
+
+
+def _session_factory():
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    Base.metadata.create_all(bind=engine)
+    return sessionmaker(bind=engine)
+
+
+def test_only_one_replica_holds_the_lease(monkeypatch):
+    monkeypatch.setattr(generation_lease, "SessionLocal", _session_factory())
+    first = GenerationLease("kg", ttl_seconds=60)
+    second = GenerationLease("kg", ttl_seconds=60)
+
+    assert first.try_acquire()
+    assert not second.try_acquire()
+    assert second.held_elsewhere()
+
+    first.publish_status({"is_generating": True, "progress": "pipeline_embed"})
+    second.publish_status({"is_generating": False, "progress": "ignored"})
+    assert second.read().status["progress"] == "pipeline_embed"
+
+    first.release()
+    assert second.try_acquire()
+    second.release()
+
+
+def test_expired_lease_can_be_taken_over(monkeypatch):
+    factory = _session_factory()
+    monkeypatch.setattr(generation_lease, "SessionLocal", factory)
+    crashed = GenerationLease("kg", ttl_seconds=60)
+    assert crashed.try_acquire()
+    crashed._stop_heartbeat()
+
+    db = factory()
+    db.query(LeaseRow).update({LeaseRow.expires_at: 0.5})
+    db.commit()
+    db.close()
+
+    survivor = GenerationLease("kg", ttl_seconds=60)
+    assert survivor.try_acquire()
+    assert not crashed.renew()
+    survivor.release()
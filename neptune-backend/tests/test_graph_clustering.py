@@ -0,0 +1,49 @@
+from app.services import graph_clustering
+from app.services.graph_clustering import build_cluster_model, keyword_labels, note_terms
+
+
+def _notes():
+    notes = []
+    for i in range(6):
+        notes.append({
+            "note_id": str(i),
+            "name": f"Calculus {i}",
+            "vector": [1.0, 0.05 * i, 0.0],
+            "terms": note_terms("derivative integral limits derivative"),
+        })
+    for i in range(6, 12):
+        notes.append({
+            "note_id": str(i),
+            "name": f"Rome {i}",
+            "vector": [0.0, 0.05 * i, 1.0],
+            "terms": note_terms("empire senate caesar empire"),
+        })
+    return notes
+
+
+def test_keyword_labels_prefer_cluster_specific_terms():
+    labels = keyword_labels([
+        note_terms("derivative derivative notes"),
+        note_terms("empire empire notes"),
+    ], top_n=1)
+
+    assert labels == [["derivative"], ["empire"]]
+
+
+def test_cluster_model_groups_and_assigns_without_per_note_llm(monkeypatch):
+    settings = graph_clustering.settings
+    original = (settings.kg_cluster_count, settings.kg_cluster_naming)
+    try:
+        object.__setattr__(settings, "kg_cluster_count", 2)
+        object.__setattr__(settings, "kg_cluster_naming", "keywords")
+        model, topic_map = build_cluster_model(_notes())
+    finally:
+        object.__setattr__(settings, "kg_cluster_count", original[0])
+        object.__setattr__(settings, "kg_cluster_naming", original[1])
+
+    groups = sorted(sorted(ids, key=int) for ids in topic_map.values())
+    assert groups == [[str(i) for i in range(6)], [str(i) for i in range(6, 12)]]
+    assert {name.split()[0] for name in topic_map} == {"derivative", "empire"}
+
+    calculus = next(name for name in topic_map if name.startswith("derivative"))
+    assert model.assign([0.9, 0.1, 0.05]) == calculus
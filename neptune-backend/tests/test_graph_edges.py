@@ -0,0 +1,43 @@
+from app.services.graph_edges import EdgeList
+
+
+def _edges():
+    return EdgeList.from_edges(
+        [
+            ("a", "b", 0.9),
+            ("a", "c", 0.8),
+            ("a", "d", 0.7),
+            ("b", "c", 0.5),
+            ("c", "d", 0.3),
+            ("b", "d", 0.05),
+        ],
+        floor=0.1,
+    )
+
+
+def test_edges_are_sorted_and_floored():
+    edges = _edges()
+
+    assert len(edges) == 5
+    assert list(edges.strength) == sorted(edges.strength, reverse=True)
+
+
+def test_select_applies_threshold_budget_and_degree_cap():
+    edges = _edges()
+
+    assert [(a, b) for a, b, _ in edges.select(min_strength=0.5, max_edges=0)] == [
+        ("a", "b"), ("a", "c"), ("a", "d"), ("b", "c")
+    ]
+    assert len(edges.select(min_strength=0.0, max_edges=2)) == 2
+    capped = edges.select(min_strength=0.0, max_edges=0, max_degree=1)
+    assert [(a, b) for a, b, _ in capped] == [("a", "b"), ("c", "d")]
+    assert edges.select(min_strength=0.0, max_edges=0, node_ids={"b", "c", "d"}) == [
+        ("b", "c", 0.5), ("c", "d", 0.3)
+    ]
+
+
+def test_round_trip_and_without():
+    edges = EdgeList.from_dict(_edges().to_dict())
+
+    assert edges.edges() == _edges().edges()
+    assert {(a, b) for a, b, _ in edges.without({"a"})} == {("b", "c"), ("c", "d")}
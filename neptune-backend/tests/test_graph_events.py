@@ -0,0 +1,99 @@
+import asyncio
+import json
+
+from app.core import settings as settings_module
+from app.services import graph_events
+from app.services.graph_events import graph_diff, stream_graph_events
+from app.services.graph_store import CachedGraph
+
+
+def _entry(generation, graph):
+    return CachedGraph(generation=generation, fingerprint=None, etag=f"e{generation}", timestamp=None, graph=graph)
+
+
+def _parse(message):
+    fields = dict(line.split(": ", 1) for line in message.strip().splitlines())
+    return fields.get("event"), json.loads(fields["data"]) if "data" in fields else None
+
+
+def test_graph_diff_reports_added_removed_and_changed():
+    old = {
+        "nodes": [{"id": "a", "noteCount": 1}, {"id": "b", "noteCount": 1}],
+        "links": [{"source": "a", "target": "b", "strength": 0.5}],
+    }
+    new = {
+        "nodes": [{"id": "a", "noteCount": 2}, {"id": "c", "noteCount": 1}],
+        "links": [{"source": "c", "target": "a", "strength": 0.7}],
+    }
+    diff = graph_diff(old, new)
+
+    assert diff["nodes"]["added"] == [{"id": "c", "noteCount": 1}]
+    assert diff["nodes"]["removed"] == ["b"]
+    assert diff["nodes"]["changed"] == [{"id": "a", "noteCount": 2}]
+    assert diff["links"]["added"] == [{"source": "c", "target": "a", "strength": 0.7}]
+    assert diff["links"]["removed"] == [{"source": "a", "target": "b"}]
+
+
+def test_stream_sends_snapshot_then_diff_and_status():
+    entries = [
+        _entry(1, {"nodes": [{"id": "a"}], "links": []}),
+        _entry(2, {"nodes": [{"id": "a"}, {"id": "b"}], "links": []}),
+    ]
+    state = {"polls": 0}
+
+    def load_entry():
+        return entries[min(state["polls"] - 1, 1)]
+
+    async def is_disconnected():
+        state["polls"] += 1
+        return state["polls"] > 2
+
+    async def collect():
+        return [
+            message
+            async for message in stream_graph_events(
+                load_entry, lambda: {"progress": "idle"}, is_disconnected, last_generation=None
+            )
+        ]
+
+    original = settings_module.settings.kg_events_poll_seconds
+    object.__setattr__(settings_module.settings, "kg_events_poll_seconds", 0.05)
+    try:
+        messages = asyncio.run(collect())
+    finally:
+        object.__setattr__(settings_module.settings, "kg_events_poll_seconds", original)
+
+    events = [_parse(message) for message in messages[1:]]
+    assert messages[0].startswith("retry:")
+    assert events[0][0] == "graph" and events[0][1]["generation"] == 1
+    assert events[1] == ("status", {"progress": "idle"})
+    assert events[2][0] == "diff"
+    assert events[2][1]["from"] == 1 and events[2][1]["generation"] == 2
+    assert events[2][1]["nodes"]["added"] == [{"id": "b"}]
+
+
+def test_stream_skips_snapshot_for_current_generation():
+    entry = _entry(5, {"nodes": [{"id": "a"}], "links": []})
+    state = {"polls": 0}
+
+    async def is_disconnected():
+        state["polls"] += 1
+        return state["polls"] > 1
+
+    async def collect():
+        return [
+            message
+            async for message in stream_graph_events(
+                lambda: entry, lambda: {"progress": "idle"}, is_disconnected, last_generation=5
+            )
+        ]
+
+    messages = asyncio.run(collect())
+    assert [_parse(message)[0] for message in messages[1:]] == ["status"]
+
+
+def test_status_snapshot_is_kept_per_owner():
+    snapshot = graph_events._StatusSnapshot()
+    assert snapshot.get("alice", lambda: {"progress": "layout"}, 60) == {"progress": "layout"}
+    assert snapshot.get("bob", lambda: {"progress": "idle"}, 60) == {"progress": "idle"}
+    assert snapshot.get("alice", lambda: {"progress": "changed"}, 60) == {"progress": "layout"}
@@ -0,0 +1,44 @@
+from app.services.graph_hierarchy import build_hierarchy
+
+
+def _graph(topic_count):
+    nodes = []
+    links = []
+    for i in range(topic_count):
+        nodes.append({
+            "id": f"t{i}",
+            "label": f"t{i}",
+            "noteCount": 1,
+            "noteIds": [str(i)],
+            "noteDetails": [{"id": i, "name": f"Note {i}"}],
+        })
+        # Dense links inside blocks of five topics, nothing across blocks.
+        block = i - i % 5
+        for j in range(block, i):
+            links.append({"source": f"t{j}", "target": f"t{i}", "strength": 0.9})
+    return {"nodes": nodes, "links": links}
+
+
+def test_small_graph_has_topic_and_note_levels():
+    hierarchy = build_hierarchy(_graph(4), max_nodes=10)
+
+    assert len(hierarchy.levels) == 2
+    top = hierarchy.level(0, limit=100)
+    assert {node["kind"] for node in top["nodes"]} == {"topic"}
+    assert len(top["links"]) == 6
+    assert hierarchy.expand("t0", limit=10)["nodes"][0]["id"] == "note:0"
+
+
+def test_large_graph_is_grouped_under_budget():
+    hierarchy = build_hierarchy(_graph(60), max_nodes=20)
+
+    assert len(hierarchy.levels) == 3
+    top = hierarchy.level(0, limit=100)
+    assert top["total"] <= 20
+    group = top["nodes"][0]
+    assert group["kind"] == "group"
+    children = hierarchy.expand(group["id"], limit=100)
+    assert children["total"] == 5
+    assert {node["kind"] for node in children["nodes"]} == {"topic"}
+    assert hierarchy.level(0, limit=3)["total"] == top["total"]
+    assert len(hierarchy.level(0, limit=3)["nodes"]) == 3
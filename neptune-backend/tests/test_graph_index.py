@@ -0,0 +1,40 @@
+from app.services.graph_index import GraphIndex
+
+
+def _graph():
+    nodes = [
+        {"id": topic, "label": topic, "noteIds": [str(i)], "noteDetails": []}
+        for i, topic in enumerate(["a", "b", "c", "d", "e"])
+    ]
+    nodes[1]["noteIds"].append("9")
+    links = [
+        {"source": "a", "target": "b", "strength": 0.9},
+        {"source": "a", "target": "c", "strength": 0.4},
+        {"source": "b", "target": "d", "strength": 0.7},
+        {"source": "d", "target": "e", "strength": 0.6},
+    ]
+    return {"nodes": nodes, "links": links}
+
+
+def test_neighbors_follow_depth_and_strength_order():
+    index = GraphIndex.from_graph(_graph())
+
+    one_hop = index.neighbors("a", depth=1, limit=10)
+    assert [node["id"] for node in one_hop["nodes"]] == ["a", "b", "c"]
+    assert len(one_hop["links"]) == 2
+
+    two_hops = index.neighbors("a", depth=2, limit=10)
+    assert [node["id"] for node in two_hops["nodes"]] == ["a", "b", "c", "d"]
+
+    capped = index.neighbors("a", depth=2, limit=2)
+    assert [node["id"] for node in capped["nodes"]] == ["a", "b"]
+    assert index.neighbors("missing") is None
+
+
+def test_subgraph_for_notes():
+    index = GraphIndex.from_graph(_graph())
+
+    result = index.subgraph(["1", "3", "9"])
+
+    assert sorted(node["id"] for node in result["nodes"]) == ["b", "d"]
+    assert result["links"] == [{"source": "b", "target": "d", "strength": 0.7}]
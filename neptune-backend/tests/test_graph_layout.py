@@ -0,0 +1,53 @@
+import math
+
+from app.services.graph_layout import apply_layout
+
+
+def _graph(count):
+    nodes = [{"id": f"t{i}"} for i in range(count)]
+    links = [{"source": f"t{i}", "target": f"t{i + 1}", "strength": 0.8} for i in range(count - 1)]
+    return {"nodes": nodes, "links": links}
+
+
+def _position(node):
+    return (node["x"], node["y"], node["z"])
+
+
+def test_layout_places_every_node_and_keeps_linked_nodes_close():
+    graph = _graph(30)
+    apply_layout(graph)
+
+    assert all(all(isinstance(node[axis], float) for axis in "xyz") for node in graph["nodes"])
+    nodes = graph["nodes"]
+    linked = math.dist(_position(nodes[0]), _position(nodes[1]))
+    far = math.dist(_position(nodes[0]), _position(nodes[29]))
+    assert linked < far
+
+
+def test_warm_start_keeps_existing_nodes_still():
+    graph = _graph(40)
+    apply_layout(graph)
+    before = {node["id"]: _position(node) for node in graph["nodes"]}
+
+    graph["nodes"].append({"id": "new"})
+    graph["links"].append({"source": "new", "target": "t0", "strength": 0.9})
+    apply_layout(graph)
+
+    moved = max(math.dist(before[node["id"]], _position(node)) for node in graph["nodes"] if node["id"] in before)
+    assert moved < 5.0
+    assert "x" in graph["nodes"][-1]
+
+
+def test_local_change_moves_only_nodes_whose_links_changed():
+    from app.services.graph_events import graph_diff
+
+    previous = _graph(40)
+    apply_layout(previous)
+    graph = {"nodes": [dict(node) for node in previous["nodes"]], "links": list(previous["links"])}
+    graph["nodes"].append({"id": "new"})
+    graph["links"].append({"source": "new", "target": "t5", "strength": 0.9})
+    apply_layout(graph, previous=previous)
+
+    changed = {node["id"] for node in graph_diff(previous, graph)["nodes"]["changed"]}
+    assert changed == {"t5"}
+    assert "x" in graph["nodes"][-1]
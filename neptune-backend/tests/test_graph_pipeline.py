@@ -0,0 +1,174 @@
+import threading
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.db.models import Base, FileSystem
+from app.services import graph_pipeline
+
+
+def _session_factory():
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    Base.metadata.create_all(bind=engine)
+    return sessionmaker(bind=engine)
+
+
+class _MemoryTopicCache:
+    def __init__(self):
+        self.data = {}
+
+    def get(self, note_id, checksum):
+        return self.data.get((note_id, checksum))
+
+    def set(self, note_id, checksum, topic):
+        self.data[(note_id, checksum)] = topic
+
+    def flush(self):
+        return None
+
+
+def test_pipeline_streams_pages_into_topic_map(monkeypatch):
+    factory = _session_factory()
+    db = factory()
+    for i in range(7):
+        content = "calculus notes" if i % 2 else "history notes"
+        db.add(FileSystem(name=f"Note {i}", type="file", content=content, content_checksum=f"c{i}"))
+    db.add(FileSystem(name="Empty", type="file", content=""))
+    db.commit()
+    db.close()
+
+    monkeypatch.setattr(graph_pipeline, "SessionLocal", factory)
+    monkeypatch.setattr(graph_pipeline, "topic_cache", _MemoryTopicCache())
+    monkeypatch.setattr(
+        graph_pipeline,
+        "upsert_embeddings_batch",
+        lambda _db, items: {item.id: [1.0, float(item.id)] for item, _ in items},
+    )
+    calls = []
+
+    def _extract(batch, on_topic=None):
+        calls.append(len(batch))
+        return [
+            {"note_id": note["id"], "topic": note["content"].split()[0]}
+            for note in batch
+        ]
+
+    monkeypatch.setattr(graph_pipeline.llm_service, "extract_topics_batch", _extract)
+    overrides = {"kg_pipeline_page_size": 3, "kg_pipeline_embed_batch_size": 2}
+    originals = {name: getattr(graph_pipeline.settings, name) for name in overrides}
+    try:
+        for name, value in overrides.items():
+            object.__setattr__(graph_pipeline.settings, name, value)
+        result = graph_pipeline.run_graph_pipeline()
+    finally:
+        for name, value in originals.items():
+            object.__setattr__(graph_pipeline.settings, name, value)
+
+    assert result.notes_seen == 8
+    assert result.notes_with_content == 7
+    assert sorted(result.topic_map) == ["calculus", "history"]
+    assert sum(len(ids) for ids in result.topic_map.values()) == 7
+    assert set(result.topic_vectors()) == {"calculus", "history"}
+    assert result.stats["fetch"]["items"] == 8
+    assert result.stats["topics"]["items"] == 7
+    assert sum(calls) == 7
+    assert result.complete
+
+
+def test_unclassified_notes_leave_the_result_incomplete(monkeypatch):
+    factory = _session_factory()
+    db = factory()
+    for i in range(4):
+        db.add(FileSystem(name=f"Note {i}", type="file", content=f"topic{i} notes", content_checksum=f"c{i}"))
+    db.commit()
+    db.close()
+
+    monkeypatch.setattr(graph_pipeline, "SessionLocal", factory)
+    monkeypatch.setattr(graph_pipeline, "topic_cache", _MemoryTopicCache())
+    monkeypatch.setattr(graph_pipeline, "upsert_embeddings_batch", lambda _db, items: {})
+
+    def _extract(batch, on_topic=None):
+        # The model answered for the first note of each batch only.
+        return [{"note_id": batch[0]["id"], "topic": "partial"}]
+
+    monkeypatch.setattr(graph_pipeline.llm_service, "extract_topics_batch", _extract)
+    result = graph_pipeline.run_graph_pipeline()
+
+    assert result.notes_with_content == 4
+    assert 0 < result.notes_assigned < 4
+    assert not result.complete
+
+
+def test_topic_batches_fan_out_within_concurrency_budget(monkeypatch):
+    factory = _session_factory()
+    db = factory()
+    for i in range(12):
+        db.add(FileSystem(name=f"Note {i}", type="file", content=f"topic{i % 3} notes", content_checksum=f"c{i}"))
+    db.commit()
+    db.close()
+
+    cache = _MemoryTopicCache()
+    monkeypatch.setattr(graph_pipeline, "SessionLocal", factory)
+    monkeypatch.setattr(graph_pipeline, "topic_cache", cache)
+    monkeypatch.setattr(graph_pipeline, "upsert_embeddings_batch", lambda _db, items: {})
+    lock = threading.Lock()
+    state = {"active": 0, "peak": 0}
+
+    def _extract(batch, on_topic=None):
+        with lock:
+            state["active"] += 1
+            state["peak"] = max(state["peak"], state["active"])
+        time.sleep(0.05)
+        with lock:
+            state["active"] -= 1
+        for note in batch:
+            on_topic(note["id"], note["content"].split()[0])
+        return [{"note_id": note["id"], "topic": note["content"].split()[0]} for note in batch]
+
+    monkeypatch.setattr(graph_pipeline.llm_service, "extract_topics_batch", _extract)
+    overrides = {"llm_topic_batch_size": 2, "llm_max_concurrency": 3, "kg_pipeline_embed_batch_size": 12}
+    originals = {name: getattr(graph_pipeline.settings, name) for name in overrides}
+    try:
+        for name, value in overrides.items():
+            object.__setattr__(graph_pipeline.settings, name, value)
+        result = graph_pipeline.run_graph_pipeline()
+    finally:
+        for name, value in originals.items():
+            object.__setattr__(graph_pipeline.settings, name, value)
+
+    assert state["peak"] == 3
+    assert sum(len(ids) for ids in result.topic_map.values()) == 12
+    assert len(cache.data) == 12
+
+
+def test_embedding_backpressure_is_retried_at_backfill_priority(monkeypatch):
+    from app.services.llm_scheduler import LLMBusyError, Priority, current_priority
+
+    factory = _session_factory()
+    db = factory()
+    for i in range(2):
+        db.add(FileSystem(name=f"Note {i}", type="file", content=f"topic{i} notes", content_checksum=f"c{i}"))
+    db.commit()
+    db.close()
+
+    monkeypatch.setattr(graph_pipeline, "SessionLocal", factory)
+    priorities = []
+
+    def _embed(_db, items):
+        priorities.append(current_priority()[0])
+        if len(priorities) == 1:
+            raise LLMBusyError("no slot")
+        return {item.id: [1.0, float(item.id)] for item, _ in items}
+
+    monkeypatch.setattr(graph_pipeline, "upsert_embeddings_batch", _embed)
+    result = graph_pipeline.run_graph_pipeline(classify=False)
+
+    assert priorities == [Priority.BACKFILL, Priority.BACKFILL]
+    assert all(note["vector"] for note in result.notes)
+    assert result.complete
@@ -0,0 +1,72 @@
+import threading
+import time
+
+from app.services.graph_scheduler import RegenerationScheduler
+
+
+def test_burst_of_requests_coalesces_into_one_run():
+    runs = []
+    scheduler = RegenerationScheduler(
+        lambda: runs.append(time.monotonic()),
+        debounce_seconds=0.05,
+        min_interval_seconds=0.0,
+        max_delay_seconds=1.0,
+    )
+    for _ in range(10):
+        scheduler.request()
+
+    assert scheduler.status()["queue_depth"] == 10
+    assert scheduler.wait_idle(timeout=2)
+    assert len(runs) == 1
+    assert scheduler.status()["last_dirty_at"] is not None
+
+
+def test_request_during_run_triggers_trailing_run():
+    started = threading.Event()
+    release = threading.Event()
+    runs = []
+
+    def _run():
+        runs.append(1)
+        started.set()
+        release.wait(timeout=2)
+
+    scheduler = RegenerationScheduler(
+        _run, debounce_seconds=0.0, min_interval_seconds=0.0, max_delay_seconds=0.0
+    )
+    scheduler.request()
+    assert started.wait(timeout=2)
+    scheduler.request()
+    scheduler.request()
+    release.set()
+
+    assert scheduler.wait_idle(timeout=2)
+    assert len(runs) == 2
+
+
+def test_tenants_run_in_parallel_and_slow_tenant_does_not_block_others():
+    release = threading.Event()
+    finished = []
+
+    def _run(owner=None):
+        if owner == "large":
+            release.wait(timeout=2)
+        finished.append(owner)
+
+    scheduler = RegenerationScheduler(
+        _run, debounce_seconds=0.0, min_interval_seconds=0.0, max_delay_seconds=0.0, workers=2
+    )
+    scheduler.request(key="large")
+    time.sleep(0.05)
+    scheduler.request(key="small")
+    scheduler.request()
+
+    deadline = time.monotonic() + 2
+    while len(finished) < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert set(finished) == {"small", None}
+    assert scheduler.status("large")["running"]
+
+    release.set()
+    assert scheduler.wait_idle(timeout=2)
+    assert scheduler.status("large")["runs"] == 1
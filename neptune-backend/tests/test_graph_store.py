@@ -0,0 +1,52 @@
+import pytest
+
+from app.services.graph_store import FileGraphStore, GraphStore, GraphStoreBackend
+
+
+def test_generation_increments_and_is_shared(tmp_path):
+    path = str(tmp_path / "kg_cache.json")
+    writer = GraphStore(FileGraphStore(path), poll_seconds=0)
+    reader = GraphStore(FileGraphStore(path), poll_seconds=0)
+
+    first = writer.put("graph", {"nodes": [{"id": "a"}], "links": []}, fingerprint="f1", etag="e1")
+    assert first.generation == 1
+    assert reader.get("graph").etag == "e1"
+
+    second = writer.put("graph", {"nodes": [{"id": "b"}], "links": []}, fingerprint="f2", etag="e2")
+    assert second.generation == 2
+    entry = reader.get("graph")
+    assert entry.generation == 2
+    assert entry.graph["nodes"] == [{"id": "b"}]
+
+
+def test_memo_skips_backend_reads_until_version_changes(tmp_path):
+    backend = FileGraphStore(str(tmp_path / "kg_cache.json"))
+    store = GraphStore(backend, poll_seconds=0)
+    store.put("graph", {"nodes": [], "links": []}, fingerprint=None, etag="e")
+
+    reads = {"count": 0}
+    original_read = backend.read
+
+    def counting_read(key):
+        reads["count"] += 1
+        return original_read(key)
+
+    backend.read = counting_read
+    for _ in range(5):
+        assert store.get("graph").etag == "e"
+    assert reads["count"] == 0
+
+    store.delete("graph")
+    assert store.get("graph") is None
+
+
+def test_incomplete_backend_fails_when_created():
+    class ReadOnly(GraphStoreBackend):
+        def version(self, key):
+            return None
+
+        def read(self, key):
+            return None
+
+    with pytest.raises(TypeError):
+        ReadOnly()
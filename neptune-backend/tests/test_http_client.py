@@ -0,0 +1,75 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app.services import http_client
+from app.services.http_client import HTTPPool
+
+
+def test_sync_and_async_requests_share_one_pool():
+    seen = []
+
+    async def handler(request):
+        seen.append((request.method, request.url.path))
+        return httpx.Response(200, json={"ok": True})
+
+    pool = HTTPPool(transport=httpx.MockTransport(handler))
+    try:
+        assert pool.post("http://ollama:11434/api/generate", json={"prompt": "x"}).json() == {"ok": True}
+
+        async def call():
+            response = await pool.request("GET", "http://ollama:11434/api/tags")
+            return response.status_code
+
+        assert asyncio.run(call()) == 200
+        assert seen == [("POST", "/api/generate"), ("GET", "/api/tags")]
+    finally:
+        pool.close()
+
+
+def test_requests_per_host_are_capped():
+    state = {"active": 0, "peak": 0}
+
+    async def handler(request):
+        state["active"] += 1
+        state["peak"] = max(state["peak"], state["active"])
+        await asyncio.sleep(0.02)
+        state["active"] -= 1
+        return httpx.Response(200)
+
+    original = http_client.settings.http_max_connections_per_host
+    object.__setattr__(http_client.settings, "http_max_connections_per_host", 2)
+    pool = HTTPPool(transport=httpx.MockTransport(handler))
+    try:
+
+        async def burst():
+            await asyncio.gather(*(pool.request("GET", "http://ollama:11434/api/tags") for _ in range(6)))
+
+        asyncio.run(burst())
+    finally:
+        pool.close()
+        object.__setattr__(http_client.settings, "http_max_connections_per_host", original)
+
+    assert state["peak"] == 2
+
+
+def test_stream_lines_yields_lines_and_raises_error_statuses():
+    async def handler(request):
+        if request.url.path == "/missing":
+            return httpx.Response(404, text="no")
+        return httpx.Response(200, content=b'{"response": "["}\n{"response": "]"}\n')
+
+    pool = HTTPPool(transport=httpx.MockTransport(handler))
+    try:
+        lines = pool.stream_lines("POST", "http://ollama:11434/api/generate", json={"stream": True})
+        assert next(lines) == '{"response": "["}'
+        lines.close()
+        assert list(pool.stream_lines("POST", "http://ollama:11434/api/generate")) == [
+            '{"response": "["}',
+            '{"response": "]"}',
+        ]
+        with pytest.raises(httpx.HTTPStatusError):
+            list(pool.stream_lines("GET", "http://ollama:11434/missing"))
+    finally:
+        pool.close()
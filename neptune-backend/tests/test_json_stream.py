@@ -0,0 +1,19 @@
+from app.services.json_stream import JSONListStream
+
+
+def test_items_are_returned_as_they_complete():
+    parser = JSONListStream()
+    assert parser.feed('Here you go: [{"id": "1", "topic": "a, [b]') == []
+    assert parser.feed('"}, {"id": ') == [{"id": "1", "topic": "a, [b]"}]
+    assert parser.feed('"2", "note": "say \\"hi\\" }"}') == [{"id": "2", "note": 'say "hi" }'}]
+    assert not parser.closed
+    assert parser.feed("] and some chatter [1]") == []
+    assert parser.closed
+    assert parser.text == '[{"id": "1", "topic": "a, [b]"}, {"id": "2", "note": "say \\"hi\\" }"}]'
+    assert len(parser.items) == 2
+
+
+def test_scalars_nested_lists_and_bad_items():
+    parser = JSONListStream()
+    assert parser.feed('[1, "two", [3, {"x": 4}], {bad}, true]') == [1, "two", [3, {"x": 4}], True]
+    assert parser.closed
@@ -0,0 +1,233 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.api.routes.knowledge_graph import router
+from app.db.models import Base, FileSystem
+from app.services import knowledge_graph
+from app.services.graph_edges import EdgeList
+from app.services.graph_store import FileGraphStore, GraphStore
+
+
+def _make_session():
+    engine = create_engine("sqlite:///:memory:", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    return sessionmaker(bind=engine)()
+
+
+def _graph():
+    return {
+        "nodes": [
+            {"id": "math", "label": "math", "topic": "math", "size": 40, "noteCount": 2,
+             "noteIds": ["1", "2"], "noteDetails": [{"id": 1, "name": "A"}, {"id": 2, "name": "B"}]},
+            {"id": "history", "label": "history", "topic": "history", "size": 20, "noteCount": 1,
+             "noteIds": ["3"], "noteDetails": [{"id": 3, "name": "C"}]},
+        ],
+        "links": [{"source": "math", "target": "history", "strength": 0.5}],
+    }
+
+
+def test_move_note_between_topics():
+    graph = _graph()
+    affected = knowledge_graph._move_note(graph, "2", "history", "B")
+
+    assert affected == {"math", "history"}
+    nodes = {node["id"]: node for node in graph["nodes"]}
+    assert nodes["math"]["noteIds"] == ["1"]
+    assert nodes["history"]["noteIds"] == ["3", "2"]
+    assert nodes["history"]["noteCount"] == 2
+
+
+def test_move_note_drops_empty_topic_and_links():
+    graph = _graph()
+    affected = knowledge_graph._move_note(graph, "3", None)
+
+    assert affected == {"history"}
+    assert [node["id"] for node in graph["nodes"]] == ["math"]
+    assert graph["links"] == []
+
+
+def test_rebuild_edges_only_rescored_for_affected():
+    graph = _graph()
+    graph["nodes"].append(
+        {"id": "biology", "label": "biology", "topic": "biology", "noteIds": ["4"], "noteDetails": []}
+    )
+    centroids = {"math": [1.0, 0.0], "history": [0.0, 1.0], "biology": [1.0, 0.1]}
+
+    knowledge_graph._rebuild_edges(graph, centroids, {"biology"})
+
+    pairs = {(link["source"], link["target"]) for link in graph["links"]}
+    assert ("math", "history") in pairs
+    assert ("biology", "math") in pairs
+    assert ("biology", "history") not in pairs
+
+
+def test_fingerprint_tracks_note_checksums():
+    db = _make_session()
+    try:
+        note = FileSystem(name="A", type="file", content="x", content_checksum="c1")
+        db.add(note)
+        db.commit()
+        first = knowledge_graph.compute_graph_fingerprint(db)
+        assert knowledge_graph.compute_graph_fingerprint(db) == first
+
+        note.content_checksum = "c2"
+        db.commit()
+        assert knowledge_graph.compute_graph_fingerprint(db) != first
+    finally:
+        db.close()
+
+
+def test_graph_endpoint_serves_etag_and_304(monkeypatch, tmp_path):
+    store = GraphStore(FileGraphStore(str(tmp_path / "kg_cache.json")), poll_seconds=0)
+    monkeypatch.setattr(knowledge_graph, "graph_store", store)
+    knowledge_graph.cache_graph_data(_graph(), fingerprint="f")
+
+    app = FastAPI()
+    app.include_router(router, prefix="/api/knowledge-graph")
+    client = TestClient(app)
+
+    first = client.get("/api/knowledge-graph/")
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+
+    second = client.get("/api/knowledge-graph/", headers={"If-None-Match": etag})
+    assert second.status_code == 304
+
+
+def test_neighbors_and_subgraph_endpoints(monkeypatch, tmp_path):
+    store = GraphStore(FileGraphStore(str(tmp_path / "kg_cache.json")), poll_seconds=0)
+    monkeypatch.setattr(knowledge_graph, "graph_store", store)
+    knowledge_graph.cache_graph_data(_graph(), fingerprint="f")
+
+    app = FastAPI()
+    app.include_router(router, prefix="/api/knowledge-graph")
+    client = TestClient(app)
+
+    neighbors = client.get("/api/knowledge-graph/neighbors", params={"topic": "math"}).json()
+    assert [node["id"] for node in neighbors["nodes"]] == ["math", "history"]
+    assert client.get("/api/knowledge-graph/neighbors", params={"topic": "nope"}).status_code == 404
+
+    subgraph = client.get("/api/knowledge-graph/subgraph", params={"note_ids": "3"}).json()
+    assert [node["id"] for node in subgraph["nodes"]] == ["history"]
+
+
+def test_graph_endpoint_filters_links_at_query_time(monkeypatch, tmp_path):
+    store = GraphStore(FileGraphStore(str(tmp_path / "kg_cache.json")), poll_seconds=0)
+    monkeypatch.setattr(knowledge_graph, "graph_store", store)
+    graph = _graph()
+    graph["nodes"].append(
+        {"id": "biology", "label": "biology", "topic": "biology", "noteIds": ["4"], "noteDetails": []}
+    )
+    edges = EdgeList.from_edges([("math", "history", 0.5), ("math", "biology", 0.15)], floor=0.1)
+    store.put(knowledge_graph.EDGE_LIST_KEY, edges.to_dict(), fingerprint="f", etag=None)
+    knowledge_graph.cache_graph_data(graph, fingerprint="f")
+
+    app = FastAPI()
+    app.include_router(router, prefix="/api/knowledge-graph")
+    client = TestClient(app)
+
+    default = client.get("/api/knowledge-graph/").json()
+    assert len(default["links"]) == 1
+
+    dense = client.get("/api/knowledge-graph/", params={"min_strength": 0.1})
+    assert {link["target"] for link in dense.json()["links"]} == {"history", "biology"}
+    assert dense.headers["etag"] != client.get("/api/knowledge-graph/").headers["etag"]
+
+    capped = client.get("/api/knowledge-graph/", params={"min_strength": 0.1, "max_degree": 1}).json()
+    assert capped["links"] == [{"source": "math", "target": "history", "strength": 0.5}]
+
+
+def test_graphs_are_cached_per_owner(monkeypatch, tmp_path):
+    store = GraphStore(FileGraphStore(str(tmp_path / "kg_cache.json")), poll_seconds=0)
+    monkeypatch.setattr(knowledge_graph, "graph_store", store)
+    knowledge_graph.cache_graph_data(_graph(), fingerprint="f", owner_id="alice")
+
+    app = FastAPI()
+    app.include_router(router, prefix="/api/knowledge-graph")
+    client = TestClient(app)
+
+    assert len(client.get("/api/knowledge-graph/", params={"owner_id": "alice"}).json()["nodes"]) == 2
+    assert client.get("/api/knowledge-graph/").json()["nodes"] == []
+    assert client.get("/api/knowledge-graph/", params={"owner_id": "bob"}).json()["nodes"] == []
+
+
+def test_fingerprint_is_scoped_to_owner():
+    db = _make_session()
+    try:
+        db.add(FileSystem(name="A", type="file", content="x", content_checksum="c1", owner_id="alice"))
+        db.add(FileSystem(name="B", type="file", content="y", content_checksum="c2", owner_id="bob"))
+        db.commit()
+        alice = knowledge_graph.compute_graph_fingerprint(db, "alice")
+
+        db.add(FileSystem(name="C", type="file", content="z", content_checksum="c3", owner_id="bob"))
+        db.commit()
+        assert knowledge_graph.compute_graph_fingerprint(db, "alice") == alice
+        assert knowledge_graph.compute_graph_fingerprint(db, "bob") != alice
+    finally:
+        db.close()
+
+
+def test_generation_that_lost_its_lease_writes_nothing(monkeypatch, tmp_path):
+    from sqlalchemy.pool import StaticPool
+
+    from app.services import generation_lease
+    from app.services.graph_pipeline import PipelineResult
+
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(bind=engine)
+    monkeypatch.setattr(generation_lease, "SessionLocal", factory)
+    monkeypatch.setattr(knowledge_graph, "SessionLocal", factory)
+    store = GraphStore(FileGraphStore(str(tmp_path / "kg_cache.json")), poll_seconds=0)
+    monkeypatch.setattr(knowledge_graph, "graph_store", store)
+    monkeypatch.setattr(knowledge_graph, "refresh_note_graph", lambda **kwargs: None)
+    tenant = knowledge_graph._tenant("lease-test")
+
+    def pipeline(cancel=None, **kwargs):
+        # Another replica renewed past us while the pipeline ran.
+        cancel.set()
+        return PipelineResult(topic_map={"math": ["1"]}, notes_seen=1, notes_with_content=1, notes_assigned=1)
+
+    monkeypatch.setattr(knowledge_graph, "run_graph_pipeline", pipeline)
+    try:
+        knowledge_graph.generate_knowledge_graph_background("lease-test")
+    finally:
+        tenant.lease.lost.clear()
+
+    assert tenant.status["progress"] == "lease_lost"
+    assert store.get(knowledge_graph.scoped_key(knowledge_graph.GRAPH_CACHE_KEY, "lease-test")) is None
+    assert store.get(knowledge_graph.scoped_key(knowledge_graph.EDGE_LIST_KEY, "lease-test")) is None
+
+
+def test_note_delta_takes_the_owner_lease(monkeypatch, tmp_path):
+    from sqlalchemy.pool import StaticPool
+
+    from app.services import generation_lease
+    from app.services.generation_lease import GenerationLease
+
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(bind=engine)
+    monkeypatch.setattr(generation_lease, "SessionLocal", factory)
+    tenant = knowledge_graph._tenant("delta-test")
+    seen = []
+
+    def patch(tenant, note_id, deleted, owner_id):
+        seen.append(tenant.lease.read().holder)
+        return True
+
+    monkeypatch.setattr(knowledge_graph, "_patch_note", patch)
+    other = GenerationLease(tenant.lease.name, 60)
+    assert other.try_acquire()
+    try:
+        # Another replica is generating or patching this owner's graph.
+        assert knowledge_graph.apply_note_change(1, owner_id="delta-test") is False
+    finally:
+        other.release()
+
+    assert knowledge_graph.apply_note_change(1, owner_id="delta-test") is True
+    assert seen == [tenant.lease.holder_id]
+    assert tenant.lease.read().holder is None
+    assert not tenant.lock.locked()
@@ -0,0 +1,100 @@
+import importlib
+import threading
+import time
+from types import SimpleNamespace
+
+from app.services import llm_cache
+from app.services.llm_cache import LLMResponseCache, SingleFlight, request_key
+
+
+def test_single_flight_shares_concurrent_calls():
+    flight = SingleFlight()
+    calls = {"count": 0}
+    results = []
+
+    def slow():
+        calls["count"] += 1
+        time.sleep(0.05)
+        return "answer"
+
+    threads = [threading.Thread(target=lambda: results.append(flight.do("k", slow))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert calls["count"] == 1
+    assert sorted(shared for _, shared in results) == [False, True, True, True]
+    assert {result for result, _ in results} == {"answer"}
+
+
+def test_response_cache_round_trips_and_respects_mode(tmp_path):
+    cache = LLMResponseCache(str(tmp_path / "kg.llm.sqlite"))
+    assert cache.get("missing") is None
+    key = request_key("llama", "prompt", {"temperature": 0.7})
+    assert key != request_key("llama", "prompt", {"temperature": 0.0})
+    cache.set(key, "[]")
+    assert LLMResponseCache(cache.path).get(key) == "[]"
+
+    original = llm_cache.settings.llm_response_cache
+    try:
+        object.__setattr__(llm_cache.settings, "llm_response_cache", "deterministic")
+        assert not cache.cacheable({"temperature": 0.7})
+        assert cache.cacheable({"temperature": 0.0})
+        object.__setattr__(llm_cache.settings, "llm_response_cache", "off")
+        assert not cache.cacheable({"temperature": 0.0})
+    finally:
+        object.__setattr__(llm_cache.settings, "llm_response_cache", original)
+
+
+def test_repeated_prompt_is_served_from_cache(tmp_path, monkeypatch):
+    llm_module = importlib.import_module("app.services.llm_service")
+    monkeypatch.setattr(llm_module, "llm_response_cache", LLMResponseCache(str(tmp_path / "kg.llm.sqlite")))
+    service = llm_module.LLMService()
+    service._checked_models = True
+    calls = {"count": 0}
+
+    def post(*args, **kwargs):
+        calls["count"] += 1
+        return SimpleNamespace(status_code=200, json=lambda: {"response": "calculus"})
+
+    service.http = SimpleNamespace(post=post)
+    assert service._call_ollama("topic?", max_tokens=5) == "calculus"
+    assert service._call_ollama("topic?", max_tokens=5) == "calculus"
+    assert calls["count"] == 1
+    assert service.metrics()["cache_hits"] == 1
+
+
+def test_unusable_answers_are_not_cached_and_retries_reach_the_model(tmp_path, monkeypatch):
+    llm_module = importlib.import_module("app.services.llm_service")
+    monkeypatch.setattr(llm_module, "llm_response_cache", LLMResponseCache(str(tmp_path / "kg.llm.sqlite")))
+    answers = iter(["Sorry, I cannot", '[{"id": "1", "topic": "Algebra"}]', "", ""])
+    calls = {"count": 0}
+
+    def post(*args, **kwargs):
+        calls["count"] += 1
+        answer = next(answers)
+        return SimpleNamespace(status_code=200, json=lambda: {"response": answer})
+
+    original = llm_module.settings.llm_stream
+    object.__setattr__(llm_module.settings, "llm_stream", False)
+    try:
+        service = llm_module.LLMService()
+        service._checked_models = True
+        service.http = SimpleNamespace(post=post)
+        notes = [{"id": "1", "content": "x"}]
+        # The retry repeats the same prompt and must not be served the bad answer.
+        assert service.extract_topics_batch(notes) == [{"topic": "algebra", "note_id": "1"}]
+        assert calls["count"] == 2
+
+        fresh = llm_module.LLMService()
+        fresh._checked_models = True
+        fresh.http = SimpleNamespace(post=post)
+        assert fresh.extract_topics_batch(notes) == [{"topic": "algebra", "note_id": "1"}]
+        assert calls["count"] == 2
+
+        assert service._call_ollama("topic?", max_tokens=5) == ""
+        assert service._call_ollama("topic?", max_tokens=5) == ""
+        assert calls["count"] == 4
+    finally:
+        object.__setattr__(llm_module.settings, "llm_stream", original)
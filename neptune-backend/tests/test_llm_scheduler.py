@@ -0,0 +1,104 @@
+import threading
+import time
+
+import pytest
+
+from app.services.llm_scheduler import LLMBusyError, LLMScheduler, Priority
+
+
+def _wait_until(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline
+        time.sleep(0.005)
+
+
+def test_interactive_uses_reserved_slot_while_backfill_saturates():
+    scheduler = LLMScheduler(slots=2, reserved=1)
+    bulk = scheduler.acquire(Priority.BACKFILL, "a", timeout=1)
+    with pytest.raises(LLMBusyError):
+        scheduler.acquire(Priority.BACKFILL, "b", timeout=0.05)
+    interactive = scheduler.acquire(Priority.INTERACTIVE, timeout=0.05)
+    scheduler.release(interactive)
+    scheduler.release(bulk)
+
+
+def test_waiters_are_served_by_priority_then_owner_round_robin():
+    scheduler = LLMScheduler(slots=1, reserved=0)
+    holder = scheduler.acquire(Priority.BACKFILL, "a", timeout=1)
+    order = []
+
+    def wait(priority, owner, label):
+        waiter = scheduler.acquire(priority, owner, timeout=2)
+        order.append(label)
+        scheduler.release(waiter)
+
+    threads = []
+    for priority, owner, label in [
+        (Priority.BACKFILL, "a", "a1"),
+        (Priority.BACKFILL, "a", "a2"),
+        (Priority.BACKFILL, "b", "b1"),
+        (Priority.INTERACTIVE, None, "ui"),
+    ]:
+        thread = threading.Thread(target=wait, args=(priority, owner, label))
+        thread.start()
+        threads.append(thread)
+        _wait_until(lambda n=len(threads): sum(scheduler.status()["waiting"].values()) == n)
+
+    scheduler.release(holder)
+    for thread in threads:
+        thread.join()
+    assert order == ["ui", "a1", "b1", "a2"]
+
+
+def test_full_queue_pushes_back_immediately():
+    scheduler = LLMScheduler(slots=1, reserved=0, max_waiting=1)
+    holder = scheduler.acquire(Priority.INCREMENTAL, timeout=1)
+    errors = []
+
+    def wait():
+        try:
+            scheduler.acquire(Priority.INCREMENTAL, timeout=0.3)
+        except LLMBusyError as e:
+            errors.append(e)
+
+    waiter = threading.Thread(target=wait)
+    waiter.start()
+    _wait_until(lambda: scheduler.status()["waiting"]["incremental"] == 1)
+    started = time.monotonic()
+    with pytest.raises(LLMBusyError):
+        scheduler.acquire(Priority.INCREMENTAL, timeout=5)
+    assert time.monotonic() - started < 0.1
+    waiter.join()
+    scheduler.release(holder)
+    assert len(errors) == 1
+    assert scheduler.status()["waiting"]["incremental"] == 0
+
+
+def test_embeddings_are_admitted_by_the_scheduler():
+    from types import SimpleNamespace
+
+    from app.services import llm_scheduler
+    from app.services.embeddings import EmbeddingService
+    from app.services.llm_scheduler import llm_priority
+    from app.services.ollama_pool import OllamaPool
+
+    scheduler = LLMScheduler(slots=2, reserved=1)
+    service = EmbeddingService(pool=OllamaPool("http://a|4"), scheduler=scheduler)
+    service.http = SimpleNamespace(
+        post=lambda url, json=None, timeout=None: SimpleNamespace(
+            status_code=200, raise_for_status=lambda: None, json=lambda: {"embedding": [1.0, 0.0]}
+        )
+    )
+    holder = scheduler.acquire(Priority.BACKFILL, "a", timeout=1)
+    original = llm_scheduler.settings.llm_deadline_backfill_seconds
+    try:
+        object.__setattr__(llm_scheduler.settings, "llm_deadline_backfill_seconds", 0.05)
+        with llm_priority(Priority.BACKFILL, "b"), pytest.raises(LLMBusyError):
+            service.embed("generation")
+    finally:
+        object.__setattr__(llm_scheduler.settings, "llm_deadline_backfill_seconds", original)
+    # The reserved slot stays available to interactive embeddings (search).
+    assert service.embed("search").vector == [1.0, 0.0]
+    scheduler.release(holder)
+    assert scheduler.status()["active"] == 0
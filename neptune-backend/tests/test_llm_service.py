@@ -1,6 +1,10 @@
 import importlib
 from types import SimpleNamespace
 
+import pytest
+
+from app.services.llm_cache import LLMResponseCache
+
 
 def test_llm_cooldown(monkeypatch):
     monkeypatch.setenv("OLLAMA_MAX_RETRIES", "0")
@@ -8,6 +12,7 @@ def test_llm_cooldown(monkeypatch):
     monkeypatch.setenv("OLLAMA_COOLDOWN_SECONDS", "60")
 
     settings_module = importlib.reload(importlib.import_module("app.core.settings"))
+    importlib.reload(importlib.import_module("app.services.ollama_pool"))
     llm_module = importlib.reload(importlib.import_module("app.services.llm_service"))
 
     service = llm_module.LLMService()
@@ -16,14 +21,101 @@ def test_llm_cooldown(monkeypatch):
 
     def failing_post(*args, **kwargs):
         calls["count"] += 1
-        raise llm_module.requests.exceptions.Timeout()
+        raise llm_module.httpx.TimeoutException("timed out")
+
+    def offline_get(*args, **kwargs):
+        raise llm_module.httpx.ConnectError("offline")
 
-    service.session.post = failing_post
+    service.http = SimpleNamespace(post=failing_post, get=offline_get)
 
-    result = service._call_ollama("test", max_tokens=1)
-    assert result == "unclassified"
+    with pytest.raises(llm_module.LLMUnavailableError):
+        service._call_ollama("test", max_tokens=1)
     assert calls["count"] == 1
 
-    result_again = service._call_ollama("test", max_tokens=1)
-    assert result_again == "unclassified"
+    with pytest.raises(llm_module.LLMUnavailableError):
+        service._call_ollama("test", max_tokens=1)
     assert calls["count"] == 1
+
+
+def test_topic_batch_retries_only_missing_notes():
+    llm_module = importlib.import_module("app.services.llm_service")
+    service = llm_module.LLMService()
+    prompts_seen = []
+    responses = iter(
+        [
+            '[{"id": "1", "topic": "Algebra"}, {"id": "2", "topic": "hist',
+            '[{"id": "2", "topic": "history"}, {"id": "3", "topic": "art"}]',
+        ]
+    )
+
+    def fake_call(prompt, max_tokens=10, **kwargs):
+        prompts_seen.append(prompt)
+        return next(responses)
+
+    service._call_ollama = fake_call
+    notes = [{"id": str(i), "content": f"note {i}"} for i in (1, 2, 3)]
+    results = {item["note_id"]: item["topic"] for item in service.extract_topics_batch(notes)}
+
+    assert results == {"1": "algebra", "2": "history", "3": "art"}
+    assert "NoteID: 1" not in prompts_seen[1]
+    assert "NoteID: 2" in prompts_seen[1] and "NoteID: 3" in prompts_seen[1]
+
+
+def test_scoring_and_naming_surface_backpressure():
+    from app.services.llm_scheduler import LLMBusyError
+
+    llm_module = importlib.import_module("app.services.llm_service")
+    service = llm_module.LLMService()
+    answers = iter(["not json", '{"a": "x"}'])
+
+    def busy(prompt, **kwargs):
+        raise LLMBusyError("queue full")
+
+    service._call_ollama = lambda prompt, **kwargs: next(answers)
+    assert service.score_relationships_batch([{"a": "x", "b": "y"}]) == []
+    assert service.name_clusters([{"id": "0", "keywords": ["x"], "titles": []}]) == {}
+
+    service._call_ollama = busy
+    with pytest.raises(LLMBusyError):
+        service.score_relationships_batch([{"a": "x", "b": "y"}])
+    with pytest.raises(LLMBusyError):
+        service.name_clusters([{"id": "0", "keywords": ["x"], "titles": []}])
+
+
+def test_streamed_topics_are_delivered_and_generation_stops_at_list_end(tmp_path, monkeypatch):
+    llm_module = importlib.import_module("app.services.llm_service")
+    monkeypatch.setattr(llm_module, "llm_response_cache", LLMResponseCache(str(tmp_path / "kg.llm.sqlite")))
+    service = llm_module.LLMService(pool=llm_module.OllamaPool("http://ollama"))
+    service._checked_models = True
+    tokens = ['[{"id": "1", "topic": "Alg', 'ebra"}, ', '{"id": "2", "topic": "history"}', "]", " Sure! Here", " is more"]
+    seen = {"lines": 0, "closed": False, "request": None}
+    delivered = []
+
+    def stream_lines(method, url, json=None, timeout=None):
+        seen["request"] = json
+        try:
+            for token in tokens:
+                seen["lines"] += 1
+                yield llm_module.json.dumps({"response": token, "done": False})
+        finally:
+            seen["closed"] = True
+
+    def offline_get(*args, **kwargs):
+        raise llm_module.httpx.ConnectError("offline")
+
+    service.http = SimpleNamespace(stream_lines=stream_lines, get=offline_get)
+    notes = [{"id": "1", "content": "x"}, {"id": "2", "content": "y"}]
+    original = llm_module.settings.llm_stream
+    object.__setattr__(llm_module.settings, "llm_stream", True)
+    try:
+        results = service.extract_topics_batch(
+            notes, on_topic=lambda note_id, topic: delivered.append((note_id, topic))
+        )
+    finally:
+        object.__setattr__(llm_module.settings, "llm_stream", original)
+
+    assert delivered == [("1", "algebra"), ("2", "history")]
+    assert {item["note_id"] for item in results} == {"1", "2"}
+    assert seen["lines"] == 4 and seen["closed"]
+    assert seen["request"]["stream"] is True and seen["request"]["format"]["type"] == "array"
+    assert service.metrics()["early_stops"] == 1
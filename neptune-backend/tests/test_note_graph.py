@@ -0,0 +1,48 @@
+import numpy as np
+
+from app.services import note_graph
+from app.services.note_graph import knn_edges
+
+
+def _vectors():
+    vectors = np.asarray(
+        [
+            [1.0, 0.0, 0.0],
+            [0.95, 0.05, 0.0],
+            [0.9, 0.1, 0.0],
+            [0.0, 0.0, 1.0],
+            [0.0, 0.1, 0.95],
+        ],
+        dtype="float32",
+    )
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def test_knn_edges_link_only_close_notes_once():
+    edges = knn_edges(np.asarray([10, 11, 12, 20, 21]), _vectors(), top_k=2, min_score=0.5)
+
+    pairs = {(a, b) for a, b, _ in edges}
+    assert pairs == {(10, 11), (10, 12), (11, 12), (20, 21)}
+    assert all(0.5 <= score <= 1.0 for _, _, score in edges)
+
+
+def test_ivf_search_matches_exact_neighbours():
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(8, 16)).astype("float32")
+    vectors = centers[np.arange(400) % 8] + 0.05 * rng.normal(size=(400, 16)).astype("float32")
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    ids = np.arange(400)
+
+    settings = note_graph.settings
+    original = settings.kg_note_ivf_threshold
+    try:
+        object.__setattr__(settings, "kg_note_ivf_threshold", 100000)
+        exact = {(a, b) for a, b, _ in knn_edges(ids, vectors, top_k=3, min_score=0.9)}
+        object.__setattr__(settings, "kg_note_ivf_threshold", 10)
+        approx = {(a, b) for a, b, _ in knn_edges(ids, vectors, top_k=3, min_score=0.9)}
+    finally:
+        object.__setattr__(settings, "kg_note_ivf_threshold", original)
+
+    # Same-cluster pairs only; the IVF path should recover nearly all of them.
+    assert all(a % 8 == b % 8 for a, b in approx)
+    assert len(approx & exact) >= 0.9 * len(exact)
@@ -0,0 +1,84 @@
+from types import SimpleNamespace
+
+import pytest
+
+from app.services import ollama_pool as ollama_pool_module
+from app.services.llm_scheduler import LLMBusyError, LLMUnavailableError
+from app.services.ollama_pool import OllamaPool
+
+
+def _override(**values):
+    settings = ollama_pool_module.settings
+    original = {key: getattr(settings, key) for key in values}
+    for key, value in values.items():
+        object.__setattr__(settings, key, value)
+    return original
+
+
+def test_routes_to_least_loaded_endpoint_within_limits():
+    pool = OllamaPool("http://a|2,http://b|1")
+    assert pool.capacity == 3
+    first, second, third = (pool.acquire(timeout=1) for _ in range(3))
+    assert [first.url, second.url, third.url] == ["http://a", "http://b", "http://a"]
+    with pytest.raises(LLMBusyError):
+        pool.acquire(timeout=0.05)
+    pool.release(second, ok=True)
+    assert pool.acquire(timeout=1).url == "http://b"
+
+
+def test_breaker_opens_then_half_open_probe_closes_it():
+    original = _override(ollama_failure_threshold=2, ollama_cooldown_seconds=0)
+    try:
+        pool = OllamaPool("http://a|1,http://b|1")
+        a = pool.endpoints[0]
+        for _ in range(2):
+            endpoint = pool.acquire(timeout=1)
+            assert endpoint is a
+            pool.release(endpoint, ok=False)
+        assert a.state == "open"
+
+        # Cooldown elapsed: the next request to ``a`` is the single probe.
+        probe = pool.acquire(timeout=1)
+        assert probe is a and a.state == "half_open"
+        assert pool.acquire(timeout=1).url == "http://b"
+        pool.release(probe, ok=True)
+        assert a.state == "closed" and a.failures == 0
+    finally:
+        _override(**original)
+
+
+def test_all_open_endpoints_raise_unavailable():
+    original = _override(ollama_failure_threshold=1, ollama_cooldown_seconds=60)
+    try:
+        pool = OllamaPool("http://a")
+        pool.release(pool.acquire(timeout=1), ok=False)
+        with pytest.raises(LLMUnavailableError):
+            pool.acquire(timeout=1)
+    finally:
+        _override(**original)
+
+
+def test_requests_go_only_to_endpoints_serving_the_model():
+    tags = {
+        "http://a": ["llama3.1:8b"],
+        "http://b": ["nomic-embed-text:latest"],
+    }
+
+    def get(url, timeout=None):
+        host = url.rsplit("/api/tags", 1)[0]
+        return SimpleNamespace(status_code=200, json=lambda: {"models": [{"name": n} for n in tags[host]]})
+
+    pool = OllamaPool("http://a,http://b")
+    assert pool.refresh_models(SimpleNamespace(get=get)) == {"llama3.1:8b", "nomic-embed-text:latest"}
+    assert pool.acquire("nomic-embed-text", timeout=1).url == "http://b"
+    assert pool.acquire("llama3.1:8b", timeout=1).url == "http://a"
+    with pytest.raises(LLMUnavailableError):
+        pool.acquire("mistral", timeout=1)
+
+
+def test_set_endpoints_keeps_state_of_known_urls():
+    pool = OllamaPool("http://a,http://b")
+    held = pool.acquire(timeout=1)
+    pool.set_endpoints(["http://a|8", "http://c"])
+    assert pool.urls() == ["http://a", "http://c"]
+    assert pool.endpoints[0] is held and held.limit == 8
@@ -12,3 +12,12 @@ def test_relationship_prompt_pairs():
     pairs = [{"a": "foo", "b": "bar"}]
     prompt = prompts.relationship_prompt(pairs)
     assert "foo | bar" in prompt
+
+
+def test_topic_batches_fit_token_budget():
+    notes = [{"id": str(i), "content": "word " * 200} for i in range(5)]
+    cost = prompts.topic_note_tokens(notes[0])
+    batches = prompts.pack_topic_batches(notes, token_budget=cost * 2, max_notes=8)
+    assert [len(batch) for batch in batches] == [2, 2, 1]
+    assert [len(batch) for batch in prompts.pack_topic_batches(notes, token_budget=10**6, max_notes=3)] == [3, 2]
+    assert [len(batch) for batch in prompts.pack_topic_batches(notes, token_budget=1, max_notes=8)] == [1] * 5
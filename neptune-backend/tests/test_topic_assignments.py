@@ -0,0 +1,91 @@
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.core import settings as settings_module
+from app.db.models import Base, FileSystem, NoteTopic, Topic
+from app.services.search import search_notes
+from app.services.topic_assignments import (
+    ensure_topic_schema,
+    record_assignments,
+    remove_assignments,
+    stored_topics,
+    topic_note_ids_query,
+)
+
+
+def _make_session():
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    Base.metadata.create_all(bind=engine)
+    return sessionmaker(bind=engine)()
+
+
+def _note(db, name, checksum, owner_id=None, content="notes"):
+    item = FileSystem(name=name, type="file", content=content, content_checksum=checksum, owner_id=owner_id)
+    db.add(item)
+    db.flush()
+    return item
+
+
+def test_record_assignments_upserts_one_row_per_prompt_version():
+    db = _make_session()
+    note = _note(db, "A", "c1")
+    record_assignments(db, [(note.id, "calculus", "c1")], prompt_version="v1")
+    record_assignments(db, [(note.id, "algebra", "c1")], prompt_version="v1")
+    record_assignments(db, [(note.id, "math", "c1")], prompt_version="v2")
+    db.commit()
+
+    rows = {row.prompt_version: row.topic.name for row in db.query(NoteTopic)}
+    assert rows == {"v1": "algebra", "v2": "math"}
+    assert db.query(Topic).count() == 3
+
+    remove_assignments(db, note.id)
+    db.commit()
+    assert db.query(NoteTopic).count() == 0
+
+
+def test_stale_checksums_are_ignored():
+    db = _make_session()
+    fresh = _note(db, "Fresh", "c1")
+    stale = _note(db, "Stale", "c2")
+    record_assignments(db, [(fresh.id, "calculus", "c1"), (stale.id, "calculus", "c2")], prompt_version="v1")
+    stale.content_checksum = "c3"
+    db.commit()
+
+    assert stored_topics(db, [(fresh.id, "c1"), (stale.id, "c3")], prompt_version="v1") == {fresh.id: "calculus"}
+    ids = [note_id for (note_id,) in topic_note_ids_query(db, "calculus", prompt_version="v1")]
+    assert ids == [fresh.id]
+
+
+def test_search_filters_by_topic():
+    db = _make_session()
+    first = _note(db, "Limits", "c1", content="calculus limits")
+    edited = _note(db, "Rome", "c2", content="calculus of rome")
+    record_assignments(db, [(first.id, "calculus", "c1"), (edited.id, "calculus", "c2")])
+    # Edited since it was classified: its assignment is out of date.
+    edited.content_checksum = "c3"
+    db.commit()
+
+    original = settings_module.settings.search_mode
+    try:
+        object.__setattr__(settings_module.settings, "search_mode", "fallback")
+        assert len(search_notes(db, "calculus")) == 2
+        assert [item.id for item in search_notes(db, "calculus", topic="calculus")] == [first.id]
+    finally:
+        object.__setattr__(settings_module.settings, "search_mode", original)
+
+
+def test_ensure_topic_schema_replaces_empty_legacy_table():
+    engine = create_engine("sqlite://", poolclass=StaticPool)
+    with engine.begin() as connection:
+        connection.execute(
+            text("CREATE TABLE note_topics (id INTEGER PRIMARY KEY, note_id INTEGER, topic_id INTEGER)")
+        )
+    ensure_topic_schema(engine)
+
+    columns = {column["name"] for column in inspect(engine).get_columns("note_topics")}
+    assert {"file_id", "prompt_version", "content_checksum"} <= columns
@@ -0,0 +1,111 @@
+import json
+import threading
+
+from app.services import topic_cache as topic_cache_module
+from app.services.topic_cache import PairScoreCache, TopicCache
+
+
+def test_topic_cache_round_trips_through_sqlite(tmp_path):
+    path = str(tmp_path / "kg.topics.sqlite")
+    cache = TopicCache(path)
+    cache.set("1", "c1", "calculus")
+    cache.set("2", "c2", "history")
+    assert cache.get("1", "c1") == "calculus"
+    cache.flush()
+
+    reopened = TopicCache(path)
+    assert reopened.get("1", "c1") == "calculus"
+    assert reopened.get("2", "stale") is None
+    assert len(reopened) == 2
+
+    reopened.forget("2")
+    assert reopened.get("2", "c2") is None
+    assert TopicCache(path).get("2", "c2") is None
+
+
+def test_concurrent_writers_do_not_lose_updates(tmp_path):
+    path = str(tmp_path / "kg.topics.sqlite")
+    backend, indexer = TopicCache(path), TopicCache(path)
+    backend.set("1", "c1", "calculus")
+    indexer.set("2", "c2", "history")
+    backend.flush()
+    indexer.flush()
+
+    merged = TopicCache(path)
+    assert merged.get("1", "c1") == "calculus"
+    assert merged.get("2", "c2") == "history"
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    path = str(tmp_path / "kg.topics.sqlite")
+    original = topic_cache_module.settings.kg_topic_cache_max_entries
+    object.__setattr__(topic_cache_module.settings, "kg_topic_cache_max_entries", 2)
+    try:
+        cache = TopicCache(path)
+        cache.set("1", "c1", "a")
+        cache.set("2", "c2", "b")
+        cache.flush()
+        assert cache.get("1", "c1") == "a"
+        cache.flush()
+        cache.set("3", "c3", "c")
+        cache.flush()
+    finally:
+        object.__setattr__(topic_cache_module.settings, "kg_topic_cache_max_entries", original)
+
+    reopened = TopicCache(path)
+    assert len(reopened) == 2
+    assert reopened.get("2", "c2") is None
+    assert reopened.get("1", "c1") == "a"
+
+
+def test_legacy_json_cache_is_imported(tmp_path):
+    original = topic_cache_module.settings.kg_cache_path
+    object.__setattr__(topic_cache_module.settings, "kg_cache_path", str(tmp_path / "kg.json"))
+    try:
+        legacy = tmp_path / f"kg.topics.{topic_cache_module.settings.llm_prompt_version}.json"
+        legacy.write_text(json.dumps({"7": {"checksum": "c7", "topic": "geometry"}}))
+        cache = TopicCache()
+        assert cache.get("7", "c7") == "geometry"
+        assert not legacy.exists()
+    finally:
+        object.__setattr__(topic_cache_module.settings, "kg_cache_path", original)
+
+
+def test_pair_scores_share_the_sqlite_database_across_concurrent_batches(tmp_path):
+    path = str(tmp_path / "kg.topics.sqlite")
+    cache = PairScoreCache(path)
+
+    def batch(start):
+        for i in range(start, start + 50):
+            cache.set(f"t{i}", "hub", i / 100)
+        cache.flush()
+
+    threads = [threading.Thread(target=batch, args=(start,)) for start in (0, 50)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    reopened = PairScoreCache(path)
+    assert reopened.get("hub", "t7") == 0.07
+    hits, misses = reopened.split([("t99", "hub"), ("hub", "other")])
+    assert hits == {("t99", "hub"): 0.99} and misses == [("hub", "other")]
+    # Topics and pair scores live in the same file.
+    topics = TopicCache(path)
+    topics.set("1", "c1", "calculus")
+    topics.flush()
+    assert TopicCache(path).get("1", "c1") == "calculus"
+    assert PairScoreCache(path).get("t0", "hub") == 0.0
+
+
+def test_legacy_pair_scores_are_imported(tmp_path):
+    original = topic_cache_module.settings.kg_cache_path
+    object.__setattr__(topic_cache_module.settings, "kg_cache_path", str(tmp_path / "kg.json"))
+    try:
+        legacy = tmp_path / f"kg.pairs.{topic_cache_module.settings.llm_prompt_version}.json"
+        legacy.write_text(json.dumps({"algebra\x1fcalculus": 0.6}))
+        cache = PairScoreCache()
+        assert cache.get("calculus", "algebra") == 0.6
+        assert not legacy.exists()
+    finally:
+        object.__setattr__(topic_cache_module.settings, "kg_cache_path", original)
@@ -0,0 +1,98 @@
+from app.services import visualize_topics
+from app.services.visualize_topics import compute_topic_centroids, relationships_from_centroids
+
+
+def test_centroids_are_segment_means():
+    centroids = compute_topic_centroids(
+        {"math": ["1", "2"], "history": ["3", "x"], "empty": ["9"]},
+        {1: [1.0, 0.0], 2: [0.0, 1.0], 3: [2.0, 2.0]},
+    )
+
+    assert centroids == {"math": [0.5, 0.5], "history": [2.0, 2.0]}
+
+
+def test_dense_and_knn_modes_agree_on_nearest_pairs():
+    vectors = {
+        "a": [1.0, 0.0, 0.0],
+        "a2": [0.95, 0.05, 0.0],
+        "b": [0.0, 1.0, 0.0],
+        "b2": [0.05, 0.95, 0.0],
+        "c": [0.0, 0.0, 1.0],
+    }
+    settings = visualize_topics.settings
+    original = (settings.kg_knn_threshold, settings.kg_knn_neighbors)
+    try:
+        object.__setattr__(settings, "kg_knn_threshold", 100)
+        dense = {(a, b) for a, b, _ in relationships_from_centroids(vectors)}
+        object.__setattr__(settings, "kg_knn_threshold", 2)
+        object.__setattr__(settings, "kg_knn_neighbors", 1)
+        knn = {(a, b) for a, b, _ in relationships_from_centroids(vectors)}
+    finally:
+        object.__setattr__(settings, "kg_knn_threshold", original[0])
+        object.__setattr__(settings, "kg_knn_neighbors", original[1])
+
+    assert dense == {("a", "a2"), ("b", "b2")}
+    assert knn == dense
+
+
+def test_llm_mode_scores_only_candidates_and_caches(monkeypatch, tmp_path):
+    from app.services.topic_cache import PairScoreCache
+
+    cache = PairScoreCache(str(tmp_path / "kg.topics.sqlite"))
+    monkeypatch.setattr(visualize_topics, "pair_score_cache", cache)
+
+    calls = []
+
+    def _score(batch):
+        calls.extend(batch)
+        return [{"a": pair["a"], "b": pair["b"], "score": 0.8} for pair in batch]
+
+    monkeypatch.setattr(visualize_topics.llm_service, "score_relationships_batch", _score)
+
+    topic_note_map = {f"topic {i}": {str(i)} for i in range(40)}
+    topic_note_map["linear algebra"] = {"100"}
+    topic_note_map["abstract algebra"] = {"101"}
+    vectors = {topic: [float(i), 1.0] for i, topic in enumerate(topic_note_map)}
+
+    edges = visualize_topics.find_topic_relationships(topic_note_map, topic_vectors=vectors)
+
+    all_pairs = len(topic_note_map) * (len(topic_note_map) - 1) // 2
+    assert len(calls) < all_pairs / 4
+    assert ("abstract algebra", "linear algebra") in {(a, b) for a, b, _ in edges}
+
+    calls.clear()
+    visualize_topics.find_topic_relationships(topic_note_map, topic_vectors=vectors)
+    assert calls == []
+
+
+def test_busy_batches_are_retried_and_an_outage_falls_back_uncached(monkeypatch, tmp_path):
+    from app.services import llm_scheduler
+    from app.services.llm_scheduler import LLMBusyError, LLMUnavailableError
+    from app.services.topic_cache import PairScoreCache
+
+    cache = PairScoreCache(str(tmp_path / "kg.topics.sqlite"))
+    monkeypatch.setattr(visualize_topics, "pair_score_cache", cache)
+    monkeypatch.setattr(llm_scheduler.time, "sleep", lambda seconds: None)
+    answers = [LLMBusyError("queue full"), "score", LLMUnavailableError("down")]
+
+    def _score(batch):
+        answer = answers.pop(0)
+        if isinstance(answer, Exception):
+            raise answer
+        return [{"a": pair["a"], "b": pair["b"], "score": 0.9} for pair in batch]
+
+    monkeypatch.setattr(visualize_topics.llm_service, "score_relationships_batch", _score)
+    settings = visualize_topics.settings
+    original = settings.llm_relationship_batch_size
+    try:
+        object.__setattr__(settings, "llm_relationship_batch_size", 1)
+        edges = visualize_topics.find_topic_relationships({"a": {"1"}, "b": {"1"}, "c": {"2"}})
+    finally:
+        object.__setattr__(settings, "llm_relationship_batch_size", original)
+
+    assert answers == []
+    scores = {(a, b): score for a, b, score in edges}
+    assert scores[("a", "b")] == 0.9
+    assert set(scores) == {("a", "b"), ("a", "c"), ("b", "c")}
+    cached, misses = cache.split([("a", "b"), ("a", "c"), ("b", "c")])
+    assert list(cached) == [("a", "b")] and misses == [("a", "c"), ("b", "c")]
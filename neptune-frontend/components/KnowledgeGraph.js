@@ -400,6 +400,25 @@ const GraphScene = ({ data, onSelectNode, onNodeHover, onNodeHoverEnd }) => {
   );
 };
 
+const linkKey = (link) => {
+  const a = String(typeof link.source === 'object' ? link.source.id : link.source);
+  const b = String(typeof link.target === 'object' ? link.target.id : link.target);
+  return a <= b ? `${a}|${b}` : `${b}|${a}`;
+};
+
+// Apply a server-sent graph diff (added/removed/changed nodes and links).
+const applyGraphDiff = (graph, diff) => {
+  const nodes = new Map((graph.nodes || []).map((node) => [node.id, node]));
+  (diff.nodes.removed || []).forEach((id) => nodes.delete(id));
+  [...(diff.nodes.changed || []), ...(diff.nodes.added || [])].forEach((node) => nodes.set(node.id, node));
+
+  const links = new Map((graph.links || []).map((link) => [linkKey(link), link]));
+  (diff.links.removed || []).forEach((link) => links.delete(linkKey(link)));
+  [...(diff.links.changed || []), ...(diff.links.added || [])].forEach((link) => links.set(linkKey(link), link));
+
+  return { ...graph, nodes: [...nodes.values()], links: [...links.values()] };
+};
+
 // Main Knowledge Graph component
 function KnowledgeGraph({ onSelectNote }) {
   const [data, setData] = useState({ nodes: [], links: [] });
@@ -415,6 +434,7 @@ function KnowledgeGraph({ onSelectNote }) {
   const [hoverTimeout, setHoverTimeout] = useState(null);
   const [isPopupHovered, setIsPopupHovered] = useState(false);
   const lastHoveredTopicRef = useRef(null);
+  const rawGraphRef = useRef({ nodes: [], links: [] });
 
   const processGraphData = (data) => {
     if (!data.nodes || data.nodes.length === 0) {
@@ -422,6 +442,16 @@ function KnowledgeGraph({ onSelectNote }) {
     }
 
     const nodes = data.nodes.map((node, index) => {
+      // Prefer the layout precomputed (and warm-started) by the server.
+      if ([node.x, node.y, node.z].every(Number.isFinite)) {
+        return {
+          ...node,
+          position: [node.x, node.y, node.z],
+          size: node.size || (node.note_ids && node.note_ids.length * 20) || 30,
+          label: node.topic || node.label || 'Unknown Topic'
+        };
+      }
+
       const phi = Math.acos(-1 + (2 * index) / data.nodes.length);
       const theta = Math.sqrt(data.nodes.length * Math.PI) * phi;
       
@@ -452,6 +482,7 @@ function KnowledgeGraph({ onSelectNote }) {
       }
       
       const rawData = await response.json();
+      rawGraphRef.current = rawData;
       
       if (rawData.nodes && rawData.nodes.length > 0) {
         const processedData = processGraphData(rawData);
@@ -505,21 +536,52 @@ function KnowledgeGraph({ onSelectNote }) {
 
   useEffect(() => {
     let statusInterval;
-    
-    statusInterval = setInterval(async () => {
-      try {
-        const response = await api.knowledgeGraph.status();
-        const status = await response.json();
-        setGenerationStatus(status.generation_status || { is_generating: false, progress: "idle" });
-        if (status.has_cached_graph) {
-          fetchKnowledgeGraph(false);
+    let events;
+
+    const showGraph = (graph) => {
+      rawGraphRef.current = graph;
+      setData(processGraphData(graph));
+      setCacheStatus({ cached: (graph.nodes || []).length > 0, fresh: true });
+    };
+
+    const pollStatus = () => {
+      statusInterval = setInterval(async () => {
+        try {
+          const response = await api.knowledgeGraph.status();
+          const status = await response.json();
+          setGenerationStatus(status.generation_status || { is_generating: false, progress: "idle" });
+          if (status.has_cached_graph) {
+            fetchKnowledgeGraph(false);
+          }
+        } catch (err) {
+          console.error("Error checking status:", err);
         }
-      } catch (err) {
-        console.error("Error checking status:", err);
-      }
-    }, 2500);
+      }, 2500);
+    };
+
+    if (typeof EventSource === 'undefined') {
+      pollStatus();
+    } else {
+      // The server pushes snapshots, diffs and progress; fall back to
+      // polling only if the stream is refused outright.
+      events = api.knowledgeGraph.events();
+      events.addEventListener('graph', (event) => showGraph(JSON.parse(event.data)));
+      events.addEventListener('diff', (event) => {
+        showGraph(applyGraphDiff(rawGraphRef.current, JSON.parse(event.data)));
+      });
+      events.addEventListener('status', (event) => {
+        const status = JSON.parse(event.data);
+        setGenerationStatus(status || { is_generating: false, progress: "idle" });
+      });
+      events.onerror = () => {
+        if (events.readyState === EventSource.CLOSED && !statusInterval) {
+          pollStatus();
+        }
+      };
+    }
     
     return () => {
+      if (events) events.close();
       if (statusInterval) clearInterval(statusInterval);
     };
   }, []);
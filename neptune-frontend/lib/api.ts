@@ -195,9 +195,20 @@ export const api = {
   },
   
   knowledgeGraph: {
-    get: () => apiRequest('/api/knowledge-graph/'),
+    get: (params?: { min_strength?: number; max_edges?: number; max_degree?: number }) => {
+      const search = new URLSearchParams();
+      if (params?.min_strength !== undefined) search.set('min_strength', String(params.min_strength));
+      if (params?.max_edges !== undefined) search.set('max_edges', String(params.max_edges));
+      if (params?.max_degree !== undefined) search.set('max_degree', String(params.max_degree));
+      const suffix = search.toString() ? `?${search.toString()}` : '';
+      return apiRequest(`/api/knowledge-graph/${suffix}`);
+    },
     refresh: () => apiRequest('/api/knowledge-graph/refresh', { method: 'POST' }),
     status: () => apiRequest('/api/knowledge-graph/status'),
+    events: (since?: number | null) => {
+      const suffix = since !== undefined && since !== null ? `?since=${since}` : '';
+      return new EventSource(`${API_BASE_URL}/api/knowledge-graph/events${suffix}`);
+    },
   },
 
   search: {